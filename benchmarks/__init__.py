@@ -0,0 +1,11 @@
+"""Performance measurements for qgraf_parser
+
+Each module of this subpackage measures one aspect of the package and can be run as a script, e.g.
+`python -m qgraf_parser.benchmarks.mmap_parser`
+
+The suite module measures every stage of the processing on synthetic corpora, stores the results in a JSON baseline
+and compares later runs to it: `python -m qgraf_parser.benchmarks run` and `python -m qgraf_parser.benchmarks compare`.
+
+The corpus module writes synthetic QGRAF outputs of any size for the bundled models, such that the measurements do not
+require qgraf.
+"""
@@ -0,0 +1,5 @@
+"""Run the benchmark suite, see qgraf_parser.benchmarks.suite"""
+import sys
+from .suite import main
+
+sys.exit(main())
@@ -0,0 +1,382 @@
+"""Synthetic QGRAF outputs for scaling measurements
+
+qgraf is not available in every environment where the package is measured, and the bundled outputs only hold a few
+diagrams. This module writes outputs in the format of generator/xml.sty for any model of the package, with a chosen
+number of diagrams, loops and vertex valence. The outputs can be imported by
+qgraf_parser.importer.create_diagrams_from_XML in the 'XML' and 'MMAP' modes.
+
+The diagrams are random connected graphs drawn with a seeded random number generator, such that a corpus is
+reproducible:
+
+- every vertex is an interaction of the model with the chosen valence, and the number of vertices follows from the
+  number of external legs and of loops
+- the fields at the ends of each propagator are those of a propagator of the model
+- one loop momentum k1, k2, ... flows through each edge that is not in a spanning tree of the graph, the momenta of
+  the other edges following from momentum conservation. Graphs with a propagator of zero momentum are redrawn.
+
+Drawing a diagram is much slower than writing one, so that by default n_distinct diagrams are drawn and repeated with
+renumbered ids up to the requested size. The corpus is a benchmark input: the diagrams are valid Feynman diagrams of
+the model, but neither their set nor their signs and symmetry factors are those of a real qgraf run.
+
+Example
+-------
+    python -m qgraf_parser.benchmarks.corpus graphs.xml --model phi3 --diagrams 100000 --loops 2
+"""
+import argparse
+import importlib
+import random
+from qgraf_parser.models.common_tools.momenta import MomentumBasis,Momentum
+import logging
+logger=logging.getLogger(__name__)
+
+# Default process of each bundled model, as (incoming,outgoing) particle names
+default_processes = {
+    'phi3': (['phi'],['phi']),
+    'GHT': (['H'],['H']),
+}
+signsym_values = ("+1","-1","+1/2","-1/2","+1/4","+1/6")
+
+diagram_template = """<diagram>
+
+ <id>{id}</id>
+ <defdata>
+  <incoming>
+  {n_incoming}
+  </incoming>
+  <outgoing>
+  {n_outgoing}
+  </outgoing>
+ </defdata>
+ <signsym>{signsym}</signsym>
+
+ <legs>
+{legs} </legs>
+
+<propagators>
+{propagators} </propagators>
+
+ <vertices>
+{vertices} </vertices>
+</diagram>"""
+leg_template = """  <leg>
+   <field>{field}</field>
+   <momentum>{momentum}</momentum>
+   <status>{status}</status>
+   <id>{id}</id>
+  </leg>
+"""
+propagator_template = """  <propagator>
+   <mass>m{field}</mass>
+   <momentum>{momentum}</momentum>
+   <field>{field}</field>
+   <dual-field>{dual_field}</dual-field>
+   <id>{id}</id>
+   <from>{from_id}</from>
+   <to>{to_id}</to>
+  </propagator>
+"""
+vertex_template = """  <vertex>
+   <type>{types}</type>
+   <fields>{fields}</fields>
+   <id>{id}</id>
+   <momenta>{momenta}</momenta>
+  </vertex>
+"""
+
+
+def model_short_name(model):
+    """Name of a model module without its package, e.g. 'GHT'"""
+    return model.__name__.rsplit(".",1)[-1]
+
+
+class DiagramSampler(object):
+    """Draw random diagrams of a process in a model
+
+    Attributes
+    ----------
+    model : module
+        the module defining the model properties
+    incoming, outgoing : list of str
+        names of the external particles
+    n_loops : int
+    valence : int
+        number of fields of every vertex
+    n_vertices : int
+    interactions : list of qgraf_parser.models.common_tools.abstract_objects.Interaction
+        interactions of the model with the chosen valence
+    conjugates : dict of {str: str}
+        conjugate of each particle, from the propagators of the model
+    basis : MomentumBasis
+        loop momenta followed by the incoming (p) and outgoing (q) momenta
+    rng : random.Random
+    max_attempts : int
+        number of graphs drawn for one diagram before giving up
+    """
+    def __init__(self,model,incoming,outgoing,n_loops=1,valence=3,seed=0,max_attempts=10000):
+        self.model = model
+        self.incoming = list(incoming)
+        self.outgoing = list(outgoing)
+        self.n_loops = n_loops
+        self.valence = valence
+        self.max_attempts = max_attempts
+        self.rng = random.Random(seed)
+        self.interactions = [interaction for interaction in model.interactions
+                             if len(interaction.particles) == valence]
+        if not self.interactions:
+            error = ValueError("The model {} has no interaction with {} fields".format(model_short_name(model),valence))
+            logger.error(error)
+            raise error
+        n_external = len(self.incoming)+len(self.outgoing)
+        n_vertices,remainder = divmod(n_external+2*n_loops-2,valence-2) if valence > 2 else (0,1)
+        if remainder or n_vertices < 1:
+            error = ValueError("No connected diagram with {} external legs and {} loops has vertices with {} fields"
+                               .format(n_external,n_loops,valence))
+            logger.error(error)
+            raise error
+        self.n_vertices = n_vertices
+        self.conjugates = {}
+        for propagator in model.propagators:
+            dual,field = [particle.name for particle in propagator.particles]
+            self.conjugates[dual] = field
+            self.conjugates[field] = dual
+        self.basis = MomentumBasis(["k{}".format(i) for i in range(1,n_loops+1)]+
+                                   ["p{}".format(i) for i in range(1,len(self.incoming)+1)]+
+                                   ["q{}".format(i) for i in range(1,len(self.outgoing)+1)])
+        # Ordered pairs of particles (dual-field,field) that can be joined by a propagator
+        self.propagator_ends = {tuple(particle.name for particle in propagator.particles)
+                                for propagator in model.propagators}
+
+    def unit_momentum(self,label,sign=1):
+        return Momentum(self.basis,[sign if basis_label == label else 0 for basis_label in self.basis.labels])
+
+    def draw_graph(self):
+        """Draw the vertices and edges of a graph, without checking its connectivity
+
+        Returns
+        -------
+        tuple or None:
+            (slots,externals,edges) where slots lists the particle of each slot of each vertex, externals maps the
+            (vertex,slot) of each external leg to its index and edges lists ((vertex,slot),(vertex,slot)) pairs of
+            propagators oriented from the dual field to the field. None if the particles cannot be paired.
+        """
+        rng = self.rng
+        slots = [[particle.name for particle in rng.choice(self.interactions).particles]
+                 for vertex in range(self.n_vertices)]
+        free = [(vertex,slot) for vertex in range(self.n_vertices) for slot in range(self.valence)]
+        rng.shuffle(free)
+        # External legs take slots of their particle, or of its conjugate for outgoing legs
+        externals = {}
+        leg_particles = self.incoming+[self.conjugates.get(name,name) for name in self.outgoing]
+        for leg,name in enumerate(leg_particles):
+            for position,(vertex,slot) in enumerate(free):
+                if slots[vertex][slot] == name:
+                    externals[(vertex,slot)] = leg
+                    del free[position]
+                    break
+            else:
+                return None
+        # The remaining slots are paired at random into propagators
+        edges = []
+        while free:
+            end = free.pop()
+            partners = [position for position,(vertex,slot) in enumerate(free)
+                        if (slots[vertex][slot],slots[end[0]][end[1]]) in self.propagator_ends
+                        or (slots[end[0]][end[1]],slots[vertex][slot]) in self.propagator_ends]
+            if not partners:
+                return None
+            other = free.pop(rng.choice(partners))
+            if (slots[other[0]][other[1]],slots[end[0]][end[1]]) in self.propagator_ends:
+                edges.append((other,end))
+            else:
+                edges.append((end,other))
+        return slots,externals,edges
+
+    def route_momenta(self,externals,edges):
+        """Assign momenta to the propagators of a graph
+
+        Returns
+        -------
+        list of Momentum or None
+            the momentum of each edge, flowing from its dual field to its field. None if the graph is not connected
+            or if a propagator has zero momentum.
+        """
+        n_incoming = len(self.incoming)
+        adjacency = [[] for vertex in range(self.n_vertices)]
+        for index,((from_vertex,from_slot),(to_vertex,to_slot)) in enumerate(edges):
+            adjacency[from_vertex].append(index)
+            adjacency[to_vertex].append(index)
+        # Spanning tree by breadth-first search from vertex 0
+        parent_edge = {0: None}
+        order = [0]
+        for vertex in order:
+            for index in adjacency[vertex]:
+                (from_vertex,from_slot),(to_vertex,to_slot) = edges[index]
+                other = to_vertex if from_vertex == vertex else from_vertex
+                if other not in parent_edge:
+                    parent_edge[other] = index
+                    order.append(other)
+        if len(order) != self.n_vertices:
+            return None
+        tree_edges = set(index for index in parent_edge.values() if index is not None)
+        chords = [index for index in range(len(edges)) if index not in tree_edges]
+        momenta = [None]*len(edges)
+        for loop,index in enumerate(chords,1):
+            momenta[index] = self.unit_momentum("k{}".format(loop))
+        # Momentum flowing into each vertex from its external legs
+        inflow = [Momentum(self.basis,[0]*len(self.basis)) for vertex in range(self.n_vertices)]
+        for (vertex,slot),leg in externals.items():
+            if leg < n_incoming:
+                inflow[vertex] += self.unit_momentum("p{}".format(leg+1))
+            else:
+                inflow[vertex] += self.unit_momentum("q{}".format(leg-n_incoming+1),-1)
+        # Leaves first: the edge to the parent balances everything else flowing into the vertex
+        for vertex in reversed(order[1:]):
+            total = inflow[vertex]
+            for index in adjacency[vertex]:
+                if index == parent_edge[vertex] or momenta[index] is None:
+                    continue
+                (from_vertex,from_slot),(to_vertex,to_slot) = edges[index]
+                if to_vertex == vertex:
+                    total += momenta[index]
+                if from_vertex == vertex:
+                    total -= momenta[index]
+            index = parent_edge[vertex]
+            momenta[index] = -total if edges[index][1][0] == vertex else total
+            if momenta[index].is_zero():
+                return None
+        return momenta
+
+    def draw(self):
+        """Draw a diagram
+
+        Returns
+        -------
+        tuple:
+            (slots,externals,edges,momenta), see draw_graph and route_momenta
+        """
+        for attempt in range(self.max_attempts):
+            graph = self.draw_graph()
+            if graph is None:
+                continue
+            slots,externals,edges = graph
+            momenta = self.route_momenta(externals,edges)
+            if momenta is not None:
+                return slots,externals,edges,momenta
+        error = RuntimeError("Could not draw a diagram of {} in {} attempts".format(model_short_name(self.model),
+                                                                                     self.max_attempts))
+        logger.error(error)
+        raise error
+
+    def write_diagram(self,diagram_id):
+        """Draw a diagram and write it as a <diagram> block of generator/xml.sty"""
+        slots,externals,edges,momenta = self.draw()
+        n_incoming = len(self.incoming)
+        legs = []
+        for leg,name in enumerate(self.incoming+self.outgoing):
+            status = "in" if leg < n_incoming else "out"
+            momentum = "p{}".format(leg+1) if leg < n_incoming else "q{}".format(leg-n_incoming+1)
+            legs.append(leg_template.format(field=name,momentum=momentum,status=status,id=-leg-1))
+        # Field ids: -1, -2, ... for the external legs, 2j-1 for the field and 2j for the dual field of propagator j
+        field_ids = {position: -leg-1 for position,leg in externals.items()}
+        vertex_momenta = {position: str(self.unit_momentum(label,sign))
+                          for position,leg in externals.items()
+                          for label,sign in [("p{}".format(leg+1),1) if leg < n_incoming else
+                                             ("q{}".format(leg-n_incoming+1),-1)]}
+        propagators = []
+        for index,((from_end,to_end),momentum) in enumerate(zip(edges,momenta),1):
+            field_ids[to_end] = 2*index-1
+            field_ids[from_end] = 2*index
+            vertex_momenta[to_end] = str(momentum)
+            vertex_momenta[from_end] = str(-momentum)
+            propagators.append(propagator_template.format(
+                field=slots[to_end[0]][to_end[1]],dual_field=slots[from_end[0]][from_end[1]],momentum=momentum,
+                id=index,from_id=2*index,to_id=2*index-1))
+        vertices = []
+        for vertex,particles in enumerate(slots):
+            vertices.append(vertex_template.format(
+                types=",".join(particles),
+                fields=",".join(str(field_ids[(vertex,slot)]) for slot in range(self.valence)),
+                id=vertex+1,
+                momenta=",".join(vertex_momenta[(vertex,slot)] for slot in range(self.valence))))
+        return diagram_template.format(id=diagram_id,n_incoming=n_incoming,n_outgoing=len(self.outgoing),
+                                       signsym=self.rng.choice(signsym_values),legs="".join(legs),
+                                       propagators="".join(propagators),vertices="".join(vertices))
+
+    def header(self):
+        """Text of the output before the first diagram"""
+        return ("<qgraf>\n<version>qgraf_parser synthetic corpus</version>\n"
+                "<input> model = '{}' ;in = {} ;out = {};loops = {} ;valence = {} ;</input>\n<diagrams>\n"
+                .format(model_short_name(self.model),", ".join(self.incoming),", ".join(self.outgoing),self.n_loops,
+                        self.valence))
+
+
+def write_corpus(file_path,model,n_diagrams,n_loops=1,valence=3,incoming=None,outgoing=None,seed=0,
+                 n_distinct=1000):
+    """Write a synthetic QGRAF output in the format of generator/xml.sty
+
+    Parameters
+    ----------
+    file_path : str
+    model : module
+        the module defining the model properties
+    n_diagrams : int
+    n_loops : int, optional
+    valence : int, optional
+        number of fields of every vertex
+    incoming, outgoing : list of str, optional
+        names of the external particles. Default to the process of default_processes for the bundled models.
+    seed : int, optional
+    n_distinct : int or None, optional
+        number of diagrams drawn, which are then repeated with renumbered ids. None draws every diagram.
+
+    Returns
+    -------
+    int
+        number of written diagrams
+    """
+    if incoming is None or outgoing is None:
+        try:
+            default_incoming,default_outgoing = default_processes[model_short_name(model)]
+        except KeyError:
+            error = ValueError("The external particles must be given for the model {}".format(model_short_name(model)))
+            logger.error(error)
+            raise error
+        incoming = default_incoming if incoming is None else incoming
+        outgoing = default_outgoing if outgoing is None else outgoing
+    sampler = DiagramSampler(model,incoming,outgoing,n_loops,valence,seed)
+    if n_distinct is None:
+        n_distinct = n_diagrams
+    blocks = []
+    with open(file_path,"w") as corpus:
+        corpus.write(sampler.header())
+        for index in range(n_diagrams):
+            if index < n_distinct:
+                block = sampler.write_diagram(index+1)
+                blocks.append(block.split("</id>",1)[1])
+            else:
+                block = "<diagram>\n\n <id>{}</id>".format(index+1)+blocks[index%n_distinct]
+            corpus.write(" \n"+block+"\n")
+        corpus.write("</diagrams>\n</qgraf>\n")
+    logger.info("Wrote {} diagrams of {} to {}".format(n_diagrams,model_short_name(model),file_path))
+    return n_diagrams
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic QGRAF output in the format of xml.sty")
+    parser.add_argument("file_path")
+    parser.add_argument("--model",default="phi3",help="model of qgraf_parser.models or importable model module")
+    parser.add_argument("--diagrams",type=int,default=1000)
+    parser.add_argument("--loops",type=int,default=1)
+    parser.add_argument("--valence",type=int,default=3)
+    parser.add_argument("--incoming",nargs="+")
+    parser.add_argument("--outgoing",nargs="+")
+    parser.add_argument("--seed",type=int,default=0)
+    parser.add_argument("--distinct",type=int,default=1000,help="number of drawn diagrams, 0 to draw all of them")
+    options = parser.parse_args(arguments)
+    model_name = options.model if "." in options.model else "qgraf_parser.models."+options.model
+    write_corpus(options.file_path,importlib.import_module(model_name),options.diagrams,options.loops,options.valence,
+                 options.incoming,options.outgoing,options.seed,options.distinct or None)
+
+
+if __name__ == "__main__":
+    main()
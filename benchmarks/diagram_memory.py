@@ -0,0 +1,124 @@
+"""Benchmark of the memory used by Diagram objects, with and without __slots__
+
+A large XML file is created by replicating the diagrams of a small QGRAF output (see benchmarks.mmap_parser). Its
+diagrams are imported while tracemalloc records the memory allocated for the objects that are kept alive, which is
+reported as a number of bytes per diagram.
+
+The diagram elements use __slots__ and interned strings. To measure what this saves, the diagrams are also imported
+with copies of the element classes that store their attributes in an instance __dict__ and do not intern strings, as
+the elements did before (see unslotted_classes).
+"""
+import os
+import gc
+import types
+import tempfile
+import tracemalloc
+import qgraf_parser.parser.diagram_elements as diagram_elements
+from qgraf_parser.importer import generate_mmap_diagram_blocks
+from .mmap_parser import replicate_xml_diagrams,default_source
+import logging
+logger=logging.getLogger(__name__)
+
+element_class_names = ('DiagramField','DiagramVertex','DiagramPropagator','AbstractDiagram','Diagram','LazyDiagram')
+
+
+def rebind(attribute,namespace):
+    """Copy a function, static method, class method or property of a class with new module globals"""
+    if isinstance(attribute,types.FunctionType):
+        return types.FunctionType(attribute.__code__,namespace,attribute.__name__,attribute.__defaults__,
+                                  attribute.__closure__)
+    if isinstance(attribute,(staticmethod,classmethod)):
+        return type(attribute)(rebind(attribute.__func__,namespace))
+    if isinstance(attribute,property):
+        return property(*(rebind(function,namespace) if function is not None else None
+                          for function in (attribute.fget,attribute.fset,attribute.fdel)))
+    return attribute
+
+
+def unslotted_classes():
+    """Copies of the diagram element classes with an instance __dict__ and without string interning
+
+    The methods of the copies are rebound to a copy of the globals of diagram_elements in which the element classes are
+    replaced by their copies and sys.intern by the identity, such that the copies only create copies.
+
+    Returns
+    -------
+    dict of {str: type}
+        the copies keyed by class name
+    """
+    namespace = dict(vars(diagram_elements))
+    namespace['intern'] = lambda string: string
+    copies = {}
+    for name in element_class_names:
+        cls = getattr(diagram_elements,name)
+        slots = cls.__dict__.get('__slots__',())
+        attributes = {key: rebind(value,namespace) for key,value in vars(cls).items()
+                      if key not in slots and key not in ('__slots__','__dict__','__weakref__')}
+        bases = tuple(copies.get(base.__name__,base) for base in cls.__bases__)
+        copies[name] = namespace[name] = type(name,bases,attributes)
+    return copies
+
+
+def measure_diagram_memory(file_path,model,diagram_class):
+    """Import a QGRAF output in the 'MMAP' mode and measure the memory held by the resulting diagrams
+
+    Parameters
+    ----------
+    file_path : str
+    model : module
+    diagram_class : type
+        class of the diagrams, e.g. Diagram or LazyDiagram
+
+    Returns
+    -------
+    tuple
+        (number of diagrams, bytes held by the diagrams)
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start,_ = tracemalloc.get_traced_memory()
+        diagrams = [diagram_class(block,model,'MMAP') for block in generate_mmap_diagram_blocks(file_path)]
+        gc.collect()
+        end,_ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return len(diagrams),end-start
+
+
+def run(model,n_diagrams=5000,source_path=default_source):
+    """Report the number of bytes per diagram for eager and lazy diagrams, with and without __slots__
+
+    Parameters
+    ----------
+    model : module
+        model in which the diagrams of source_path are defined
+    n_diagrams : int
+        size of the replicated output
+    source_path : str
+        QGRAF output written with xml.sty whose diagrams are replicated
+
+    Returns
+    -------
+    dict
+        bytes per diagram, keyed by (kind,layout) where kind is 'eager' or 'lazy' and layout is 'dict' or 'slots'
+    """
+    layouts = {'dict': unslotted_classes(),'slots': {name: getattr(diagram_elements,name)
+                                                    for name in element_class_names}}
+    bytes_per_diagram = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir,"graphs.xml")
+        replicate_xml_diagrams(source_path,file_path,n_diagrams)
+        for kind,class_name in (('eager','Diagram'),('lazy','LazyDiagram')):
+            for layout,classes in layouts.items():
+                n_imported,n_bytes = measure_diagram_memory(file_path,model,classes[class_name])
+                bytes_per_diagram[(kind,layout)] = n_bytes/n_imported
+            print("{:>6}: {:8.0f} bytes per diagram with __dict__, {:8.0f} with __slots__ (x{:.2f})".format(
+                kind,bytes_per_diagram[(kind,'dict')],bytes_per_diagram[(kind,'slots')],
+                bytes_per_diagram[(kind,'dict')]/bytes_per_diagram[(kind,'slots')]))
+    return bytes_per_diagram
+
+
+if __name__ == "__main__":
+    import qgraf_parser.models.GHT as GHT
+    run(GHT)
@@ -0,0 +1,93 @@
+"""Benchmark of the lookup of interactions from the particles of a vertex
+
+InteractionDict finds the interaction of a vertex through an index keyed by the sorted particle names. This module
+compares it with the former lookup, which joined every permutation of the particle names until one of them was an
+interaction name, for 3-, 4- and 6-point vertices.
+"""
+import random
+from itertools import permutations
+from time import perf_counter
+from qgraf_parser.models.common_tools.abstract_objects import Particle,Interaction,InteractionDict
+import logging
+logger=logging.getLogger(__name__)
+
+
+def permutation_lookup(interactions,particle_names):
+    """Former InteractionDict lookup: try all the orderings of the particle names"""
+    for ordering in permutations(particle_names):
+        if ",".join(ordering) in interactions.internal_dict:
+            break
+    return interactions.internal_dict[",".join(ordering)]
+
+
+def make_interactions(n_points,n_interactions=50,n_particles=12,seed=0):
+    """Create an InteractionDict of random n_points interactions
+
+    Parameters
+    ----------
+    n_points : int
+        number of particles of each interaction
+    n_interactions : int
+    n_particles : int
+        number of distinct particles to draw from
+    seed : int
+
+    Returns
+    -------
+    tuple:
+        (interactions,vertices) where vertices holds the particle names of each interaction, shuffled
+    """
+    generator = random.Random(seed)
+    particles = [Particle("p{}".format(i),mass=None) for i in range(n_particles)]
+    interactions = InteractionDict([])
+    vertices = []
+    while len(interactions.internal_dict) < n_interactions:
+        chosen = [generator.choice(particles) for _ in range(n_points)]
+        names = [particle.name for particle in chosen]
+        if tuple(sorted(names)) in interactions.index:
+            continue
+        interactions.append(Interaction(chosen,None))
+        generator.shuffle(names)
+        vertices.append(names)
+    return interactions,vertices
+
+
+def time_lookups(lookup,interactions,vertices,repeat):
+    """Time repeat passes of lookup over all the vertices, in seconds per lookup"""
+    start = perf_counter()
+    for _ in range(repeat):
+        for names in vertices:
+            lookup(interactions,names)
+    return (perf_counter()-start)/(repeat*len(vertices))
+
+
+def run(n_points_list=(3,4,6),repeat=20):
+    """Compare the indexed and the permutation lookups
+
+    Parameters
+    ----------
+    n_points_list : iterable of int
+        vertex sizes to benchmark
+    repeat : int
+        number of passes over the vertices
+
+    Returns
+    -------
+    dict
+        time per lookup in seconds, keyed by (n_points,method)
+    """
+    timings = {}
+    for n_points in n_points_list:
+        interactions,vertices = make_interactions(n_points)
+        for names in vertices:
+            assert interactions[names] is permutation_lookup(interactions,names)
+        timings[(n_points,'index')] = time_lookups(InteractionDict.__getitem__,interactions,vertices,repeat)
+        timings[(n_points,'permutations')] = time_lookups(permutation_lookup,interactions,vertices,repeat)
+        print("{}-point: index {:8.2f}us  permutations {:10.2f}us  speedup x{:.0f}".format(
+            n_points,1e6*timings[(n_points,'index')],1e6*timings[(n_points,'permutations')],
+            timings[(n_points,'permutations')]/timings[(n_points,'index')]))
+    return timings
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,113 @@
+"""Benchmark of the 'MMAP' input mode against the 'XML' input mode
+
+A large XML file is created by replicating the diagrams of a small QGRAF output written with generator/xml.sty. It is
+then read in both modes, once to create the full Diagram objects and once to only parse the diagram elements. The
+end-to-end import is the headline figure, since Diagram construction takes most of the import time in both modes.
+"""
+import os
+import re
+import tempfile
+from time import perf_counter
+from xml.etree.ElementTree import iterparse
+from qgraf_parser.importer import generate_mmap_diagram_blocks,create_diagrams_from_XML
+from qgraf_parser.parser.diagram_elements import Diagram,DiagramField,DiagramVertex,DiagramPropagator
+import logging
+logger=logging.getLogger(__name__)
+
+module_path = os.path.dirname(os.path.abspath(__file__))
+default_source = os.path.join(module_path,"..","ressources","yukex.xml")
+
+
+def replicate_xml_diagrams(source_path,target_path,n_diagrams):
+    """Write a XML QGRAF output made of n_diagrams copies of the diagrams of another output, with renumbered ids
+
+    Parameters
+    ----------
+    source_path : str
+    target_path : str
+    n_diagrams : int
+    """
+    with open(source_path) as source:
+        content = source.read()
+    head,body = content.split("<diagrams>",1)
+    blocks = re.findall(r"<diagram>.*?</diagram>",body,re.DOTALL)
+    with open(target_path,"w") as target:
+        target.write(head+"<diagrams>\n")
+        for i in range(n_diagrams):
+            block = blocks[i%len(blocks)]
+            target.write(" \n"+re.sub(r"<id>\s*\d+\s*</id>","<id>{}</id>".format(i+1),block,count=1)+"\n")
+        target.write("</diagrams>\n</qgraf>\n")
+
+
+def parse_only(file_path,mode):
+    """Parse all the diagram elements of a file without creating any Diagram object
+
+    Parameters
+    ----------
+    file_path : str
+    mode : str
+        'XML' or 'MMAP'
+
+    Returns
+    -------
+    int
+        number of parsed diagrams
+    """
+    if mode == 'MMAP':
+        nodes = generate_mmap_diagram_blocks(file_path)
+    else:
+        nodes = (node for event,node in iterparse(file_path) if node.tag == "diagram")
+    n_diagrams = 0
+    for node in nodes:
+        id,signsym,legs,vertices,propagators = Diagram.parse(node,mode)
+        for leg in legs:
+            DiagramField.parse(leg,mode)
+        for vertex in vertices:
+            list(DiagramVertex.parse(vertex,mode))
+        for propagator in propagators:
+            DiagramPropagator.parse(propagator,mode)
+        n_diagrams += 1
+    return n_diagrams
+
+
+def time_call(function,*args):
+    """Run a function and return (result,elapsed seconds)"""
+    start = perf_counter()
+    result = function(*args)
+    return result,perf_counter()-start
+
+
+def run(model,n_diagrams=20000,source_path=default_source):
+    """Compare the 'XML' and 'MMAP' modes on a replicated output
+
+    Parameters
+    ----------
+    model : module
+        model in which the diagrams of source_path are defined
+    n_diagrams : int
+        size of the replicated output
+    source_path : str
+        QGRAF output written with xml.sty whose diagrams are replicated
+
+    Returns
+    -------
+    dict
+        timings in seconds, keyed by (stage,mode)
+    """
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir,"graphs.xml")
+        replicate_xml_diagrams(source_path,file_path,n_diagrams)
+        for mode in ('XML','MMAP'):
+            n_parsed,timings[('parse',mode)] = time_call(parse_only,file_path,mode)
+            diagrams,timings[('import',mode)] = time_call(create_diagrams_from_XML,file_path,model,mode)
+            assert n_parsed == len(diagrams) == n_diagrams
+    for stage,label in (('import','end-to-end import'),('parse','parsing only')):
+        print("{:>17}: XML {:8.3f}s  MMAP {:8.3f}s  speedup x{:.1f}".format(
+            label,timings[(stage,'XML')],timings[(stage,'MMAP')],timings[(stage,'XML')]/timings[(stage,'MMAP')]))
+    return timings
+
+
+if __name__ == "__main__":
+    import qgraf_parser.models.GHT as GHT
+    run(GHT)
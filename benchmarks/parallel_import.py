@@ -0,0 +1,119 @@
+"""Scaling of the import on a pool of processes with the number of workers
+
+The main process reads the raw diagram nodes and loads the payload of every chunk returned by the workers, which is
+serial work: its share of the serial import bounds the speedup of the pool (Amdahl's law). For each payload of
+qgraf_parser.importer.parallel, the benchmark measures
+
+- the wall-clock time of the import with each number of workers, and its speedup over the serial import (over the
+  serial DiagramSet.from_file for the 'diagram_set' payload)
+- the time the main process spends reading the raw nodes and loading the payloads, measured on payloads built
+  in-process, and the speedup bound that follows from it
+
+On a machine with fewer cores than workers, the measured speedups are bounded by the number of cores: the bound
+computed from the main-process share is then the relevant figure.
+"""
+import os
+import tempfile
+from time import perf_counter
+import qgraf_parser.importer.parallel as parallel
+from qgraf_parser.importer import create_diagrams_from_XML
+from qgraf_parser.importer.model_pickle import loads_diagrams
+from qgraf_parser.parser.diagram_set import DiagramSet
+from .corpus import write_corpus
+import logging
+logger=logging.getLogger(__name__)
+
+
+def load_diagram_payloads(chunks,model):
+    return [diagram for payload in chunks for diagram in loads_diagrams(payload,model)]
+
+
+def load_record_payloads(chunks,model):
+    return [diagram for payload in chunks for diagram in parallel.load_record_chunk(payload,model)]
+
+
+# Function building the payload of a chunk in a worker and function loading the payloads in the main process
+payloads = {
+    'diagrams': (parallel.build_diagram_chunk,load_diagram_payloads),
+    'records': (parallel.build_record_chunk,load_record_payloads),
+    'diagram_set': (parallel.build_range_set,DiagramSet.concatenate),
+}
+
+
+def time_call(function,*args):
+    """Run a function and return (result,elapsed seconds)"""
+    start = perf_counter()
+    result = function(*args)
+    return result,perf_counter()-start
+
+
+def main_process_time(file_path,model,mode,payload,chunk_size):
+    """Time spent by the main process reading the raw nodes of a file and loading the payloads built from them
+
+    The payloads are built in-process beforehand, outside of the measurement. For the 'diagram_set' payload, the
+    chunks are byte ranges that the main process does not read.
+    """
+    build_chunk,load_chunks = payloads[payload]
+    parallel.init_worker(model.__name__)
+    if payload == 'diagram_set':
+        ranges,read_time = time_call(parallel.byte_ranges,file_path,os.cpu_count() or 1)
+        chunks = [build_chunk(file_path,mode,start,end) for start,end in ranges]
+    else:
+        nodes,read_time = time_call(lambda: list(parallel.generate_raw_diagram_nodes(file_path,mode)))
+        chunks = [build_chunk(nodes[start:start+chunk_size],mode) for start in range(0,len(nodes),chunk_size)]
+    _,load_time = time_call(load_chunks,chunks,model)
+    return read_time+load_time
+
+
+def parallel_import(file_path,model,mode,payload,workers,chunk_size):
+    """Import a file on a pool of processes with one of the payloads"""
+    if payload == 'diagram_set':
+        return parallel.create_diagram_set_parallel(file_path,model,mode,workers)
+    return parallel.create_diagrams_parallel(file_path,model,mode,workers,chunk_size,lazy=payload == 'records')
+
+
+def run(model,n_diagrams=20000,mode='MMAP',worker_counts=(1,2,4,8,16,32),chunk_size=256,n_loops=2):
+    """Measure the speedup of the parallel import against the number of workers
+
+    Parameters
+    ----------
+    model : module
+        an importable model module
+    n_diagrams : int
+        size of the synthetic corpus, see benchmarks.corpus
+    mode : str
+    worker_counts : list of int
+    chunk_size : int
+    n_loops : int
+
+    Returns
+    -------
+    dict
+        timings in seconds: 'serial', 'serial_set', ('main',payload) and (payload,workers)
+    """
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir,"graphs.xml")
+        write_corpus(file_path,model,n_diagrams,n_loops,n_distinct=None)
+        _,timings['serial'] = time_call(create_diagrams_from_XML,file_path,model,mode)
+        _,timings['serial_set'] = time_call(DiagramSet.from_file,file_path,model,mode)
+        print("serial import: {:.3f}s, serial DiagramSet: {:.3f}s, on {} CPUs".format(
+            timings['serial'],timings['serial_set'],os.cpu_count()))
+        for payload in payloads:
+            serial = timings['serial_set' if payload == 'diagram_set' else 'serial']
+            timings[('main',payload)] = main_process_time(file_path,model,mode,payload,chunk_size)
+            share = timings[('main',payload)]/serial
+            print("{:>12}: main process {:.3f}s ({:.1%} of the serial run), speedup bound x{:.1f}, "
+                  "x{:.1f} at 32 workers".format(payload,timings[('main',payload)],share,1/share,
+                                                 1/(share+(1-share)/32)))
+            for workers in worker_counts:
+                _,timings[(payload,workers)] = time_call(parallel_import,file_path,model,mode,payload,workers,
+                                                         chunk_size)
+                print("{:>12}  {:3d} workers {:8.3f}s  speedup x{:.2f}".format(
+                    "",workers,timings[(payload,workers)],serial/timings[(payload,workers)]))
+    return timings
+
+
+if __name__ == "__main__":
+    import qgraf_parser.models.GHT as GHT
+    run(GHT)
@@ -0,0 +1,70 @@
+"""Benchmark of the extraction of common subexpressions over a diagram set
+
+The expressions of a replicated QGRAF output are rendered once in full and once with the repeated subexpressions
+replaced by names, whose definitions are written once. The output sizes and the rendering times are compared.
+"""
+import io
+import os
+import tempfile
+from qgraf_parser.importer import create_diagrams_from_XML
+from qgraf_parser.models.common_tools.algebra_tools import write_expression
+from qgraf_parser.models.common_tools.subexpressions import SubexpressionTable
+from .mmap_parser import replicate_xml_diagrams,time_call,default_source
+import logging
+logger=logging.getLogger(__name__)
+
+
+def write_full(expressions):
+    """Render all the expressions in full, returns the size of the output in characters"""
+    output = io.StringIO()
+    for expression in expressions:
+        write_expression(expression,output.write)
+        output.write(";\n")
+    return len(output.getvalue())
+
+
+def write_with_subexpressions(expressions):
+    """Render the expressions with extracted subexpressions, returns the size of the output in characters"""
+    output = io.StringIO()
+    table = SubexpressionTable(expressions)
+    table.write_declarations(output.write)
+    for expression in expressions:
+        table.write(expression,output.write)
+        output.write(";\n")
+    table.write_procedure(output.write)
+    return len(output.getvalue())
+
+
+def run(model,n_diagrams=20000,source_path=default_source):
+    """Compare the output with and without common subexpressions
+
+    Parameters
+    ----------
+    model : module
+        model in which the diagrams of source_path are defined
+    n_diagrams : int
+        size of the replicated output
+    source_path : str
+        QGRAF output written with xml.sty whose diagrams are replicated
+
+    Returns
+    -------
+    dict
+        output sizes in characters and rendering times in seconds, keyed by (quantity,method)
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir,"graphs.xml")
+        replicate_xml_diagrams(source_path,file_path,n_diagrams)
+        expressions = [diagram.generate_expression() for diagram in create_diagrams_from_XML(file_path,model)]
+    results = {}
+    for method,write in (('full',write_full),('subexpressions',write_with_subexpressions)):
+        results[('size',method)],results[('time',method)] = time_call(write,expressions)
+    print("full: {:>12d} chars {:8.3f}s  subexpressions: {:>12d} chars {:8.3f}s  size ratio x{:.1f}".format(
+        results[('size','full')],results[('time','full')],results[('size','subexpressions')],
+        results[('time','subexpressions')],results[('size','full')]/results[('size','subexpressions')]))
+    return results
+
+
+if __name__ == "__main__":
+    import qgraf_parser.models.GHT as GHT
+    run(GHT)
@@ -0,0 +1,359 @@
+"""End-to-end benchmark suite with stored baselines
+
+The suite measures each stage of the processing of a QGRAF output separately, on synthetic corpora of several sizes
+(see benchmarks.corpus) for each bundled model:
+
+- xml_load: reading the <diagram> nodes of the file with xml.etree
+- construction: creating the Diagram objects from these nodes
+- lookup: finding the interaction of every vertex and the propagator of every propagator in the model
+- feynman_rules: generating the expression of every diagram
+- form_writing: writing the expressions to FORM files with a FormWriter
+
+Every stage is timed (best of a number of repetitions) and, in a separate run, its peak memory allocation is measured
+with tracemalloc. The results are stored in a JSON file, which can serve as a baseline for later runs: compare_results
+reports the measurements that are slower or larger than the baseline by more than a threshold.
+
+Example
+-------
+    python -m qgraf_parser.benchmarks run --sizes small medium --output baseline.json
+    python -m qgraf_parser.benchmarks run --output current.json
+    python -m qgraf_parser.benchmarks compare baseline.json current.json --threshold 0.2
+"""
+import os
+import gc
+import sys
+import json
+import platform
+import argparse
+import importlib
+import tempfile
+import tracemalloc
+from time import perf_counter
+from xml.etree.ElementTree import iterparse
+from qgraf_parser.parser.diagram_elements import Diagram
+from qgraf_parser.exporter import FormWriter
+from .corpus import write_corpus
+import logging
+logger=logging.getLogger(__name__)
+
+results_format_version = 1
+corpus_sizes = {'small': 1000, 'medium': 10000, 'large': 100000}
+default_models = ('phi3','GHT')
+default_loops = 2
+
+
+def load_xml_nodes(file_path):
+    """Read the <diagram> nodes of a QGRAF output"""
+    return [node for event,node in iterparse(file_path) if node.tag == "diagram"]
+
+
+def construct_diagrams(nodes,model):
+    """Create the Diagram objects of a list of <diagram> nodes"""
+    return [Diagram(node,model,'XML') for node in nodes]
+
+
+def lookup_model_objects(diagrams,model):
+    """Look up the interaction of every vertex and the propagator of every propagator of a list of diagrams
+
+    Returns
+    -------
+    int
+        number of lookups
+    """
+    n_lookups = 0
+    for diagram in diagrams:
+        for vertex in diagram.vertices:
+            model.interactions.lookup_with_permutation([field.name for field in vertex.fields.values()])
+        for propagator in diagram.propagators:
+            model.propagators[[propagator.from_field.name,propagator.to_field.name]]
+        n_lookups += len(diagram.vertices)+len(diagram.propagators)
+    return n_lookups
+
+
+def generate_expressions(diagrams):
+    """Generate the expression of every diagram of a list"""
+    return [diagram.generate_expression() for diagram in diagrams]
+
+
+def write_form(diagrams,directory):
+    """Write a list of diagrams to FORM files"""
+    return FormWriter(directory,'CHUNKS').write_diagrams(diagrams)
+
+
+class StageResult(object):
+    """Measurement of a stage on a corpus
+
+    Attributes
+    ----------
+    seconds : float
+        best wall-clock time over the repetitions
+    peak_bytes : int or None
+        peak memory allocated during the stage, None if not measured
+    n_diagrams : int
+    """
+    def __init__(self,seconds,peak_bytes,n_diagrams):
+        self.seconds = seconds
+        self.peak_bytes = peak_bytes
+        self.n_diagrams = n_diagrams
+
+    def to_dict(self):
+        return {"seconds": self.seconds,"peak_bytes": self.peak_bytes,"n_diagrams": self.n_diagrams}
+
+    @classmethod
+    def from_dict(cls,data):
+        return cls(data["seconds"],data.get("peak_bytes"),data["n_diagrams"])
+
+    def nice_string(self):
+        memory = "{:10.1f} MB".format(self.peak_bytes/2**20) if self.peak_bytes is not None else "{:>13}".format("-")
+        return "{:9.4f}s {} {:9.0f} diagrams/s".format(self.seconds,memory,self.n_diagrams/max(self.seconds,1e-9))
+    def __str__(self):
+        return self.nice_string()
+    def __repr__(self):
+        return "StageResult({})".format(self.nice_string())
+
+
+def measure(function,repeat=3,memory=True):
+    """Time a function and measure its peak memory allocation
+
+    Parameters
+    ----------
+    function : callable
+        called without arguments
+    repeat : int
+        number of timed calls, of which the fastest is kept
+    memory : bool
+        measure the peak memory in an additional call under tracemalloc, which slows it down
+
+    Returns
+    -------
+    tuple:
+        (result of the last timed call,seconds,peak bytes or None)
+    """
+    best = float("inf")
+    result = None
+    for repetition in range(repeat):
+        result = None
+        gc.collect()
+        start = perf_counter()
+        result = function()
+        best = min(best,perf_counter()-start)
+    peak_bytes = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            function()
+            _,peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return result,best,peak_bytes
+
+
+def run_corpus(file_path,model,n_diagrams,repeat=3,memory=True):
+    """Measure all the stages on a corpus
+
+    Each stage takes the output of the previous one as input, computed outside of the measurement.
+
+    Returns
+    -------
+    dict of {str: StageResult}
+        keyed by stage name
+    """
+    results = {}
+    nodes,seconds,peak_bytes = measure(lambda: load_xml_nodes(file_path),repeat,memory)
+    results['xml_load'] = StageResult(seconds,peak_bytes,n_diagrams)
+    diagrams,seconds,peak_bytes = measure(lambda: construct_diagrams(nodes,model),repeat,memory)
+    results['construction'] = StageResult(seconds,peak_bytes,n_diagrams)
+    del nodes
+    _,seconds,peak_bytes = measure(lambda: lookup_model_objects(diagrams,model),repeat,memory)
+    results['lookup'] = StageResult(seconds,peak_bytes,n_diagrams)
+    _,seconds,peak_bytes = measure(lambda: generate_expressions(diagrams),repeat,memory)
+    results['feynman_rules'] = StageResult(seconds,peak_bytes,n_diagrams)
+    with tempfile.TemporaryDirectory() as form_dir:
+        _,seconds,peak_bytes = measure(lambda: write_form(diagrams,form_dir),repeat,memory)
+    results['form_writing'] = StageResult(seconds,peak_bytes,n_diagrams)
+    return results
+
+
+def result_key(model_name,size,stage):
+    return "{}/{}/{}".format(model_name,size,stage)
+
+
+def run_suite(models=default_models,sizes=('small','medium','large'),n_loops=default_loops,repeat=3,memory=True,
+              seed=0):
+    """Run the suite on the corpora of each model and size
+
+    Parameters
+    ----------
+    models : list of str
+        names of models of qgraf_parser.models, or importable model modules
+    sizes : list of str
+        keys of corpus_sizes
+    n_loops : int
+    repeat : int
+    memory : bool
+        see measure
+    seed : int
+        seed of the corpora
+
+    Returns
+    -------
+    dict
+        the results in the JSON layout: metadata and a "results" dictionary of StageResult dictionaries keyed by
+        'model/size/stage'
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        for model_name in models:
+            model = importlib.import_module(model_name if "." in model_name else "qgraf_parser.models."+model_name)
+            for size in sizes:
+                n_diagrams = corpus_sizes[size]
+                file_path = os.path.join(corpus_dir,"{}_{}.xml".format(model_name,size))
+                write_corpus(file_path,model,n_diagrams,n_loops,seed=seed,n_distinct=None)
+                for stage,result in run_corpus(file_path,model,n_diagrams,repeat,memory).items():
+                    results[result_key(model_name,size,stage)] = result
+                    print("{:<28} {}".format(result_key(model_name,size,stage),result))
+                os.remove(file_path)
+    return {"version": results_format_version,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "n_loops": n_loops,
+            "repeat": repeat,
+            "results": {key: result.to_dict() for key,result in results.items()}}
+
+
+def write_results(results,file_path):
+    """Write suite results to a JSON file"""
+    with open(file_path,"w") as results_file:
+        json.dump(results,results_file,indent=1,sort_keys=True)
+
+
+def read_results(file_path):
+    """Read suite results from a JSON file
+
+    Returns
+    -------
+    dict of {str: StageResult}
+    """
+    with open(file_path) as results_file:
+        data = json.load(results_file)
+    if data.get("version") != results_format_version:
+        error = ValueError("{} is not a benchmark result file of version {}".format(file_path,results_format_version))
+        logger.error(error)
+        raise error
+    return {key: StageResult.from_dict(result) for key,result in data["results"].items()}
+
+
+class Regression(object):
+    """A measurement that exceeds its baseline
+
+    Attributes
+    ----------
+    key : str
+        'model/size/stage'
+    quantity : str
+        'seconds' or 'peak_bytes'
+    baseline, current : float
+    """
+    def __init__(self,key,quantity,baseline,current):
+        self.key = key
+        self.quantity = quantity
+        self.baseline = baseline
+        self.current = current
+
+    @property
+    def ratio(self):
+        return self.current/self.baseline
+
+    def nice_string(self):
+        return "{r.key} {r.quantity}: {r.baseline:.4g} -> {r.current:.4g} (x{r.ratio:.2f})".format(r=self)
+    def __str__(self):
+        return self.nice_string()
+    def __repr__(self):
+        return "Regression({})".format(self.nice_string())
+
+
+def compare_results(baseline,current,threshold=0.2):
+    """Compare results to a baseline
+
+    Parameters
+    ----------
+    baseline, current : dict of {str: StageResult}
+    threshold : float
+        relative increase above which a measurement is a regression
+
+    Returns
+    -------
+    list of Regression
+    """
+    regressions = []
+    for key in sorted(set(baseline) & set(current)):
+        for quantity in ('seconds','peak_bytes'):
+            baseline_value = getattr(baseline[key],quantity)
+            current_value = getattr(current[key],quantity)
+            if not baseline_value or current_value is None:
+                continue
+            if current_value > baseline_value*(1+threshold):
+                regressions.append(Regression(key,quantity,baseline_value,current_value))
+    return regressions
+
+
+def print_comparison(baseline,current):
+    """Print the ratio of the current time and memory to the baseline for every measurement"""
+    print("{:<28} {:>10} {:>10}".format("","time","memory"))
+    for key in sorted(set(baseline) & set(current)):
+        ratios = []
+        for quantity in ('seconds','peak_bytes'):
+            baseline_value = getattr(baseline[key],quantity)
+            current_value = getattr(current[key],quantity)
+            ratios.append("x{:.2f}".format(current_value/baseline_value) if baseline_value and current_value
+                          is not None else "-")
+        print("{:<28} {:>10} {:>10}".format(key,*ratios))
+
+
+def main(arguments=None):
+    """Command line interface of the suite
+
+    Returns
+    -------
+    int
+        exit status: 1 if regressions were found
+    """
+    parser = argparse.ArgumentParser(prog="python -m qgraf_parser.benchmarks",
+                                     description="Benchmark suite of qgraf_parser")
+    commands = parser.add_subparsers(dest="command",required=True)
+    run_parser = commands.add_parser("run",help="run the suite and write the results")
+    run_parser.add_argument("--models",nargs="+",default=list(default_models))
+    run_parser.add_argument("--sizes",nargs="+",default=list(corpus_sizes),choices=list(corpus_sizes))
+    run_parser.add_argument("--loops",type=int,default=default_loops)
+    run_parser.add_argument("--repeat",type=int,default=3)
+    run_parser.add_argument("--no-memory",action="store_true",help="skip the tracemalloc measurements")
+    run_parser.add_argument("--seed",type=int,default=0)
+    run_parser.add_argument("--output",default="benchmark_results.json")
+    run_parser.add_argument("--baseline",help="compare the results to this baseline")
+    run_parser.add_argument("--threshold",type=float,default=0.2)
+    compare_parser = commands.add_parser("compare",help="compare results to a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold",type=float,default=0.2)
+    options = parser.parse_args(arguments)
+
+    if options.command == "run":
+        results = run_suite(options.models,options.sizes,options.loops,options.repeat,not options.no_memory,
+                            options.seed)
+        write_results(results,options.output)
+        print("Results written to {}".format(options.output))
+        if options.baseline is None:
+            return 0
+        baseline,current = read_results(options.baseline),read_results(options.output)
+    else:
+        baseline,current = read_results(options.baseline),read_results(options.current)
+    print_comparison(baseline,current)
+    regressions = compare_results(baseline,current,options.threshold)
+    if regressions:
+        print("{} regressions beyond {:.0%}:".format(len(regressions),options.threshold))
+        for regression in regressions:
+            print("  "+regression.nice_string())
+        return 1
+    print("No regression beyond {:.0%}".format(options.threshold))
+    return 0
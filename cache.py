@@ -0,0 +1,211 @@
+"""Size-bounded on-disk caches for the qgraf_parser module
+
+A CacheDirectory stores one file per entry, named after a key that is typically a hash of the inputs that determine
+the content of the entry. Entries are written atomically and their modification time records when they were last used,
+such that the least recently used entries are evicted first when the total size of the directory exceeds its bound.
+"""
+import os
+import time
+import tempfile
+from hashlib import sha256
+import logging
+logger=logging.getLogger(__name__)
+
+default_cache_root = os.path.join(os.environ.get("XDG_CACHE_HOME",os.path.join(os.path.expanduser("~"),".cache")),
+                                  "qgraf_parser")
+
+
+def hash_file(file_path,hasher=None,chunk_size=1<<20):
+    """Update a hash object with the content of a file
+
+    Parameters
+    ----------
+    file_path : str
+    hasher : hashlib hash object, optional
+        Defaults to a new sha256 object
+    chunk_size : int, optional
+
+    Returns
+    -------
+    hashlib hash object
+    """
+    if hasher is None:
+        hasher = sha256()
+    with open(file_path,"rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size),b""):
+            hasher.update(chunk)
+    return hasher
+
+
+class CacheEntry(object):
+    """Description of an entry of a CacheDirectory
+
+    Attributes
+    ----------
+    key : str
+    path : str
+    size : int
+        size in bytes
+    last_used : float
+        time of last use, in seconds since the epoch
+    """
+    def __init__(self,key,path,size,last_used):
+        self.key = key
+        self.path = path
+        self.size = size
+        self.last_used = last_used
+
+    def nice_string(self):
+        return "{e.key} {e.size:>12d} B  last used {date}".format(e=self,date=time.ctime(self.last_used))
+    def __str__(self):
+        return self.nice_string()
+    def __repr__(self):
+        return "CacheEntry({})".format(self.key)
+
+
+class CacheDirectory(object):
+    """A directory of cache entries with least-recently-used eviction
+
+    Attributes
+    ----------
+    path : str
+        path of the cache directory, created if needed
+    max_size : int or None
+        maximal total size of the entries in bytes. None means unbounded.
+    suffix : str
+        file extension of the entries
+    """
+    def __init__(self,path,max_size=None,suffix=".cache"):
+        self.path = path
+        self.max_size = max_size
+        self.suffix = suffix
+        os.makedirs(path,exist_ok=True)
+
+    def entry_path(self,key):
+        """Path of the file of an entry"""
+        return os.path.join(self.path,key+self.suffix)
+
+    def lookup(self,key):
+        """Find an entry and mark it as used
+
+        Parameters
+        ----------
+        key : str
+
+        Returns
+        -------
+        str or None
+            the path of the entry file if it exists
+        """
+        path = self.entry_path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def store(self,key,write):
+        """Create or replace an entry, then evict entries if the cache is too large
+
+        The content is first written to a temporary file which is moved into place once complete, such that concurrent
+        readers never see a partial entry.
+
+        Parameters
+        ----------
+        key : str
+        write : callable
+            function called with a binary file object open for writing, which writes the content of the entry
+
+        Returns
+        -------
+        str
+            the path of the entry file
+        """
+        path = self.entry_path(key)
+        file_descriptor,tmp_path = tempfile.mkstemp(dir=self.path,suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor,"wb") as file:
+                write(file)
+            os.replace(tmp_path,path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.evict(keep=key)
+        return path
+
+    def entries(self):
+        """List the entries of the cache, most recently used first
+
+        Returns
+        -------
+        list of CacheEntry
+        """
+        entries = []
+        for file_name in os.listdir(self.path):
+            if not file_name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.path,file_name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append(CacheEntry(file_name[:-len(self.suffix)],path,stat.st_size,stat.st_mtime))
+        entries.sort(key=lambda entry: entry.last_used,reverse=True)
+        return entries
+
+    def total_size(self):
+        """Total size of the entries in bytes"""
+        return sum(entry.size for entry in self.entries())
+
+    def remove(self,key):
+        """Remove an entry if it exists
+
+        Returns
+        -------
+        bool
+            whether an entry was removed
+        """
+        try:
+            os.remove(self.entry_path(key))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def evict(self,keep=None):
+        """Remove the least recently used entries until the cache fits in max_size
+
+        Parameters
+        ----------
+        keep : str, optional
+            key of an entry that is never evicted, typically the one that was just stored
+
+        Returns
+        -------
+        list of CacheEntry
+            the evicted entries
+        """
+        if self.max_size is None:
+            return []
+        entries = self.entries()
+        total_size = sum(entry.size for entry in entries)
+        evicted = []
+        for entry in reversed(entries):
+            if total_size <= self.max_size:
+                break
+            if entry.key == keep:
+                continue
+            if self.remove(entry.key):
+                logger.info("Evicting cache entry {} from {}".format(entry.key,self.path))
+                total_size -= entry.size
+                evicted.append(entry)
+        return evicted
+
+    def purge(self):
+        """Remove all the entries
+
+        Returns
+        -------
+        int
+            number of removed entries
+        """
+        return sum(self.remove(entry.key) for entry in self.entries())
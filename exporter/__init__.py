@@ -0,0 +1,20 @@
+'''This module writes the expressions of diagram sets to files that can be processed by FORM.
+
+The main functions are
+* write_form_files, which streams diagrams to FORM files, one per diagram or in chunks of many Local expressions
+* FormWriter, the underlying writer, whose options control the layout of the files
+* emit_form_parallel, which writes the same files as write_form_files from a QGRAF output on a pool of processes
+* FormRunner, which runs FORM on the written files concurrently, with timeouts and retries
+* write_declarations, which writes the FORM declarations of a model to a header shared by all the files
+
+The supported modes are:
+* FILES: one file per diagram
+* CHUNKS: a fixed number of diagrams per file
+'''
+import logging
+logger=logging.getLogger(__name__)
+
+from .form_writer import FormWriter,BufferedTextWriter,write_form_files,read_manifest
+from .parallel import emit_form_parallel,EmissionReport
+from .form_runner import FormRunner,RunSummary
+from .declarations import model_declarations,write_declarations
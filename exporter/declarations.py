@@ -0,0 +1,100 @@
+"""Shared FORM declarations generated from a model
+
+The declarations needed by the expressions of a model are the same for all its diagrams. They are written once to a
+header file that every diagram file includes. The declarations are built from
+
+- the parameters of the model, declared as Symbols. FORM built-in objects, whose names end with an underscore, are
+  left out.
+- the functions used by the Feynman rules of the model, listed in the optional `form_functions` attribute of the model
+  module and declared as CFunctions
+- the index families of the model, given by the optional `form_index_families` attribute of the model module, which
+  maps the prefix of each family to its dimension. Indices are then auto-declared by prefix with that dimension, such
+  that families of different dimensions need no global Dimension statement.
+- the prefixes of the momenta, which are auto-declared as Vectors
+
+The first line of the header records a hash of its content, such that the file is only rewritten when the model
+changes. Files that include it are then not considered outdated by build tools.
+"""
+import os
+import re
+from hashlib import sha256
+import logging
+logger=logging.getLogger(__name__)
+
+declarations_file_name = "declarations.h"
+default_momentum_prefixes = ("k","p","q")
+form_name_pattern = re.compile(r"[A-Za-z][A-Za-z0-9]*$")
+
+
+def model_declarations(model,momentum_prefixes=default_momentum_prefixes):
+    """Generate the FORM declarations of a model
+
+    Parameters
+    ----------
+    model : module
+        the module defining the model properties
+    momentum_prefixes : tuple of str, optional
+
+    Returns
+    -------
+    str
+    """
+    functions = list(getattr(model,"form_functions",()))
+    index_families = dict(getattr(model,"form_index_families",{}))
+    symbols = []
+    for parameter in model.parameters:
+        symbol = str(parameter)
+        if not form_name_pattern.match(symbol):
+            logger.debug("The parameter {} is not a FORM symbol and is not declared".format(parameter.name))
+        elif symbol in functions:
+            logger.warning("The parameter {} has the name of the function {} and is not declared".format(
+                parameter.name,symbol))
+        elif symbol not in symbols:
+            symbols.append(symbol)
+    for dimension in index_families.values():
+        if form_name_pattern.match(dimension) and dimension not in symbols:
+            symbols.append(dimension)
+
+    lines = []
+    if symbols:
+        lines.append("Symbols {};".format(",".join(symbols)))
+    if functions:
+        lines.append("CFunctions {};".format(",".join(functions)))
+    if index_families:
+        lines.append("AutoDeclare Index {};".format(",".join("{}={}".format(prefix,dimension)
+                                                            for prefix,dimension in index_families.items())))
+    if momentum_prefixes:
+        lines.append("AutoDeclare Vectors {};".format(",".join(momentum_prefixes)))
+    return "\n".join(lines)+"\n"
+
+
+def write_declarations(model,directory,file_name=declarations_file_name,momentum_prefixes=default_momentum_prefixes):
+    """Write the declarations header of a model, unless an identical header is already there
+
+    Parameters
+    ----------
+    model : module
+    directory : str
+    file_name : str, optional
+    momentum_prefixes : tuple of str, optional
+
+    Returns
+    -------
+    tuple:
+        (path,written) where written tells whether the file was (re)written
+    """
+    declarations = model_declarations(model,momentum_prefixes)
+    digest = sha256(declarations.encode()).hexdigest()
+    first_line = "* Declarations of the model {} generated by qgraf_parser, hash {}\n".format(model.__name__,digest)
+    path = os.path.join(directory,file_name)
+    try:
+        with open(path) as file:
+            if file.readline() == first_line:
+                return path,False
+    except FileNotFoundError:
+        pass
+    os.makedirs(directory,exist_ok=True)
+    with open(path,"w") as file:
+        file.write(first_line+declarations)
+    logger.info("Wrote the declarations of {} to {}".format(model.__name__,path))
+    return path,True
@@ -0,0 +1,185 @@
+"""Batch execution of FORM on emitted diagram files
+
+A FormRunner runs FORM (or TFORM) on a list of files, typically those listed in the manifest of an output directory
+written by a FormWriter. Jobs are run concurrently by a pool of threads, each of them waiting for one FORM process.
+Every job has a timeout, failed jobs are retried a given number of times and the outcome of all the jobs is
+collected in a RunSummary.
+
+FORM is run in the directory of each file, such that the headers included by the files are found. Its standard
+output and error are written next to the file, to <file>.out, since FORM output can be large.
+"""
+import os
+import subprocess
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor,wait,FIRST_COMPLETED
+from .form_writer import read_manifest
+import logging
+logger=logging.getLogger(__name__)
+
+default_form_binary = os.environ.get("QGRAF_PARSER_FORM","form")
+
+
+class FormJobResult(object):
+    """Outcome of the execution of FORM on a file
+
+    Attributes
+    ----------
+    file_path : str
+    returncode : int or None
+        return code of the last attempt, None if it timed out or could not be started
+    attempts : int
+    elapsed : float
+        wall-clock time of the last attempt in seconds
+    error : str
+        description of the failure of the last attempt, empty on success
+    output_path : str
+        file holding the output of FORM
+    """
+    def __init__(self,file_path,returncode,attempts,elapsed,error,output_path):
+        self.file_path = file_path
+        self.returncode = returncode
+        self.attempts = attempts
+        self.elapsed = elapsed
+        self.error = error
+        self.output_path = output_path
+
+    @property
+    def succeeded(self):
+        return self.returncode == 0
+
+    def nice_string(self):
+        status = "ok" if self.succeeded else "FAILED ({})".format(self.error)
+        return "{r.file_path}: {status} after {r.attempts} attempt(s), {r.elapsed:.2f}s".format(r=self,status=status)
+    def __str__(self):
+        return self.nice_string()
+    def __repr__(self):
+        return "FormJobResult({})".format(self.file_path)
+
+
+class RunSummary(object):
+    """Outcome of a batch of FORM jobs
+
+    Attributes
+    ----------
+    results : list of FormJobResult
+        in the order of the input files
+    elapsed : float
+        wall-clock time of the batch in seconds
+    """
+    def __init__(self,results,elapsed):
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def failures(self):
+        return [result for result in self.results if not result.succeeded]
+
+    @property
+    def n_retried(self):
+        return sum(result.attempts > 1 for result in self.results)
+
+    def nice_string(self):
+        lines = ["{} jobs in {:.2f}s: {} succeeded, {} failed, {} retried".format(
+            len(self.results),self.elapsed,len(self.results)-len(self.failures),len(self.failures),self.n_retried)]
+        lines += ["  "+failure.nice_string() for failure in self.failures]
+        return "\n".join(lines)
+    def __str__(self):
+        return self.nice_string()
+    def __repr__(self):
+        return "RunSummary({} jobs)".format(len(self.results))
+
+
+class FormRunner(object):
+    """Run FORM on many files concurrently
+
+    Attributes
+    ----------
+    form_binary : str
+        path or name of the FORM executable. Defaults to the environment variable QGRAF_PARSER_FORM, or to `form`.
+    options : list of str
+        command line options passed before the file name, e.g. ['-w4'] for TFORM
+    concurrency : int
+        number of FORM processes run at once
+    timeout : float or None
+        time limit of a job in seconds
+    retries : int
+        number of times a failed job is run again
+    """
+    def __init__(self,form_binary=default_form_binary,options=(),concurrency=None,timeout=None,retries=1):
+        self.form_binary = form_binary
+        self.options = list(options)
+        self.concurrency = concurrency or os.cpu_count() or 1
+        self.timeout = timeout
+        self.retries = retries
+
+    def run_job(self,file_path,attempt):
+        """Run FORM once on a file
+
+        Parameters
+        ----------
+        file_path : str
+        attempt : int
+            number of the attempt, starting at 1
+
+        Returns
+        -------
+        FormJobResult
+        """
+        directory,file_name = os.path.split(os.path.abspath(file_path))
+        output_path = os.path.abspath(file_path)+".out"
+        start = perf_counter()
+        returncode = None
+        error = ""
+        with open(output_path,"wb") as output:
+            try:
+                returncode = subprocess.run([self.form_binary]+self.options+[file_name],cwd=directory,
+                                            stdout=output,stderr=subprocess.STDOUT,timeout=self.timeout).returncode
+                if returncode != 0:
+                    error = "return code {}".format(returncode)
+            except subprocess.TimeoutExpired:
+                error = "timeout after {}s".format(self.timeout)
+            except OSError as os_error:
+                error = str(os_error)
+        return FormJobResult(file_path,returncode,attempt,perf_counter()-start,error,output_path)
+
+    def run(self,file_paths):
+        """Run FORM on a list of files
+
+        Parameters
+        ----------
+        file_paths : iterable of str
+
+        Returns
+        -------
+        RunSummary
+        """
+        start = perf_counter()
+        file_paths = list(file_paths)
+        results = [None]*len(file_paths)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = {executor.submit(self.run_job,file_path,1): index for index,file_path in enumerate(file_paths)}
+            while pending:
+                done,_ = wait(pending,return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    result = future.result()
+                    if not result.succeeded and result.attempts <= self.retries:
+                        logger.warning("Retrying {}".format(result.nice_string()))
+                        pending[executor.submit(self.run_job,result.file_path,result.attempts+1)] = index
+                    else:
+                        results[index] = result
+        summary = RunSummary(results,perf_counter()-start)
+        if summary.failures:
+            logger.error(summary.nice_string())
+        else:
+            logger.info(summary.nice_string())
+        return summary
+
+    def run_directory(self,directory):
+        """Run FORM on the files listed in the manifest of an output directory of a FormWriter
+
+        Returns
+        -------
+        RunSummary
+        """
+        return self.run(os.path.join(directory,entry.file_name) for entry in read_manifest(directory))
@@ -0,0 +1,286 @@
+"""Streaming writer of diagram expressions to FORM files
+
+A FormWriter consumes an iterator of diagrams and writes the expression of each of them as a FORM `Local`
+expression, either in one file per diagram ('FILES' mode) or in files holding a fixed number of diagrams ('CHUNKS'
+mode). Only one diagram and one output buffer are held in memory at a time, such that arbitrarily many diagrams can
+be written. The text of the expressions is accumulated in a BufferedTextWriter and reaches the files in large writes.
+
+Each file is laid out as
+
+    <preamble>
+    #include declarations.h          (when a model is given, see declarations)
+    #include subexpressions.h        (when a SubexpressionTable is given)
+    Local d1 = ...;
+    Local d2 = ...;
+    #call subexpressions             (when a SubexpressionTable is given)
+    <epilogue>
+
+The files are listed in order in a manifest, manifest.txt, with the number of diagrams and the first and last diagram
+ids of each file.
+"""
+import os
+import importlib
+from qgraf_parser.models.common_tools.algebra_tools import write_expression
+from .declarations import write_declarations,declarations_file_name
+import logging
+logger=logging.getLogger(__name__)
+
+default_buffer_size = 1<<20
+subexpressions_file_name = "subexpressions.h"
+manifest_file_name = "manifest.txt"
+manifest_header = "# qgraf_parser FORM manifest v1\n"
+
+
+class ManifestEntry(object):
+    """Description of a file written by a FormWriter
+
+    Attributes
+    ----------
+    file_name : str
+        name of the file in the output directory
+    n_diagrams : int
+    first_id, last_id : str
+        ids of the first and last diagrams of the file
+    """
+    def __init__(self,file_name,n_diagrams,first_id,last_id):
+        self.file_name = file_name
+        self.n_diagrams = int(n_diagrams)
+        self.first_id = first_id
+        self.last_id = last_id
+
+    def nice_string(self):
+        return "{e.file_name} {e.n_diagrams} {e.first_id} {e.last_id}".format(e=self)
+    def __str__(self):
+        return self.nice_string()
+    def __repr__(self):
+        return "ManifestEntry({})".format(self.file_name)
+
+
+def write_manifest(directory,entries):
+    """Write the manifest of the files of an output directory
+
+    Parameters
+    ----------
+    directory : str
+    entries : list of ManifestEntry
+        in order
+
+    Returns
+    -------
+    str
+        path of the manifest
+    """
+    path = os.path.join(directory,manifest_file_name)
+    with open(path,"w") as file:
+        file.write(manifest_header+"".join(entry.nice_string()+"\n" for entry in entries))
+    return path
+
+
+def read_manifest(directory):
+    """Read the manifest of an output directory
+
+    Returns
+    -------
+    list of ManifestEntry
+    """
+    with open(os.path.join(directory,manifest_file_name)) as file:
+        if file.readline() != manifest_header:
+            error = IOError("{} is not a qgraf_parser FORM manifest".format(file.name))
+            logger.error(error)
+            raise error
+        return [ManifestEntry(*line.split()) for line in file if line.strip()]
+
+
+class BufferedTextWriter(object):
+    """Accumulate small pieces of text and write them to a file in large blocks
+
+    Attributes
+    ----------
+    file : text file object
+    buffer_size : int
+        number of characters accumulated before writing to the file
+    """
+    def __init__(self,file,buffer_size=default_buffer_size):
+        self.file = file
+        self.buffer_size = buffer_size
+        self.pieces = []
+        self.size = 0
+
+    def write(self,text):
+        self.pieces.append(text)
+        self.size += len(text)
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.pieces:
+            self.file.write("".join(self.pieces))
+            self.pieces = []
+            self.size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc_info):
+        self.flush()
+
+
+class FormWriter(object):
+    """Write the expressions of diagrams to FORM files
+
+    Attributes
+    ----------
+    directory : str
+        output directory, created if needed
+    mode : str
+        'FILES' for one file per diagram, 'CHUNKS' for chunk_size diagrams per file
+    chunk_size : int
+    preamble : str
+        text written at the start of every file, e.g. declarations or an #include statement
+    epilogue : str
+        text written at the end of every file
+    subexpressions : qgraf_parser.models.common_tools.subexpressions.SubexpressionTable or None
+        if given, the expressions are written with the names of the subexpressions of the table, whose definitions
+        are written once in the file subexpressions.h of the output directory
+    model : module or None
+        if given, the declarations of the model are written once in the file declarations.h of the output directory,
+        which is only rewritten when the model changes
+    expression_name : str
+        format of the name of the FORM expression of a diagram, from its id
+    buffer_size : int
+    """
+    def __init__(self,directory,mode='CHUNKS',chunk_size=1000,preamble="",epilogue=".end\n",subexpressions=None,
+                 model=None,expression_name="d{}",buffer_size=default_buffer_size):
+        if mode not in ('FILES','CHUNKS'):
+            error = ValueError("{} is not a valid output mode for FormWriter".format(mode))
+            logger.error(error)
+            raise error
+        self.directory = directory
+        self.mode = mode
+        self.chunk_size = chunk_size if mode == 'CHUNKS' else 1
+        self.preamble = preamble
+        self.epilogue = epilogue
+        self.subexpressions = subexpressions
+        self.model = model
+        self.expression_name = expression_name
+        self.buffer_size = buffer_size
+        os.makedirs(directory,exist_ok=True)
+
+    def file_path(self,diagrams,chunk_index):
+        """Path of the file of a chunk, from its diagrams and its index (starting at 1)"""
+        if self.mode == 'FILES':
+            return os.path.join(self.directory,"diagram{}.frm".format(diagrams[0].id))
+        return os.path.join(self.directory,"diagrams{}.frm".format(chunk_index))
+
+    def write_subexpressions(self):
+        """Write the declarations and the procedure of the subexpressions to subexpressions.h"""
+        with open(os.path.join(self.directory,subexpressions_file_name),"w") as file:
+            with BufferedTextWriter(file,self.buffer_size) as writer:
+                self.subexpressions.write_declarations(writer.write)
+                self.subexpressions.write_procedure(writer.write)
+
+    def write_diagram(self,diagram,write):
+        """Write the Local expression of a diagram"""
+        write("Local {} = ".format(self.expression_name.format(diagram.id)))
+        expression = diagram.generate_expression()
+        if self.subexpressions is None:
+            write_expression(expression,write)
+        else:
+            self.subexpressions.write(expression,write)
+        write(";\n")
+
+    def __getstate__(self):
+        # Models are modules, which are sent to worker processes by name
+        state = self.__dict__.copy()
+        if self.model is not None:
+            state["model"] = self.model.__name__
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        if self.model is not None:
+            self.model = importlib.import_module(self.model)
+
+    def write_chunk(self,diagrams,file_path):
+        """Write a list of diagrams to one file
+
+        Parameters
+        ----------
+        diagrams : list of qgraf_parser.diagram_elements.Diagram
+        file_path : str
+
+        Returns
+        -------
+        ManifestEntry
+        """
+        with open(file_path,"w") as file:
+            with BufferedTextWriter(file,self.buffer_size) as writer:
+                writer.write(self.preamble)
+                if self.model is not None:
+                    writer.write("#include {}\n".format(declarations_file_name))
+                if self.subexpressions is not None:
+                    writer.write("#include {}\n".format(subexpressions_file_name))
+                for diagram in diagrams:
+                    self.write_diagram(diagram,writer.write)
+                if self.subexpressions is not None:
+                    writer.write("#call subexpressions\n")
+                writer.write(self.epilogue)
+        return ManifestEntry(os.path.basename(file_path),len(diagrams),diagrams[0].id,diagrams[-1].id)
+
+    def iter_chunks(self,diagrams):
+        """Group an iterable of diagrams into lists of chunk_size diagrams"""
+        chunk = []
+        for diagram in diagrams:
+            chunk.append(diagram)
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def write_headers(self):
+        """Write the files shared by all the diagram files: declarations and subexpressions"""
+        if self.model is not None:
+            write_declarations(self.model,self.directory)
+        if self.subexpressions is not None:
+            self.write_subexpressions()
+
+    def write_diagrams(self,diagrams):
+        """Write diagrams to FORM files, followed by the manifest
+
+        Parameters
+        ----------
+        diagrams : iterable of qgraf_parser.diagram_elements.Diagram
+
+        Returns
+        -------
+        list of str
+            paths of the written files, in order
+        """
+        self.write_headers()
+        entries = []
+        for chunk_index,chunk in enumerate(self.iter_chunks(diagrams),1):
+            entries.append(self.write_chunk(chunk,self.file_path(chunk,chunk_index)))
+        write_manifest(self.directory,entries)
+        logger.info("Wrote {} FORM files to {}".format(len(entries),self.directory))
+        return [os.path.join(self.directory,entry.file_name) for entry in entries]
+
+
+def write_form_files(diagrams,directory,mode='CHUNKS',**options):
+    """Write the expressions of diagrams to FORM files
+
+    Parameters
+    ----------
+    diagrams : iterable of qgraf_parser.diagram_elements.Diagram
+    directory : str
+    mode : str
+        'FILES' for one file per diagram, 'CHUNKS' for many Local expressions per file
+    options : dict
+        other options of FormWriter
+
+    Returns
+    -------
+    list of str
+        paths of the written files, in order
+    """
+    return FormWriter(directory,mode,**options).write_diagrams(diagrams)
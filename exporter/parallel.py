@@ -0,0 +1,155 @@
+"""Emission of FORM files on several processes
+
+The diagram blocks (or lines) of a QGRAF output are read by the main process and sent in chunks to a pool of worker
+processes. Each worker creates the diagrams of a chunk, generates their expressions and writes them to the chunk file
+with a FormWriter, exactly as a serial FormWriter#write_diagrams would: chunk k of the output always holds the same
+diagrams and has the same name. The main process only collects the manifest entries of the chunks, in order, and
+writes the manifest, such that the output directory is byte-identical to the one of a serial run.
+
+As for the import on several processes, the model must be an importable module (see qgraf_parser.importer.parallel).
+"""
+import os
+from time import perf_counter
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from qgraf_parser.importer.parallel import init_worker,create_worker_diagrams,generate_raw_diagram_nodes,\
+    model_module_name
+from .form_writer import FormWriter,write_manifest
+import logging
+logger=logging.getLogger(__name__)
+
+# FormWriter of a worker process, set by init_emission_worker
+worker_writer = None
+
+
+def init_emission_worker(model_name,writer):
+    """Import the model and set the FormWriter of a worker process
+
+    Parameters
+    ----------
+    model_name : str
+        importable name of the model module
+    writer : FormWriter
+    """
+    global worker_writer
+    init_worker(model_name)
+    worker_writer = writer
+
+
+def emit_chunk(nodes,mode,chunk_index):
+    """Create the diagrams of a chunk of raw nodes and write them to FORM files in a worker process
+
+    Parameters
+    ----------
+    nodes : list of bytes or str
+    mode : str
+        input mode of the nodes
+    chunk_index : int
+        index of the chunk file in 'CHUNKS' mode, starting at 1
+
+    Returns
+    -------
+    list of qgraf_parser.exporter.form_writer.ManifestEntry
+    """
+    diagrams = create_worker_diagrams(nodes,mode)
+    if worker_writer.mode == 'CHUNKS':
+        return [worker_writer.write_chunk(diagrams,worker_writer.file_path(diagrams,chunk_index))]
+    return [worker_writer.write_chunk([diagram],worker_writer.file_path([diagram],None)) for diagram in diagrams]
+
+
+class EmissionReport(object):
+    """Summary of an emission run
+
+    Attributes
+    ----------
+    n_diagrams : int
+    file_paths : list of str
+        the written files, in order
+    elapsed : float
+        wall-clock time in seconds
+    workers : int
+    """
+    def __init__(self,n_diagrams,file_paths,elapsed,workers):
+        self.n_diagrams = n_diagrams
+        self.file_paths = file_paths
+        self.elapsed = elapsed
+        self.workers = workers
+
+    @property
+    def diagrams_per_second(self):
+        return self.n_diagrams/self.elapsed if self.elapsed > 0 else float("inf")
+
+    def nice_string(self):
+        return "{r.n_diagrams} diagrams written to {n_files} files in {r.elapsed:.2f}s by {r.workers} workers: " \
+               "{r.diagrams_per_second:.0f} diagrams/s".format(r=self,n_files=len(self.file_paths))
+    def __str__(self):
+        return self.nice_string()
+    def __repr__(self):
+        return "EmissionReport({} diagrams)".format(self.n_diagrams)
+
+
+def emit_form_parallel(file_path,model,directory,mode='XML',output_mode='CHUNKS',workers=None,task_size=256,
+                       declarations=False,**writer_options):
+    """Write the FORM files of the diagrams of a QGRAF output using a pool of processes
+
+    At most 2*workers chunks are in flight at any time, such that the memory usage does not grow with the size of the
+    file.
+
+    Parameters
+    ----------
+    file_path : str
+        string path to the QGRAF output
+    model : module
+        the module defining the model properties. It must be importable by name.
+    directory : str
+        output directory
+    mode : str
+        input mode: 'XML', 'MMAP' or 'LINE'
+    output_mode : str
+        'FILES' or 'CHUNKS', see FormWriter
+    workers : int, optional
+        number of worker processes. Defaults to the number of CPUs.
+    task_size : int, optional
+        number of diagrams sent to a worker at once in 'FILES' output mode. In 'CHUNKS' output mode, one chunk file
+        is sent at once.
+    declarations : bool, optional
+        write the declarations of the model and include them in every file
+    writer_options : dict
+        other options of FormWriter
+
+    Returns
+    -------
+    EmissionReport
+    """
+    start = perf_counter()
+    model_name = model_module_name(model)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    writer = FormWriter(directory,output_mode,model=model if declarations else None,**writer_options)
+    writer.write_headers()
+    chunk_size = writer.chunk_size if writer.mode == 'CHUNKS' else task_size
+    max_pending = 2*workers
+    entries = []
+    with ProcessPoolExecutor(max_workers=workers,initializer=init_emission_worker,
+                             initargs=(model_name,writer)) as executor:
+        pending = deque()
+        chunk = []
+        chunk_index = 1
+        for node in generate_raw_diagram_nodes(file_path,mode):
+            chunk.append(node)
+            if len(chunk) == chunk_size:
+                pending.append(executor.submit(emit_chunk,chunk,mode,chunk_index))
+                chunk = []
+                chunk_index += 1
+                if len(pending) >= max_pending:
+                    entries += pending.popleft().result()
+        if chunk:
+            pending.append(executor.submit(emit_chunk,chunk,mode,chunk_index))
+        while pending:
+            entries += pending.popleft().result()
+    write_manifest(directory,entries)
+    report = EmissionReport(sum(entry.n_diagrams for entry in entries),
+                            [os.path.join(directory,entry.file_name) for entry in entries],
+                            perf_counter()-start,workers)
+    logger.info(report.nice_string())
+    return report
@@ -9,10 +9,14 @@ config_file = "setup.yaml"
 module_path = os.path.dirname(os.path.abspath(__file__))
 config_file_path = os.path.join(module_path,config_file)
 with open(config_file_path) as config_raw:
-    config = yaml.load(config_raw.read())
+    config = yaml.safe_load(config_raw.read())
 
 
 from .generator_interface import GeneratorCmd
+from .scheduler import QgrafScheduler,QgrafJob,ScheduleSummary
+from .generation_cache import GenerationCache
+from .streaming import QgrafStream
+from .partition import PartitionedRun
 
 def start_GeneratorCmd(config=config):
     """Start the Generator Command Line Interface"""
@@ -0,0 +1,185 @@
+"""On-disk cache of qgraf generation results
+
+Running qgraf with the same qgraf.dat, model file and style file always gives the same output. GenerationCache stores
+the output file and the log of each successful run under a key computed from the content of these three inputs, such
+that a later run of the same process links (or copies) them into its process directory instead of running qgraf.
+
+Each entry is the qgraf output itself, with the qgraf log stored next to it. The size bound of the cache only counts
+the outputs, the logs being negligible.
+"""
+import os
+import shutil
+import tempfile
+from hashlib import sha256
+from time import perf_counter
+from qgraf_parser.cache import CacheDirectory,default_cache_root,hash_file
+import qgraf_parser.generator.qgraf_setup as qgraf_setup
+import logging
+logger=logging.getLogger(__name__)
+
+# Bump when the content of the key changes
+cache_format_version = "1"
+default_cache_path = os.path.join(default_cache_root,"qgraf")
+default_max_size = 20*1024**3
+log_suffix = ".log"
+
+
+def link_or_copy(source,target):
+    """Hard-link a file to a new path, or copy it if hard links are not possible (e.g. across file systems)"""
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source,target)
+    except OSError:
+        shutil.copyfile(source,target)
+
+
+def unlink_shared(path):
+    """Remove a file that is hard-linked elsewhere, e.g. from a cache entry, such that it is not overwritten in place"""
+    if os.path.isfile(path) and os.stat(path).st_nlink > 1:
+        os.remove(path)
+
+
+class GenerationCache(CacheDirectory):
+    """Content-addressed cache of qgraf outputs, with least-recently-used eviction
+
+    Attributes
+    ----------
+    Same as qgraf_parser.cache.CacheDirectory
+    """
+    def __init__(self,path=default_cache_path,max_size=default_max_size):
+        CacheDirectory.__init__(self,path,max_size,suffix=".qgraf")
+
+    @staticmethod
+    def key(process_path,model_file,style_file):
+        """Compute the cache key of a prepared process directory
+
+        Parameters
+        ----------
+        process_path : str
+            directory holding qgraf.dat and the model and style files
+        model_file, style_file : str
+            model and style files of the process. Only their base names are used, since they are read from the
+            process directory.
+
+        Returns
+        -------
+        str
+        """
+        hasher = sha256()
+        hasher.update(cache_format_version.encode())
+        for file_name in ('qgraf.dat',os.path.basename(model_file),os.path.basename(style_file)):
+            hasher.update(file_name.encode()+b"\0")
+            hash_file(os.path.join(process_path,file_name),hasher)
+        return hasher.hexdigest()
+
+    def log_path(self,key):
+        """Path of the qgraf log of an entry"""
+        return os.path.join(self.path,key+log_suffix)
+
+    def lookup(self,key):
+        """Find an entry with its log and mark it as used
+
+        Returns
+        -------
+        str or None
+            the path of the output of the entry if it exists
+        """
+        if not os.path.isfile(self.log_path(key)):
+            return None
+        return CacheDirectory.lookup(self,key)
+
+    def store_log(self,key,log_path):
+        """Copy the qgraf log of an entry into the cache"""
+        file_descriptor,tmp_path = tempfile.mkstemp(dir=self.path,suffix=".tmp")
+        os.close(file_descriptor)
+        try:
+            shutil.copyfile(log_path,tmp_path)
+            os.replace(tmp_path,self.log_path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def store_run(self,key,output_path,log_path):
+        """Store the output and the log of a qgraf run
+
+        The log is stored first, such that an output in the cache always has its log.
+
+        Returns
+        -------
+        str
+            the path of the output in the cache
+        """
+        self.store_log(key,log_path)
+        with open(output_path,"rb") as output_file:
+            return self.store(key,lambda entry_file: shutil.copyfileobj(output_file,entry_file))
+
+    def remove(self,key):
+        """Remove an entry and its log if they exist
+
+        Returns
+        -------
+        bool
+            whether an entry was removed
+        """
+        try:
+            os.remove(self.log_path(key))
+        except FileNotFoundError:
+            pass
+        return CacheDirectory.remove(self,key)
+
+    def run_qgraf(self,process_path,output_file,model_file,style_file,qgraf_executable='qgraf',timeout=None):
+        """Fill a prepared process directory with the qgraf output and log, from the cache if possible
+
+        On a cache hit, the output and log are hard-linked (or copied) into the process directory and qgraf is not run.
+        On a miss, qgraf is run and its output and log are stored if it succeeded.
+
+        Parameters
+        ----------
+        process_path : str
+        output_file : str
+            name of the qgraf output in the process directory
+        model_file, style_file : str
+            model and style files of the process
+        qgraf_executable : str, optional
+        timeout : float, optional
+            see qgraf_setup.run_qgraf
+
+        Returns
+        -------
+        qgraf_setup.QgrafResult
+        """
+        key = self.key(process_path,model_file,style_file)
+        entry_path = self.lookup(key)
+        if entry_path is None:
+            output_path = os.path.join(process_path,output_file)
+            unlink_shared(output_path)
+            unlink_shared(os.path.join(process_path,'qgraf.log'))
+            result = qgraf_setup.run_qgraf(process_path,qgraf_executable,timeout)
+            if result.succeeded and os.path.isfile(output_path):
+                logger.info("Storing the qgraf output of {} in the cache entry {}".format(process_path,key))
+                self.store_run(key,output_path,os.path.join(process_path,'qgraf.log'))
+            return result
+        start = perf_counter()
+        logger.info("Using the cache entry {} for {}".format(key,process_path))
+        link_or_copy(self.log_path(key),os.path.join(process_path,'qgraf.log'))
+        link_or_copy(entry_path,os.path.join(process_path,output_file))
+        with open(self.log_path(key)) as log_file:
+            error,n_diagrams = qgraf_setup.read_qgraf_output(log_file.read())
+        return qgraf_setup.QgrafResult(process_path,0,n_diagrams,error,perf_counter()-start,cached=True)
+
+
+def generation_cache_from_config(config):
+    """Create the GenerationCache of a GeneratorCmd configuration
+
+    The entries 'generation_cache_path' and 'generation_cache_max_size' are used if present. The cache is disabled by
+    setting 'generation_cache' to false.
+
+    Returns
+    -------
+    GenerationCache or None
+    """
+    if not config.get('generation_cache',True):
+        return None
+    return GenerationCache(config.get('generation_cache_path',default_cache_path),
+                           config.get('generation_cache_max_size',default_max_size))
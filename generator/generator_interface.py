@@ -4,7 +4,10 @@ The main feature is the implementation of the GeneratorCmd class
 """
 from cmd import Cmd
 import qgraf_parser.generator.qgraf_setup as qgraf_setup
-import subprocess
+from .generation_cache import generation_cache_from_config
+from .streaming import QgrafStream
+from qgraf_parser.exporter import FormWriter
+import importlib
 import os
 
 import logging
@@ -42,7 +45,7 @@ class GeneratorCmd(Cmd):
         logger.info("Creating a Generator Command Line")
         Cmd.__init__(self,*args,**kwargs)
 
-        self.config = config
+        self.config = qgraf_setup.apply_output_format(config)
         try:
             assert self.valid_config()
         except AssertionError as e:
@@ -52,6 +55,7 @@ class GeneratorCmd(Cmd):
 
         self.process_config = None
         self.active_process = None
+        self.generation_cache = generation_cache_from_config(self.config)
 
 
     def default(self, arg):
@@ -112,33 +116,20 @@ class GeneratorCmd(Cmd):
         qgraf_setup.dispatch_qgraf_inputs(**self.process_config)
 
         #Generate the contents of the qgraf.dat file
-        try:
-            qgraf_datfile_content = qgraf_setup.generate_qgraf_data(**self.process_config)
-        except NotImplementedError as e:
-            logger.error("You need to regenerate a process without optional statements")
-            logger.error("Cancelling output")
-            return
-        logger.info("Creating process data file in:")
-        logger.info(os.path.join(self.process_config['process_path'],'qgraf.dat'))
-        qgraf_datfile = open(os.path.join(self.process_config['process_path'],'qgraf.dat'),'w+')
-        qgraf_datfile.write(qgraf_datfile_content)
-        qgraf_datfile.close()
+        qgraf_setup.write_qgraf_data(**self.process_config)
         logger.info("You can now generate this process using the 'launch' command")
         self.active_process = self.process_config['process_path']
         logger.info("Erasing the process config")
         self.process_config = None
 
 
-    def do_launch(self,args):
-        """
-        TODO DOC
-        Parameters
-        ----------
-        args :
+    def launch_process_path(self,args):
+        """Find the process directory to launch from the arguments of a launch command
 
         Returns
         -------
-
+        str or None
+            None if the arguments are invalid
         """
         #######################
         # Input format checks
@@ -147,44 +138,81 @@ class GeneratorCmd(Cmd):
             logger.error("The launch command can be called with:")
             logger.error("- 0 argument (launch active process)")
             logger.error("- 1 argument (launch specific process)")
-            return
+            return None
         # If no argument, check for active_process
         elif len(args)==0:
-            process_path = self.active_process
-        else:
-            #TODO somehow sanitize inputs
-            process_path = os.path.join(qgraf_setup.module_path,args)
-            if not os.path.isdir(process_path):
-                logger.error("The process directory {} is could not be found".format(args))
-
-        # Save the directory we started from
-        original_directory = os.getcwd()
-
-        # Move to the process directory and run QGRAF
-        # TODO: safety
-        logger.info("Moving to the process directory:")
-        logger.info(process_path)
-        os.chdir(process_path)
-
-        logger.info("Running qgraf")
-        # We redirect the error output to the standard output
-        # The option 'universal_newlines' ensures that newlines stay properly formatted
-        # when converting to string and output
-        qgraf_output = subprocess.check_output('qgraf',stderr=subprocess.STDOUT,universal_newlines=True)
-        qgraf_output = str(qgraf_output)
-        if "error" in qgraf_output.lower():
-            logger.error("QGRAF generation has failed!")
-            logger.error("See qgraf.log file to check qgraf output")
-        else:
-            logger.info("QGRAF generation has succeeded")
-            for line in qgraf_output.splitlines():
-                if "total" in line:
-                    logger.info("Found {} diagrams".format(line.split()[2]))
+            return self.active_process
+        #TODO somehow sanitize inputs
+        process_path = os.path.join(qgraf_setup.module_path,args)
+        if not os.path.isdir(process_path):
+            logger.error("The process directory {} is could not be found".format(args))
+            return None
+        return process_path
 
-        qgraf_logfile = open('qgraf.log',"w+")
-        qgraf_logfile.write(qgraf_output)
-        qgraf_logfile.close()
+    def do_launch(self,args):
+        """
+        TODO DOC
+        Parameters
+        ----------
+        args :
+
+        Returns
+        -------
+
+        """
+        process_path = self.launch_process_path(args)
+        if process_path is None:
+            return
 
-        logger.info('Returning to the original directory')
-        os.chdir(original_directory)
+        # QGRAF is run with the process directory as working directory, its output is written to qgraf.log
+        # If the same inputs were already generated, the output and log are taken from the cache instead
+        if self.generation_cache is None:
+            result = qgraf_setup.run_qgraf(process_path,self.config['qgraf_executable'])
+        else:
+            result = self.generation_cache.run_qgraf(process_path,self.config['output_file'],self.config['model_file'],
+                                                     self.config['style_file'],self.config['qgraf_executable'])
+        if result.succeeded:
+            logger.info("Found {} diagrams".format(result.n_diagrams))
+
+    def do_launch_stream(self,args):
+        """Launch a process while importing its diagrams and writing them to FORM files in the form/ subdirectory
 
+        The diagrams are imported as soon as qgraf writes them. The python model is imported from the configuration
+        entry 'python_model', e.g. qgraf_parser.models.GHT.
+        """
+        process_path = self.launch_process_path(args)
+        if process_path is None:
+            return
+        if 'python_model' not in self.config:
+            logger.error("Streaming launch requires the python model in the configuration entry 'python_model'")
+            return
+        model = importlib.import_module(self.config['python_model'])
+        mode = self.config.get('import_mode','LINE' if self.config.get('output_format') == 'LINE' else 'XML')
+        stream = QgrafStream(process_path,self.config['output_file'],self.config['model_file'],self.config['style_file'],
+                             mode,self.config['qgraf_executable'],cache=self.generation_cache)
+        form_paths = FormWriter(os.path.join(process_path,'form')).write_diagrams(stream.iter_diagrams(model))
+        if stream.result.succeeded:
+            logger.info("Found {} diagrams, written to {} FORM files".format(stream.result.n_diagrams,len(form_paths)))
+
+    def do_cache_list(self,arg):
+        """List the entries of the qgraf generation cache, most recently used first"""
+        if self.generation_cache is None:
+            print("The generation cache is disabled")
+            return
+        entries = self.generation_cache.entries()
+        for entry in entries:
+            print(entry)
+        print("{} entries, {} B in {}".format(len(entries),sum(entry.size for entry in entries),
+                                              self.generation_cache.path))
+
+    def do_cache_purge(self,arg):
+        """Remove entries from the qgraf generation cache: all of them, or those whose keys are given as arguments"""
+        if self.generation_cache is None:
+            print("The generation cache is disabled")
+            return
+        keys = arg.split()
+        if keys:
+            n_removed = sum(self.generation_cache.remove(key) for key in keys)
+        else:
+            n_removed = self.generation_cache.purge()
+        logger.info("Removed {} entries from the generation cache".format(n_removed))
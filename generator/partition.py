@@ -0,0 +1,258 @@
+"""Generation of one process as several qgraf sub-runs
+
+A single qgraf process only uses one core, which bounds the generation of high-loop processes. A PartitionedRun
+generates the same process as several sub-runs, each of them restricted by complementary optional statements to a
+disjoint subset of the diagrams, e.g. by the number of internal propagators of a given field:
+
+    true = iprop[H, 0, 0] ;      (sub-run 1: no internal H propagator)
+    true = iprop[H, 1, 1] ;      (sub-run 2: exactly one)
+    true = iprop[H, 2, 11] ;     (sub-run 3: two or more)
+
+The sub-runs are generated concurrently by a QgrafScheduler in subdirectories part1, part2, ... of the process
+directory, and their outputs are merged into the output file of the process directory, the diagrams being renumbered
+from 1 in the order of the sub-runs. The merged output can be imported as any qgraf output.
+
+The statements of a partition must select disjoint sets of diagrams whose union is the whole process: PartitionedRun
+#verify generates the unpartitioned process and compares both diagram sets by topology (see
+qgraf_parser.parser.topology), which is affordable for small processes.
+"""
+import os
+import re
+from collections import Counter
+import qgraf_parser.generator.qgraf_setup as qgraf_setup
+from qgraf_parser.importer import iter_diagrams
+from qgraf_parser.importer.diagram_index import iter_diagram_blocks,diagram_id_pattern
+from .scheduler import QgrafScheduler,QgrafJob
+import logging
+logger=logging.getLogger(__name__)
+
+line_id_pattern = re.compile(rb"^\s*-?\d+")
+
+
+def maximal_propagator_count(n_external,n_loops):
+    """Upper bound on the number of internal propagators of a connected diagram whose vertices have 3 legs or more"""
+    return max(n_external+3*n_loops-3,0)
+
+
+def propagator_partition(fields,n_parts,max_count):
+    """Complementary statements splitting a process by its number of internal propagators of some fields
+
+    Sub-run k < n_parts selects exactly k-1 such propagators, the last one all the diagrams with more.
+
+    Parameters
+    ----------
+    fields : list of str
+        names of the fields, as in the qgraf model
+    n_parts : int
+    max_count : int
+        upper bound on the number of internal propagators, see maximal_propagator_count
+
+    Returns
+    -------
+    list of list of str
+        the optional statements of each sub-run
+    """
+    field_list = ", ".join(fields)
+    statements = [["true = iprop[{}, {}, {}]".format(field_list,count,count)] for count in range(n_parts-1)]
+    statements.append(["true = iprop[{}, {}, {}]".format(field_list,n_parts-1,max(max_count,n_parts-1))])
+    return statements
+
+
+def renumber_xml_block(block,diagram_id):
+    """Replace the id of a <diagram> block"""
+    return diagram_id_pattern.sub("<id>{}</id>".format(diagram_id).encode(),block,count=1)
+
+
+def renumber_line(line,diagram_id):
+    """Replace the id at the start of a diagram line"""
+    return line_id_pattern.sub(str(diagram_id).encode(),line,count=1)
+
+
+def statement_pattern(statement):
+    """Byte pattern matching an optional statement as echoed by qgraf, whatever its whitespace and final ';'"""
+    characters = "".join(statement.split()).rstrip(";")
+    return re.compile(rb"\s*".join(re.escape(character.encode()) for character in characters)+rb"\s*;?")
+
+
+def merge_xml_outputs(output_paths,merged_path,removed_statements=()):
+    """Concatenate the diagrams of XML qgraf outputs into one output with renumbered ids
+
+    The text before the first diagram and after the last diagram is taken from the first output.
+
+    Parameters
+    ----------
+    output_paths : list of str
+    merged_path : str
+    removed_statements : list of str
+        statements removed from the text before the first diagram, e.g. the optional statements of the first sub-run.
+        They are matched regardless of whitespace, since qgraf does not necessarily echo them as they were written.
+
+    Returns
+    -------
+    int
+        number of diagrams
+    """
+    with open(output_paths[0],"rb") as first_output:
+        content = first_output.read()
+    start = content.find(b"<diagram>")
+    end = content.rfind(b"</diagram>")
+    if start < 0:
+        start = end = content.rfind(b"</diagrams>")
+    else:
+        end += len(b"</diagram>")
+    header,footer = content[:start],content[end:]
+    for statement in removed_statements:
+        header,n_removed = statement_pattern(statement).subn(b"",header)
+        if n_removed == 0:
+            logger.warning("The statement '{}' was not found in the header of {}".format(statement,output_paths[0]))
+    del content
+    diagram_id = 0
+    with open(merged_path,"wb") as merged:
+        merged.write(header)
+        for output_path in output_paths:
+            for offset,length,block in iter_diagram_blocks(output_path):
+                diagram_id += 1
+                if diagram_id > 1:
+                    merged.write(b"\n \n")
+                merged.write(renumber_xml_block(block,diagram_id))
+        merged.write(footer)
+    return diagram_id
+
+
+def merge_line_outputs(output_paths,merged_path):
+    """Concatenate the diagram lines of line-oriented qgraf outputs into one output with renumbered ids
+
+    Returns
+    -------
+    int
+        number of diagrams
+    """
+    diagram_id = 0
+    with open(merged_path,"wb") as merged:
+        for output_path in output_paths:
+            with open(output_path,"rb") as output:
+                for line in output:
+                    if line.strip():
+                        diagram_id += 1
+                        merged.write(renumber_line(line,diagram_id))
+    return diagram_id
+
+
+class PartitionedRun(object):
+    """Generate a process as concurrent qgraf sub-runs and merge their outputs
+
+    Attributes
+    ----------
+    config : dict
+        a GeneratorCmd configuration
+    process_string : str
+        process as 'initial_state > final_state @ n_loops'
+    process_dir : str
+        process directory, relative to the generator module or absolute. The sub-runs are generated in its
+        subdirectories part1, part2, ...
+    statements : list of list of str
+        the optional statements of each sub-run, which must select complementary sets of diagrams
+    scheduler : QgrafScheduler
+    process_path : str or None
+        set once the process directory is created
+    """
+    def __init__(self,config,process_string,process_dir,statements,concurrency=None,timeout=None,cache="config"):
+        self.config = qgraf_setup.apply_output_format(config)
+        self.process_string = process_string
+        self.process_dir = process_dir
+        self.statements = [list(part_statements) for part_statements in statements]
+        self.scheduler = QgrafScheduler(self.config,concurrency,timeout,cache)
+        self.process_path = None
+
+    @classmethod
+    def by_propagators(cls,config,process_string,process_dir,fields,n_parts,**options):
+        """Partition a process by its number of internal propagators of some fields, see propagator_partition"""
+        incoming,outgoing,n_loops = qgraf_setup.parse_process_string(process_string)
+        max_count = maximal_propagator_count(len(incoming)+len(outgoing),n_loops)
+        return cls(config,process_string,process_dir,propagator_partition(fields,n_parts,max_count),**options)
+
+    def jobs(self):
+        """The QgrafJob of each sub-run"""
+        return [QgrafJob(self.process_string,os.path.join(self.process_path,"part{}".format(index)),part_statements)
+                for index,part_statements in enumerate(self.statements,1)]
+
+    def output_paths(self):
+        """Paths of the outputs of the sub-runs, in order"""
+        return [os.path.join(self.process_path,"part{}".format(index),self.config['output_file'])
+                for index in range(1,len(self.statements)+1)]
+
+    def run(self):
+        """Generate the sub-runs concurrently and merge their outputs in the process directory
+
+        Returns
+        -------
+        qgraf_parser.generator.scheduler.ScheduleSummary
+            the summary of the sub-runs. The outputs are only merged if all of them succeeded.
+        """
+        if self.process_path is None:
+            self.process_path = qgraf_setup.create_process_directory(self.process_dir)
+        summary = self.scheduler.run(self.jobs())
+        if summary.failures:
+            logger.error("Some sub-runs of {} have failed, their outputs are not merged".format(self.process_string))
+            return summary
+        n_diagrams = self.merge()
+        logger.info("Merged {} diagrams from {} sub-runs into {}".format(n_diagrams,len(self.statements),
+                                                                         self.process_path))
+        return summary
+
+    def merge(self):
+        """Merge the outputs of the sub-runs into the output file of the process directory, with a qgraf.log
+
+        Returns
+        -------
+        int
+            number of diagrams
+        """
+        merged_path = os.path.join(self.process_path,self.config['output_file'])
+        if self.config.get('output_format') == 'LINE':
+            n_diagrams = merge_line_outputs(self.output_paths(),merged_path)
+        else:
+            n_diagrams = merge_xml_outputs(self.output_paths(),merged_path,self.statements[0])
+        with open(os.path.join(self.process_path,'qgraf.log'),"w") as log_file:
+            for index,part_statements in enumerate(self.statements,1):
+                log_file.write("# part{}: {}\n".format(index," ; ".join(part_statements)))
+            log_file.write(" total = {} connected diagrams, merged from {} sub-runs\n".format(n_diagrams,
+                                                                                              len(self.statements)))
+        return n_diagrams
+
+    def verify(self,model,mode='XML'):
+        """Check that the merged diagrams are those of the unpartitioned process
+
+        The unpartitioned process is generated in the subdirectory full of the process directory and both diagram
+        sets are compared by topology, such that it is only affordable for small processes.
+
+        Parameters
+        ----------
+        model : module
+            the module defining the model properties
+        mode : str
+            mode in which the outputs are imported
+
+        Returns
+        -------
+        bool
+            whether both diagram sets are equal
+        """
+        full_job = QgrafJob(self.process_string,os.path.join(self.process_path,"full"))
+        summary = self.scheduler.run([full_job])
+        if summary.failures:
+            logger.error("The unpartitioned process {} could not be generated".format(self.process_string))
+            return False
+        output_file = self.config['output_file']
+        merged = Counter(diagram.topology_hash() for diagram in
+                         iter_diagrams(os.path.join(self.process_path,output_file),model,mode))
+        full = Counter(diagram.topology_hash() for diagram in
+                       iter_diagrams(os.path.join(self.process_path,"full",output_file),model,mode))
+        missing,extra = full-merged,merged-full
+        if missing or extra:
+            logger.error("The partition of {} misses {} diagrams and has {} extra diagrams".format(
+                self.process_string,sum(missing.values()),sum(extra.values())))
+            return False
+        logger.info("The partition of {} gives the {} diagrams of the unpartitioned process".format(
+            self.process_string,sum(full.values())))
+        return True
@@ -1,11 +1,44 @@
 import re
 import os
+import subprocess
+from time import perf_counter
 from shutil import copyfile
 from sys import path
 from ..generator import module_path
 import logging
 logger=logging.getLogger(__name__)
 
+# Style file and default output file for each QGRAF output format understood by qgraf_parser.importer
+output_formats = {
+    'XML': {'style_file': 'xml.sty', 'output_file': 'graphs.xml'},
+    'LINE': {'style_file': 'line.sty', 'output_file': 'graphs.txt'},
+}
+
+
+def apply_output_format(config):
+    """Fill in the style and output files of a configuration from its 'output_format' entry
+
+    Entries 'style_file' and 'output_file' that are explicitly given in the configuration are kept.
+
+    Parameters
+    ----------
+    config : dict
+        a GeneratorCmd configuration
+
+    Returns
+    -------
+    dict
+        a copy of the configuration with the format-specific entries filled in
+    """
+    if 'output_format' not in config:
+        return dict(config)
+    try:
+        format_config = output_formats[config['output_format']]
+    except KeyError:
+        error = KeyError("Unknown output format {}, choose among {}".format(config['output_format'],list(output_formats)))
+        logger.error(error)
+        raise error
+    return {**format_config,**config}
 
 
 def sanitize_input_file_path(file_path):
@@ -24,6 +57,29 @@ def sanitize_input_file_path(file_path):
         raise error
 
 
+def render_optional_statements(optional_statements):
+    """Write optional QGRAF statements as lines of a qgraf.dat file
+
+    Each statement is written on its own line and terminated by ' ;' if it is not already.
+
+    Parameters
+    ----------
+    optional_statements : list of str
+        e.g. ['true = iprop[H, 0, 0]','false = onepi']
+
+    Returns
+    -------
+    str
+    """
+    lines = []
+    for statement in optional_statements:
+        statement = statement.strip()
+        if not statement.endswith(";"):
+            statement += " ;"
+        lines.append(statement+"\n")
+    return "".join(lines)
+
+
 def generate_qgraf_data(*,
                         qgraf_template,
                         output_file,
@@ -56,7 +112,7 @@ def generate_qgraf_data(*,
     options : list of str
         list of options for qgraf
     optional_statements : list of str
-        list of optional statements for QGRAF
+        list of optional statements for QGRAF, e.g. 'true = iprop[H, 0, 0]', see render_optional_statements
 
     Returns
     -------
@@ -64,13 +120,6 @@ def generate_qgraf_data(*,
         The text content of the desired qgraf.dat file
     """
 
-    # For now we do not support optional_statements
-    if optional_statements!=():
-        logger.error("We currently do not support optional statements for QGRAF")
-        error = NotImplementedError("Optional statements not yet implemented in QGRAF handler")
-        logger.error(error)
-        raise error
-
     format_dict = {
         "output_file": output_file,
         "style_file": os.path.basename(style_file),
@@ -79,7 +128,7 @@ def generate_qgraf_data(*,
         "outgoing": ", ".join(outgoing),
         "n_loops": n_loops,
         "options": ",".join(options),
-        "optional_statements": ""
+        "optional_statements": render_optional_statements(optional_statements)
     }
 
 
@@ -210,3 +259,139 @@ def dispatch_qgraf_inputs(*,
     copyfile(style_file_src,style_file_tgt)
     logger.info("Copying the model file to the process directory")
     copyfile(model_file_src,model_file_tgt)
+
+
+def write_qgraf_data(**process_config):
+    """Write the qgraf.dat file of a process directory
+
+    Parameters
+    ----------
+    process_config : dict
+        a GeneratorCmd configuration with the process entries (incoming, outgoing, n_loops) and the process_path
+
+    Returns
+    -------
+    str
+        path of the qgraf.dat file
+    """
+    qgraf_datfile_content = generate_qgraf_data(**process_config)
+    qgraf_datfile_path = os.path.join(process_config['process_path'],'qgraf.dat')
+    logger.info("Creating process data file in:")
+    logger.info(qgraf_datfile_path)
+    with open(qgraf_datfile_path,'w') as qgraf_datfile:
+        qgraf_datfile.write(qgraf_datfile_content)
+    return qgraf_datfile_path
+
+
+class QgrafResult(object):
+    """Outcome of a qgraf run in a process directory
+
+    Attributes
+    ----------
+    process_path : str
+    returncode : int or None
+        None if qgraf timed out or could not be started
+    n_diagrams : int or None
+        number of diagrams reported by qgraf
+    error : str
+        description of the failure, empty on success
+    elapsed : float
+        wall-clock time in seconds
+    cached : bool
+        whether the output was taken from a GenerationCache instead of running qgraf
+    """
+    def __init__(self,process_path,returncode,n_diagrams,error,elapsed,cached=False):
+        self.process_path = process_path
+        self.returncode = returncode
+        self.n_diagrams = n_diagrams
+        self.error = error
+        self.elapsed = elapsed
+        self.cached = cached
+
+    @property
+    def succeeded(self):
+        return not self.error
+
+    def nice_string(self):
+        status = "{} diagrams".format(self.n_diagrams) if self.succeeded else "FAILED ({})".format(self.error)
+        if self.cached:
+            status += " (cached)"
+        return "{r.process_path}: {status} in {r.elapsed:.2f}s".format(r=self,status=status)
+    def __str__(self):
+        return self.nice_string()
+    def __repr__(self):
+        return "QgrafResult({})".format(self.process_path)
+
+
+def read_qgraf_output(qgraf_output):
+    """Check the output of qgraf for errors and find the number of generated diagrams
+
+    Parameters
+    ----------
+    qgraf_output : str
+
+    Returns
+    -------
+    tuple:
+        (error,n_diagrams) where error is an empty string if qgraf succeeded
+    """
+    if "error" in qgraf_output.lower():
+        return "qgraf reported an error, see qgraf.log",None
+    n_diagrams = None
+    for line in qgraf_output.splitlines():
+        if "total" in line:
+            try:
+                n_diagrams = int(line.split()[2])
+            except (IndexError,ValueError):
+                pass
+    return "",n_diagrams
+
+
+def run_qgraf(process_path,qgraf_executable='qgraf',timeout=None):
+    """Run qgraf in a process directory and write its output to qgraf.log
+
+    qgraf is run with the process directory as working directory, such that the working directory of the calling
+    process is left untouched and several runs can happen at once.
+
+    Parameters
+    ----------
+    process_path : str
+        directory holding qgraf.dat and the model and style files
+    qgraf_executable : str, optional
+        path or name of the qgraf executable
+    timeout : float, optional
+        time limit in seconds
+
+    Returns
+    -------
+    QgrafResult
+    """
+    start = perf_counter()
+    returncode = None
+    logger.info("Running qgraf in {}".format(process_path))
+    try:
+        # The error output is redirected to the standard output
+        completed = subprocess.run([qgraf_executable],cwd=process_path,stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT,universal_newlines=True,timeout=timeout)
+        returncode = completed.returncode
+        qgraf_output = completed.stdout
+        error,n_diagrams = read_qgraf_output(qgraf_output)
+        if not error and returncode != 0:
+            error = "qgraf exited with return code {}".format(returncode)
+    except subprocess.TimeoutExpired as timeout_error:
+        qgraf_output = timeout_error.output or ""
+        if isinstance(qgraf_output,bytes):
+            qgraf_output = qgraf_output.decode(errors="replace")
+        error,n_diagrams = "timeout after {}s".format(timeout),None
+    except OSError as os_error:
+        qgraf_output = str(os_error)
+        error,n_diagrams = str(os_error),None
+    with open(os.path.join(process_path,'qgraf.log'),"w") as qgraf_logfile:
+        qgraf_logfile.write(qgraf_output)
+    result = QgrafResult(process_path,returncode,n_diagrams,error,perf_counter()-start)
+    if result.succeeded:
+        logger.info("QGRAF generation has succeeded: {}".format(result.nice_string()))
+    else:
+        logger.error("QGRAF generation has failed: {}".format(result.nice_string()))
+        logger.error("See qgraf.log file to check qgraf output")
+    return result
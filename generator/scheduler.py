@@ -0,0 +1,208 @@
+"""Concurrent generation of many qgraf processes
+
+Each process is prepared in its own process directory, holding its qgraf.dat, model and style files, and qgraf is
+run with that directory as working directory. Since the working directory of the python process is never changed,
+many qgraf processes can run at once: a QgrafScheduler runs them on a pool of threads, each of them waiting for one
+qgraf process, with a time limit per process. The outcome of the runs is collected in a ScheduleSummary.
+
+When a GenerationCache is given, processes whose inputs were already generated are filled from the cache instead of
+running qgraf (see qgraf_parser.generator.generation_cache).
+
+Example
+-------
+    scheduler = QgrafScheduler(config,concurrency=4,timeout=600)
+    summary = scheduler.run([QgrafJob("e e > e e @ 1","ee_ee_1L"),QgrafJob("e e > e e @ 2","ee_ee_2L")])
+"""
+import os
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+import qgraf_parser.generator.qgraf_setup as qgraf_setup
+from .generation_cache import generation_cache_from_config
+import logging
+logger=logging.getLogger(__name__)
+
+
+class QgrafJob(object):
+    """A qgraf process to generate
+
+    Attributes
+    ----------
+    process_string : str
+        process as 'initial_state > final_state @ n_loops'
+    process_dir : str
+        process directory, relative to the generator module or absolute
+    optional_statements : list of str
+        optional statements for QGRAF, see qgraf_setup.generate_qgraf_data
+    """
+    def __init__(self,process_string,process_dir,optional_statements=()):
+        self.process_string = process_string
+        self.process_dir = process_dir
+        self.optional_statements = tuple(optional_statements)
+
+    def nice_string(self):
+        return "{j.process_string} in {j.process_dir}".format(j=self)
+    def __str__(self):
+        return self.nice_string()
+    def __repr__(self):
+        return "QgrafJob({})".format(self.nice_string())
+
+
+def process_configuration(config,process_string,optional_statements=()):
+    """Build the configuration of a process from a GeneratorCmd configuration and a process string
+
+    Parameters
+    ----------
+    config : dict
+        a GeneratorCmd configuration
+    process_string : str
+    optional_statements : list of str, optional
+
+    Returns
+    -------
+    dict
+    """
+    process = qgraf_setup.parse_process_string(process_string)
+    process_param = dict(zip(("incoming","outgoing","n_loops"),process))
+    return {**qgraf_setup.apply_output_format(config),**process_param,
+            "optional_statements":tuple(optional_statements)}
+
+
+def prepare_process(config,job):
+    """Create the process directory of a job and fill it with the qgraf inputs
+
+    Parameters
+    ----------
+    config : dict
+        a GeneratorCmd configuration
+    job : QgrafJob
+
+    Returns
+    -------
+    dict
+        the configuration of the process, with its process_path
+    """
+    process_config = process_configuration(config,job.process_string,job.optional_statements)
+    process_config['process_path'] = qgraf_setup.create_process_directory(job.process_dir)
+    qgraf_setup.dispatch_qgraf_inputs(**process_config)
+    qgraf_setup.write_qgraf_data(**process_config)
+    return process_config
+
+
+class ScheduleSummary(object):
+    """Outcome of a batch of qgraf runs
+
+    Attributes
+    ----------
+    jobs : list of QgrafJob
+    results : list of qgraf_setup.QgrafResult
+        in the order of the jobs
+    elapsed : float
+        wall-clock time of the batch in seconds
+    """
+    def __init__(self,jobs,results,elapsed):
+        self.jobs = jobs
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def failures(self):
+        return [result for result in self.results if not result.succeeded]
+
+    @property
+    def n_cached(self):
+        return sum(result.cached for result in self.results)
+
+    @property
+    def n_diagrams(self):
+        return sum(result.n_diagrams or 0 for result in self.results)
+
+    def nice_string(self):
+        lines = ["{} qgraf processes in {:.2f}s: {} succeeded ({} from the cache), {} failed, {} diagrams".format(
+            len(self.results),self.elapsed,len(self.results)-len(self.failures),self.n_cached,len(self.failures),
+            self.n_diagrams)]
+        lines += ["  "+failure.nice_string() for failure in self.failures]
+        return "\n".join(lines)
+    def __str__(self):
+        return self.nice_string()
+    def __repr__(self):
+        return "ScheduleSummary({} processes)".format(len(self.results))
+
+
+class QgrafScheduler(object):
+    """Prepare and run many qgraf processes concurrently
+
+    Attributes
+    ----------
+    config : dict
+        a GeneratorCmd configuration
+    concurrency : int
+        number of qgraf processes run at once
+    timeout : float or None
+        time limit of a qgraf process in seconds
+    cache : qgraf_parser.generator.generation_cache.GenerationCache or None
+        cache of qgraf outputs. Defaults to the cache described by the configuration, see
+        generation_cache.generation_cache_from_config.
+    """
+    def __init__(self,config,concurrency=None,timeout=None,cache="config"):
+        self.config = qgraf_setup.apply_output_format(config)
+        self.concurrency = concurrency or os.cpu_count() or 1
+        self.timeout = timeout
+        self.cache = generation_cache_from_config(self.config) if cache == "config" else cache
+
+    def prepare(self,job):
+        """Prepare the process directory of a job
+
+        Returns
+        -------
+        dict or qgraf_setup.QgrafResult
+            the configuration of the process, or a failed result if the job could not be prepared
+        """
+        try:
+            return prepare_process(self.config,job)
+        except (AssertionError,IOError) as error:
+            logger.error("Could not prepare {}".format(job))
+            reason = "preparation failed: {}".format(str(error) or type(error).__name__)
+            return qgraf_setup.QgrafResult(job.process_dir,None,None,reason,0.)
+
+    def run_process(self,process_config):
+        """Run qgraf in a prepared process directory, or fill it from the cache
+
+        Returns
+        -------
+        qgraf_setup.QgrafResult
+        """
+        if self.cache is None:
+            return qgraf_setup.run_qgraf(process_config['process_path'],self.config['qgraf_executable'],self.timeout)
+        return self.cache.run_qgraf(process_config['process_path'],process_config['output_file'],
+                                    process_config['model_file'],process_config['style_file'],
+                                    self.config['qgraf_executable'],self.timeout)
+
+    def run(self,jobs):
+        """Prepare and run a list of jobs
+
+        The process directories are prepared one after the other, which is fast, before qgraf is run on all of them
+        concurrently.
+
+        Parameters
+        ----------
+        jobs : iterable of QgrafJob
+
+        Returns
+        -------
+        ScheduleSummary
+        """
+        start = perf_counter()
+        jobs = list(jobs)
+        prepared = [self.prepare(job) for job in jobs]
+        results = list(prepared)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {index: executor.submit(self.run_process,process_config)
+                       for index,process_config in enumerate(prepared) if isinstance(process_config,dict)}
+            for index,future in futures.items():
+                results[index] = future.result()
+        summary = ScheduleSummary(jobs,results,perf_counter()-start)
+        if summary.failures:
+            logger.error(summary.nice_string())
+        else:
+            logger.info(summary.nice_string())
+        return summary
@@ -0,0 +1,234 @@
+"""Import of diagrams while qgraf is still writing its output
+
+A QgrafStream starts qgraf in a prepared process directory without waiting for it to exit. The standard output of
+qgraf is written to qgraf.log line by line while the output file is followed as it grows: each complete <diagram>
+block (or diagram line for the line-oriented format) is handed to the importer as soon as it is written. The diagrams
+can then be consumed by any downstream stage, e.g. a qgraf_parser.exporter.FormWriter, such that generation, import
+and emission overlap.
+
+Example
+-------
+    stream = QgrafStream(process_path,'graphs.xml','chromomag','xml.sty',qgraf_executable=config['qgraf_executable'])
+    FormWriter(os.path.join(process_path,'form')).write_diagrams(stream.iter_diagrams(model))
+    print(stream.result)
+"""
+import os
+import subprocess
+import threading
+from time import perf_counter,sleep
+from xml.etree.ElementTree import XML
+from qgraf_parser.parser.diagram_elements import Diagram
+from qgraf_parser.importer.diagram_index import DiagramBlockScanner
+from qgraf_parser.importer.parallel import generate_raw_diagram_nodes
+import qgraf_parser.generator.qgraf_setup as qgraf_setup
+from qgraf_parser.generator.generation_cache import unlink_shared
+import logging
+logger=logging.getLogger(__name__)
+
+
+class LineScanner(object):
+    """Incremental scanner that cuts a byte stream into non-empty lines
+
+    Same interface as qgraf_parser.importer.diagram_index.DiagramBlockScanner, for the line-oriented format.
+    """
+    def __init__(self,offset=0):
+        self.offset = offset
+        self._buffer = b""
+
+    def feed(self,data):
+        """Add data to the stream and return the lines it completes, as (offset,length,line) tuples"""
+        buffer = self._buffer + data
+        lines = []
+        position = 0
+        while True:
+            end = buffer.find(b"\n",position)
+            if end < 0:
+                break
+            end += 1
+            if buffer[position:end].strip():
+                lines.append((self.offset+position,end-position,buffer[position:end]))
+            position = end
+        self._buffer = buffer[position:]
+        self.offset += position
+        return lines
+
+
+class QgrafStream(object):
+    """Run qgraf and follow its output file as it is written
+
+    Attributes
+    ----------
+    process_path : str
+        prepared process directory, holding qgraf.dat and the model and style files
+    output_file : str
+        name of the qgraf output in the process directory
+    model_file, style_file : str
+        model and style files of the process, used for the cache key
+    mode : str
+        'XML', 'MMAP' or 'LINE', the mode in which the diagrams are created
+    qgraf_executable : str
+    timeout : float or None
+        time limit of qgraf in seconds
+    cache : qgraf_parser.generator.generation_cache.GenerationCache or None
+        if the inputs of the process are in the cache, the cached output is read instead of running qgraf. Otherwise
+        the output is stored once qgraf has succeeded.
+    poll_interval : float
+        time waited in seconds when no new data was written by qgraf
+    chunk_size : int
+        maximal size of the reads of the output file
+    result : qgraf_setup.QgrafResult or None
+        outcome of the run, set once the stream is exhausted
+    time_to_first_diagram : float or None
+        time in seconds between the start of the stream and the first complete diagram
+    """
+    def __init__(self,process_path,output_file,model_file,style_file,mode='XML',qgraf_executable='qgraf',timeout=None,
+                 cache=None,poll_interval=0.05,chunk_size=1<<20):
+        if mode not in ('XML','MMAP','LINE'):
+            error = ValueError("{} is not a valid mode for QgrafStream".format(mode))
+            logger.error(error)
+            raise error
+        self.process_path = process_path
+        self.output_file = output_file
+        self.model_file = model_file
+        self.style_file = style_file
+        self.mode = mode
+        self.qgraf_executable = qgraf_executable
+        self.timeout = timeout
+        self.cache = cache
+        self.poll_interval = poll_interval
+        self.chunk_size = chunk_size
+        self.result = None
+        self.time_to_first_diagram = None
+
+    @property
+    def output_path(self):
+        return os.path.join(self.process_path,self.output_file)
+
+    @staticmethod
+    def write_log(stdout,log_file,lines):
+        """Copy the output of qgraf to its log line by line, keeping the lines"""
+        for line in stdout:
+            log_file.write(line)
+            log_file.flush()
+            lines.append(line)
+
+    def iter_output_nodes(self,process,start):
+        """Follow the output file while qgraf runs and yield the raw nodes of the complete diagrams
+
+        Returns (through StopIteration) whether qgraf timed out.
+        """
+        scanner = LineScanner() if self.mode == 'LINE' else DiagramBlockScanner()
+        output = None
+        try:
+            while True:
+                # Checked before reading, such that everything written before qgraf exited is read
+                running = process.poll() is None
+                if output is None and os.path.exists(self.output_path):
+                    output = open(self.output_path,"rb")
+                # Also checked while data is available, such that the limit holds when the consumer lags behind
+                if running and self.timeout is not None and perf_counter()-start > self.timeout:
+                    logger.error("qgraf has exceeded its time limit of {}s in {}".format(self.timeout,
+                                                                                        self.process_path))
+                    process.kill()
+                    return True
+                data = output.read(self.chunk_size) if output is not None else b""
+                if data:
+                    for offset,length,node in scanner.feed(data):
+                        yield node.decode() if self.mode == 'LINE' else node
+                    continue
+                if not running:
+                    return False
+                sleep(self.poll_interval)
+        finally:
+            if output is not None:
+                output.close()
+
+    def iter_qgraf_nodes(self):
+        """Run qgraf and yield the raw nodes of the diagrams as they are written, then set the result"""
+        start = perf_counter()
+        lines = []
+        timed_out = False
+        returncode = None
+        logger.info("Running qgraf in {}, streaming its output".format(self.process_path))
+        if os.path.lexists(self.output_path):
+            # qgraf refuses to overwrite its output
+            os.remove(self.output_path)
+        # A log linked from a cache entry by an earlier run must not be truncated in place
+        unlink_shared(os.path.join(self.process_path,'qgraf.log'))
+        with open(os.path.join(self.process_path,'qgraf.log'),"w") as log_file:
+            try:
+                process = subprocess.Popen([self.qgraf_executable],cwd=self.process_path,stdout=subprocess.PIPE,
+                                           stderr=subprocess.STDOUT,universal_newlines=True)
+            except OSError as os_error:
+                log_file.write(str(os_error))
+                self.result = qgraf_setup.QgrafResult(self.process_path,None,None,str(os_error),perf_counter()-start)
+                return
+            log_thread = threading.Thread(target=self.write_log,args=(process.stdout,log_file,lines),daemon=True)
+            log_thread.start()
+            try:
+                timed_out = yield from self.iter_output_nodes(process,start)
+            finally:
+                # The process is also stopped if the consumer closes the stream early
+                if process.poll() is None:
+                    process.kill()
+                returncode = process.wait()
+                log_thread.join()
+                process.stdout.close()
+        if timed_out:
+            error,n_diagrams = "timeout after {}s".format(self.timeout),None
+        else:
+            error,n_diagrams = qgraf_setup.read_qgraf_output("".join(lines))
+            if not error and returncode != 0:
+                error = "qgraf exited with return code {}".format(returncode)
+        self.result = qgraf_setup.QgrafResult(self.process_path,returncode,n_diagrams,error,perf_counter()-start)
+
+    def iter_nodes(self):
+        """Yield the raw nodes of the diagrams of the process, from the cache or from a streamed qgraf run
+
+        Yields
+        ------
+        bytes or str
+            <diagram> blocks for the 'XML' and 'MMAP' modes, diagram lines for the 'LINE' mode
+        """
+        start = perf_counter()
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(self.process_path,self.model_file,self.style_file)
+        if self.cache is not None and self.cache.lookup(key) is not None:
+            # A cache hit only links the files, which are then read as a finished output
+            # qgraf still runs, with the same executable and time limit, if the entry is evicted in the meantime
+            self.result = self.cache.run_qgraf(self.process_path,self.output_file,self.model_file,self.style_file,
+                                               self.qgraf_executable,self.timeout)
+            nodes = generate_raw_diagram_nodes(self.output_path,self.mode)
+        else:
+            nodes = self.iter_qgraf_nodes()
+        for node in nodes:
+            if self.time_to_first_diagram is None:
+                self.time_to_first_diagram = perf_counter()-start
+                logger.info("First diagram after {:.2f}s".format(self.time_to_first_diagram))
+            yield node
+        if self.result.succeeded:
+            logger.info("QGRAF generation has succeeded: {}".format(self.result.nice_string()))
+            if key is not None and not self.result.cached and os.path.isfile(self.output_path):
+                self.cache.store_run(key,self.output_path,os.path.join(self.process_path,'qgraf.log'))
+        else:
+            logger.error("QGRAF generation has failed: {}".format(self.result.nice_string()))
+            logger.error("See qgraf.log file to check qgraf output")
+
+    def iter_diagrams(self,model):
+        """Yield the diagrams of the process as soon as they are written by qgraf
+
+        Parameters
+        ----------
+        model : module
+            the module defining the model properties
+
+        Yields
+        ------
+        qgraf_parser.diagram_elements.Diagram
+        """
+        for node in self.iter_nodes():
+            if self.mode == 'XML':
+                yield Diagram(XML(node),model,self.mode)
+            else:
+                yield Diagram(node,model,self.mode)
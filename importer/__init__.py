@@ -1,19 +1,34 @@
 '''This module defines the functions responsible for importing diagram files in appropriate formats
 and generate abstract representation that can be processed using the functionalities implemented in models.
 
-The main function is
-TODO
+The main functions are
+* create_diagrams_from_XML, which returns the full list of diagrams in a file
+* iter_diagrams_from_XML, which yields the diagrams one at a time while the file is being read
+* load_diagrams_by_id, which only reads selected diagrams using a byte-offset index (see diagram_index)
+* create_diagrams_from_lines and iter_diagrams_from_lines, their counterparts for the line-oriented format
+* iter_diagrams, which dispatches a file to the appropriate reader depending on the format
+* create_diagrams_parallel and iter_diagrams_parallel, which create the diagrams on a pool of processes, and
+  create_diagram_set_parallel, which builds a DiagramSet on a pool of processes
+* DiagramCache#load_diagrams, which stores imported diagram sets on disk and loads them back on later imports
 
 The supported formats are:
 * XML
+* MMAP: XML written with the shipped generator/xml.sty style, read through a memory map with byte patterns
+  instead of building XML nodes (see qgraf_parser.parser.diagram_elements). Blocks that the byte patterns cannot
+  read are parsed with ElementTree, and the rest of the file is read in the XML mode if the blocks cannot be delimited.
+* LINE: one diagram per line, written with the shipped generator/line.sty style
 '''
 
+import mmap
 import logging
 logger=logging.getLogger(__name__)
 
-from xml.etree.ElementTree import XML,parse
+from xml.etree.ElementTree import XML,ParseError,parse,iterparse
 from xml.etree.ElementInclude import default_loader
-from qgraf_parser.parser.diagram_elements import Diagram
+from qgraf_parser.parser.diagram_elements import Diagram,LazyDiagram
+from .diagram_index import build_diagram_index,load_diagrams_by_id
+from .parallel import iter_diagrams_parallel,create_diagrams_parallel,create_diagram_set_parallel
+from .diagram_cache import DiagramCache
 
 
 def generate_XML_diagrams_node(file_path):
@@ -31,18 +46,208 @@ def generate_XML_diagrams_node(file_path):
     """
     return XML(default_loader(file_path, parse)).find("diagrams")
 
-def create_diagrams_from_XML(file_path,model,mode='XML'):
+def generate_mmap_diagram_blocks(file_path):
+    """Generate the raw <diagram>...</diagram> blocks of a XML QGRAF output through a memory map
+
+    Parameters
+    ----------
+    file_path : str
+        string path to the XML QGRAF output
+
+    Yields
+    ------
+    bytes :
+        the content of each <diagram> block, tags included
+    """
+    with open(file_path,"rb") as file, mmap.mmap(file.fileno(),0,access=mmap.ACCESS_READ) as diagrams_map:
+        position = diagrams_map.find(b"<diagrams>")
+        if position < 0:
+            error = IOError("No <diagrams> tag found in {}".format(file_path))
+            logger.error(error)
+            raise error
+        start = diagrams_map.find(b"<diagram>",position)
+        while start >= 0:
+            end = diagrams_map.find(b"</diagram>",start)
+            next_start = diagrams_map.find(b"<diagram>",start+len(b"<diagram>"))
+            if end < 0 or 0 <= next_start < end:
+                error = IOError("Unterminated <diagram> block at byte {} of {}".format(start,file_path))
+                logger.error(error)
+                raise error
+            yield diagrams_map[start:end+len(b"</diagram>")]
+            start = next_start
+
+def create_mmap_diagram(block,model,diagram_class=Diagram):
+    """Create a diagram from a raw <diagram> block in the 'MMAP' mode, or with the XML parser if the block cannot be read
+
+    Only the failures of the byte patterns fall back to the XML parser. Errors raised by the model, e.g. the KeyError of
+    an unknown interaction or propagator, are propagated.
+
+    Parameters
+    ----------
+    block : bytes
+        a block returned by generate_mmap_diagram_blocks
+    model : module
+        the module defining the model properties
+    diagram_class : type
+        Diagram or LazyDiagram
+
+    Returns
+    -------
+    qgraf_parser.diagram_elements.Diagram
+    """
+    try:
+        return diagram_class(block,model,'MMAP')
+    except (AttributeError,ValueError,IndexError) as error:
+        logger.warning("Could not read a diagram block with the byte patterns, using the XML parser: {}".format(error))
+        return diagram_class(XML(block),model,'XML')
+
+def create_diagrams_from_XML(file_path,model,mode='XML',workers=None,lazy=False):
     """Generate a list of Diagrams objects from XML file
 
     Parameters
     ----------
     file_path : str
         string path to the XML QGRAF output
+    model : module
+        the module defining the model properties
+    mode : str
+        specification of how to read the diagram nodes, see qgraf_parser.diagram_elements.Diagram#parse
+    workers : int, optional
+        if given, the diagrams are created by this number of processes (see qgraf_parser.importer.parallel).
+        The model must then be importable by name.
+    lazy : bool, optional
+        create qgraf_parser.diagram_elements.LazyDiagram objects, whose elements are created on first access
+
     Returns
     -------
     list of qgraf_parser.diagram_elements.Diagram:
         list of diagram objects in the XML file
     """
+    if workers is not None:
+        return create_diagrams_parallel(file_path,model,mode,workers,lazy=lazy)
+    return list(iter_diagrams_from_XML(file_path,model,mode,lazy))
+
+def iter_diagrams_from_XML(file_path,model,mode='XML',lazy=False):
+    """Generate Diagram objects one at a time from a XML file
+
+    The file is read incrementally: each Diagram is created as soon as its closing </diagram> tag is read and the
+    corresponding XML node is discarded right after. The peak memory usage is therefore bounded by the size of a single
+    diagram instead of that of the whole file.
 
-    diagrams_node = generate_XML_diagrams_node(file_path)
-    return [Diagram(diag,model,mode) for diag in diagrams_node.findall("diagram")]
\ No newline at end of file
+    Parameters
+    ----------
+    file_path : str
+        string path to the XML QGRAF output
+    model : module
+        the module defining the model properties
+    mode : str
+        specification of how to read the diagram nodes, see qgraf_parser.diagram_elements.Diagram#parse
+    lazy : bool, optional
+        create qgraf_parser.diagram_elements.LazyDiagram objects, whose elements are created on first access
+
+    Yields
+    ------
+    qgraf_parser.diagram_elements.Diagram:
+        the diagram objects in the XML file, in the order in which they appear
+    """
+    diagram_class = LazyDiagram if lazy else Diagram
+    n_read = 0
+    if mode == 'MMAP':
+        try:
+            for block in generate_mmap_diagram_blocks(file_path):
+                yield create_mmap_diagram(block,model,diagram_class)
+                n_read += 1
+            return
+        except (IOError,ValueError,ParseError) as error:
+            # The diagrams already yielded are skipped by the XML parser below
+            logger.warning("Could not read {} through a memory map after {} diagrams, using the XML parser: {}".format(
+                file_path,n_read,error))
+            mode = 'XML'
+
+    diagrams_node = None
+    n_skipped = 0
+    for event,node in iterparse(file_path,events=("start","end")):
+        if event == "start":
+            if node.tag == "diagrams":
+                diagrams_node = node
+            continue
+        if node.tag != "diagram":
+            continue
+        if n_skipped < n_read:
+            n_skipped += 1
+        else:
+            yield diagram_class(node,model,mode)
+        # Drop the node and its reference in the mother <diagrams> node so that it can be garbage collected
+        node.clear()
+        if diagrams_node is not None:
+            diagrams_node.remove(node)
+
+def iter_diagrams_from_lines(file_path,model,mode='LINE',lazy=False):
+    """Generate Diagram objects one at a time from a line-oriented QGRAF output
+
+    Parameters
+    ----------
+    file_path : str
+        string path to a QGRAF output written with generator/line.sty
+    model : module
+        the module defining the model properties
+    mode : str
+        specification of how to read the lines, see qgraf_parser.diagram_elements.Diagram#parse
+    lazy : bool, optional
+        create qgraf_parser.diagram_elements.LazyDiagram objects, whose elements are created on first access
+
+    Yields
+    ------
+    qgraf_parser.diagram_elements.Diagram:
+        the diagram objects in the file, in the order in which they appear
+    """
+    diagram_class = LazyDiagram if lazy else Diagram
+    with open(file_path) as diagram_file:
+        for line in diagram_file:
+            if line.strip():
+                yield diagram_class(line,model,mode)
+
+def create_diagrams_from_lines(file_path,model,mode='LINE',workers=None,lazy=False):
+    """Generate a list of Diagrams objects from a line-oriented QGRAF output
+
+    Parameters
+    ----------
+    file_path : str
+        string path to a QGRAF output written with generator/line.sty
+    model : module
+        the module defining the model properties
+    workers : int, optional
+        if given, the diagrams are created by this number of processes (see qgraf_parser.importer.parallel)
+    lazy : bool, optional
+        create qgraf_parser.diagram_elements.LazyDiagram objects, whose elements are created on first access
+
+    Returns
+    -------
+    list of qgraf_parser.diagram_elements.Diagram:
+        list of diagram objects in the file
+    """
+    if workers is not None:
+        return create_diagrams_parallel(file_path,model,mode,workers,lazy=lazy)
+    return list(iter_diagrams_from_lines(file_path,model,mode,lazy))
+
+def iter_diagrams(file_path,model,mode='XML',lazy=False):
+    """Generate Diagram objects one at a time from a QGRAF output in any supported format
+
+    Parameters
+    ----------
+    file_path : str
+        string path to the QGRAF output
+    model : module
+        the module defining the model properties
+    mode : str
+        'XML', 'MMAP' or 'LINE'
+    lazy : bool, optional
+        create qgraf_parser.diagram_elements.LazyDiagram objects, whose elements are created on first access
+
+    Yields
+    ------
+    qgraf_parser.diagram_elements.Diagram
+    """
+    if mode == 'LINE':
+        return iter_diagrams_from_lines(file_path,model,mode,lazy)
+    return iter_diagrams_from_XML(file_path,model,mode,lazy)
@@ -0,0 +1,110 @@
+"""On-disk cache of imported diagram sets
+
+Importing the same QGRAF output with the same model always gives the same diagrams. DiagramCache stores the diagrams
+created from an output in a binary form (see qgraf_parser.importer.model_pickle) under a key computed from the content
+of the output and from the structure of the model. Subsequent imports load this binary form through a memory map
+instead of parsing the output again.
+
+Since model objects are stored as references, the Feynman rules of a model can be modified between imports without
+invalidating the cache. Adding, removing or renaming particles, interactions, propagators or parameters changes the key.
+"""
+import os
+import mmap
+from hashlib import sha256
+from qgraf_parser.cache import CacheDirectory,default_cache_root,hash_file
+from .model_pickle import model_signature,dump_diagram_stream,iter_diagram_stream
+import logging
+logger=logging.getLogger(__name__)
+
+# Bump when the serialized form of the diagrams changes
+cache_format_version = "3"
+default_cache_path = os.path.join(default_cache_root,"diagrams")
+default_max_size = 10*1024**3
+
+
+class DiagramCache(CacheDirectory):
+    """Content-addressed cache of diagram sets, with least-recently-used eviction
+
+    Attributes
+    ----------
+    Same as qgraf_parser.cache.CacheDirectory
+    """
+    def __init__(self,path=default_cache_path,max_size=default_max_size):
+        CacheDirectory.__init__(self,path,max_size,suffix=".diagrams")
+
+    @staticmethod
+    def key(file_path,model):
+        """Compute the cache key of a QGRAF output imported with a model
+
+        Parameters
+        ----------
+        file_path : str
+        model : module
+
+        Returns
+        -------
+        str
+        """
+        hasher = sha256()
+        hasher.update(cache_format_version.encode())
+        hasher.update(repr(model_signature(model)).encode())
+        return hash_file(file_path,hasher).hexdigest()
+
+    def iter_diagrams(self,file_path,model,mode='XML',workers=None):
+        """Generate the diagrams of a QGRAF output, from the cache if possible
+
+        On a cache miss, the output is imported and its diagrams are streamed to a new cache entry, which is then read.
+        In both cases the memory usage is bounded by a chunk of diagrams.
+
+        Parameters
+        ----------
+        file_path : str
+            string path to the QGRAF output
+        model : module
+            the module defining the model properties
+        mode : str
+            'XML', 'MMAP' or 'LINE', only used on a cache miss
+        workers : int, optional
+            number of processes used on a cache miss, see qgraf_parser.importer.parallel
+
+        Yields
+        ------
+        qgraf_parser.diagram_elements.Diagram
+        """
+        key = self.key(file_path,model)
+        entry_path = self.lookup(key)
+        if entry_path is None:
+            logger.info("Importing {} into the cache entry {}".format(file_path,key))
+            entry_path = self.store(key,lambda entry_file: self.write_diagrams(entry_file,file_path,model,mode,workers))
+        else:
+            logger.info("Loading the diagrams of {} from the cache entry {}".format(file_path,key))
+        with open(entry_path,"rb") as entry_file:
+            if os.fstat(entry_file.fileno()).st_size == 0:
+                return
+            with mmap.mmap(entry_file.fileno(),0,access=mmap.ACCESS_READ) as entry_map:
+                yield from iter_diagram_stream(entry_map,model)
+
+    @staticmethod
+    def write_diagrams(entry_file,file_path,model,mode,workers):
+        """Import a QGRAF output and write its diagrams to an open cache entry"""
+        # Imported here since qgraf_parser.importer itself imports this module
+        from qgraf_parser.importer import iter_diagrams,iter_diagrams_parallel
+        if workers is None:
+            diagrams = iter_diagrams(file_path,model,mode)
+        else:
+            diagrams = iter_diagrams_parallel(file_path,model,mode,workers)
+        n_diagrams = dump_diagram_stream(diagrams,model,entry_file)
+        logger.info("Stored {} diagrams".format(n_diagrams))
+
+    def load_diagrams(self,file_path,model,mode='XML',workers=None):
+        """Generate the list of the diagrams of a QGRAF output, from the cache if possible
+
+        Parameters
+        ----------
+        Same as DiagramCache#iter_diagrams
+
+        Returns
+        -------
+        list of qgraf_parser.diagram_elements.Diagram
+        """
+        return list(self.iter_diagrams(file_path,model,mode,workers))
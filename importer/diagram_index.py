@@ -0,0 +1,391 @@
+"""Random access to the diagrams of a large XML QGRAF output
+
+A QGRAF output file can contain millions of diagrams, such that reading all of them to extract a handful is wasteful.
+This module builds an index recording the byte offset and length of each <diagram>...</diagram> block, keyed by the
+diagram <id>. The index is stored in a sidecar file next to the output (`graphs.xml` -> `graphs.xml.idx`) and is used to
+seek directly to the requested diagrams.
+
+The sidecar is a text file with a two-line header followed by one `id offset length` line per diagram. The header
+records how far the output was scanned together with fingerprints of the start of the file and of the last scanned
+bytes. If the output has only grown since (e.g. QGRAF was still writing it), rebuilding the index only scans the new
+bytes.
+"""
+import os
+import re
+import tempfile
+from hashlib import sha1
+from xml.etree.ElementTree import XML
+from qgraf_parser.parser.diagram_elements import Diagram
+import logging
+logger=logging.getLogger(__name__)
+
+index_suffix = ".idx"
+index_header = "# qgraf_parser diagram index v1"
+fingerprint_size = 4096
+
+diagram_open_tag = b"<diagram>"
+diagram_close_tag = b"</diagram>"
+diagram_id_pattern = re.compile(rb"<id>\s*(-?\d+)\s*</id>")
+
+
+class DiagramBlockScanner(object):
+    """Incremental scanner that cuts a byte stream into <diagram>...</diagram> blocks
+
+    The data is fed in arbitrary chunks with `feed`, which returns the blocks completed by each chunk. Only the bytes
+    that could belong to an incomplete block are kept in memory.
+
+    Attributes
+    ----------
+    offset : int
+        absolute position in the stream of the first byte held in the buffer
+    """
+    def __init__(self,offset=0):
+        """Constructor for a DiagramBlockScanner
+
+        Parameters
+        ----------
+        offset : int, optional
+            absolute position in the stream of the first byte that will be fed. Defaults to 0.
+        """
+        self.offset = offset
+        self._buffer = b""
+
+    @property
+    def scanned(self):
+        """Absolute position up to which all complete blocks have been returned"""
+        return self.offset
+
+    def feed(self,data):
+        """Add data to the stream and return the blocks it completes
+
+        Parameters
+        ----------
+        data : bytes
+
+        Returns
+        -------
+        list of tuple:
+            (offset,length,block) for each completed block, where offset is the absolute position of the block in
+            the stream and block is the bytes content from <diagram> to </diagram> included
+        """
+        buffer = self._buffer + data
+        blocks = []
+        position = 0
+        while True:
+            start = buffer.find(diagram_open_tag,position)
+            if start < 0:
+                # Keep just enough to recognize an opening tag split across chunks
+                position = max(position,len(buffer)-len(diagram_open_tag)+1)
+                break
+            end = buffer.find(diagram_close_tag,start)
+            if end < 0:
+                position = start
+                break
+            end += len(diagram_close_tag)
+            blocks.append((self.offset+start,end-start,buffer[start:end]))
+            position = end
+        self._buffer = buffer[position:]
+        self.offset += position
+        return blocks
+
+
+def read_diagram_id(block):
+    """Extract the diagram id from a <diagram>...</diagram> block
+
+    Parameters
+    ----------
+    block : bytes
+
+    Returns
+    -------
+    int
+    """
+    match = diagram_id_pattern.search(block)
+    if match is None:
+        error = IOError("Could not find the <id> of a diagram block starting with {}".format(block[:80]))
+        logger.error(error)
+        raise error
+    return int(match.group(1))
+
+
+def iter_diagram_blocks(file_path,start=0,chunk_size=1<<20):
+    """Read a file by chunks and yield its <diagram>...</diagram> blocks
+
+    Parameters
+    ----------
+    file_path : str
+        string path to the XML QGRAF output
+    start : int, optional
+        position from which the file is scanned. It must not fall inside a diagram block. Defaults to 0.
+    chunk_size : int, optional
+        size of the chunks read from the file
+
+    Yields
+    ------
+    tuple:
+        (offset,length,block) as returned by DiagramBlockScanner#feed
+    """
+    scanner = DiagramBlockScanner(start)
+    with open(file_path,"rb") as file:
+        file.seek(start)
+        for chunk in iter(lambda: file.read(chunk_size),b""):
+            yield from scanner.feed(chunk)
+
+
+class DiagramIndex(object):
+    """Map from diagram ids to the position of the corresponding blocks in a QGRAF output
+
+    Attributes
+    ----------
+    entries : dict of {int: tuple of int}
+        maps a diagram id to (offset,length)
+    scanned : int
+        position up to which the output was scanned
+    head_fingerprint : str
+        hash of the first bytes of the output
+    tail_fingerprint : str
+        hash of the last bytes before `scanned`
+    """
+    def __init__(self,entries=None,scanned=0,head_fingerprint="",tail_fingerprint=""):
+        self.entries = {} if entries is None else entries
+        self.scanned = scanned
+        self.head_fingerprint = head_fingerprint
+        self.tail_fingerprint = tail_fingerprint
+
+    @staticmethod
+    def fingerprints(file_path,scanned):
+        """Compute the (head,tail) fingerprints of an output file scanned up to a given position"""
+        with open(file_path,"rb") as file:
+            head = file.read(min(fingerprint_size,scanned))
+            tail_start = max(0,scanned-fingerprint_size)
+            file.seek(tail_start)
+            tail = file.read(scanned-tail_start)
+        return sha1(head).hexdigest(),sha1(tail).hexdigest()
+
+    def extends_to(self,file_path):
+        """Check whether an output file is this index's output with (possibly) new data appended
+
+        Parameters
+        ----------
+        file_path : str
+
+        Returns
+        -------
+        bool
+        """
+        if os.path.getsize(file_path) < self.scanned:
+            return False
+        return self.fingerprints(file_path,self.scanned) == (self.head_fingerprint,self.tail_fingerprint)
+
+    def update(self,file_path,chunk_size=1<<20):
+        """Scan the output from the position where the last scan stopped and record the new blocks
+
+        Parameters
+        ----------
+        file_path : str
+        chunk_size : int, optional
+
+        Returns
+        -------
+        int
+            number of new entries
+        """
+        n_entries = len(self.entries)
+        scanner = DiagramBlockScanner(self.scanned)
+        with open(file_path,"rb") as file:
+            file.seek(self.scanned)
+            for chunk in iter(lambda: file.read(chunk_size),b""):
+                for offset,length,block in scanner.feed(chunk):
+                    self.entries[read_diagram_id(block)] = (offset,length)
+                    self.scanned = offset+length
+        self.head_fingerprint,self.tail_fingerprint = self.fingerprints(file_path,self.scanned)
+        return len(self.entries)-n_entries
+
+    def write(self,index_path):
+        """Write the index to a sidecar file
+
+        The index is first written to a temporary file which is moved into place once complete, such that concurrent
+        readers never see a partial index.
+        """
+        file_descriptor,tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(index_path)),suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor,"w") as index_file:
+                index_file.write(index_header+"\n")
+                index_file.write("# scanned {} head {} tail {}\n".format(self.scanned,self.head_fingerprint,
+                                                                        self.tail_fingerprint))
+                index_file.writelines("{} {} {}\n".format(id,offset,length)
+                                      for id,(offset,length) in self.entries.items())
+            os.replace(tmp_path,index_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def read(cls,index_path):
+        """Load an index from a sidecar file
+
+        Parameters
+        ----------
+        index_path : str
+
+        Returns
+        -------
+        DiagramIndex
+        """
+        with open(index_path) as index_file:
+            header = index_file.readline().rstrip("\n")
+            metadata = index_file.readline().split()
+            if header != index_header or len(metadata) != 7:
+                error = IOError("{} is not a valid diagram index file".format(index_path))
+                logger.error(error)
+                raise error
+            entries = {}
+            for line in index_file:
+                id,offset,length = line.split()
+                entries[int(id)] = (int(offset),int(length))
+        return cls(entries,int(metadata[2]),metadata[4],metadata[6])
+
+    def __contains__(self,id):
+        return id in self.entries
+
+    def __getitem__(self,id):
+        return self.entries[id]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def default_index_path(file_path):
+    """Path of the sidecar index file of a QGRAF output"""
+    return file_path+index_suffix
+
+
+def build_diagram_index(file_path,index_path=None):
+    """Create or update the sidecar index of a XML QGRAF output
+
+    If a valid index exists and the output has only grown since it was built, only the new part of the file is scanned.
+    Otherwise the index is rebuilt from scratch. The sidecar file is only written when the index was rebuilt or has new
+    entries.
+
+    Parameters
+    ----------
+    file_path : str
+        string path to the XML QGRAF output
+    index_path : str, optional
+        path of the sidecar index file. Defaults to file_path+'.idx'
+
+    Returns
+    -------
+    DiagramIndex
+    """
+    if index_path is None:
+        index_path = default_index_path(file_path)
+    index = None
+    if os.path.isfile(index_path):
+        try:
+            index = DiagramIndex.read(index_path)
+        except (IOError,ValueError) as error:
+            logger.warning("Ignoring the unreadable diagram index {}: {}".format(index_path,error))
+        if index is not None and not index.extends_to(file_path):
+            logger.info("The diagram index {} does not match {} anymore, rebuilding it".format(index_path,file_path))
+            index = None
+    rebuilt = index is None
+    if rebuilt:
+        index = DiagramIndex()
+    n_new = index.update(file_path)
+    if rebuilt or n_new > 0:
+        logger.info("Indexed {} new diagrams in {}".format(n_new,file_path))
+        index.write(index_path)
+    return index
+
+
+def expand_diagram_ids(ids):
+    """Expand a specification of diagram ids into a list of int
+
+    Parameters
+    ----------
+    ids : int, str, range or iterable of those
+        ids can be given as integers, ranges, or strings such as "12", "10-20" (inclusive) or "1,4,10-20"
+
+    Returns
+    -------
+    list of int
+    """
+    if isinstance(ids,int):
+        return [ids]
+    if isinstance(ids,range):
+        return list(ids)
+    if isinstance(ids,str):
+        expanded = []
+        for part in ids.split(","):
+            bounds = part.split("-")
+            if len(bounds) == 1:
+                expanded.append(int(bounds[0]))
+            elif len(bounds) == 2:
+                expanded.extend(range(int(bounds[0]),int(bounds[1])+1))
+            else:
+                error = ValueError("Invalid diagram id range: {}".format(part))
+                logger.error(error)
+                raise error
+        return expanded
+    expanded = []
+    for item in ids:
+        expanded.extend(expand_diagram_ids(item))
+    return expanded
+
+
+def read_diagram_blocks(file_path,ids,index):
+    """Read the raw <diagram> blocks of a list of diagram ids
+
+    Parameters
+    ----------
+    file_path : str
+    ids : list of int
+    index : DiagramIndex
+
+    Returns
+    -------
+    list of bytes
+    """
+    blocks = []
+    with open(file_path,"rb") as file:
+        for id in ids:
+            try:
+                offset,length = index[id]
+            except KeyError:
+                error = KeyError("No diagram with id {} in {}".format(id,file_path))
+                logger.error(error)
+                raise error
+            file.seek(offset)
+            blocks.append(file.read(length))
+    return blocks
+
+
+def load_diagrams_by_id(file_path,model,ids,mode='XML',index_path=None):
+    """Create the Diagram objects for a selection of diagram ids of a XML QGRAF output
+
+    Only the requested blocks are read and parsed. The index is built or updated beforehand if needed.
+
+    Parameters
+    ----------
+    file_path : str
+        string path to the XML QGRAF output
+    model : module
+        the module defining the model properties
+    ids : int, str, range or iterable of those
+        the requested diagram ids, see expand_diagram_ids
+    mode : str
+        specification of how to read the diagram nodes, see qgraf_parser.diagram_elements.Diagram#parse
+    index_path : str, optional
+        path of the sidecar index file. Defaults to file_path+'.idx'
+
+    Returns
+    -------
+    list of qgraf_parser.diagram_elements.Diagram:
+        the requested diagrams, in the requested order
+    """
+    index = build_diagram_index(file_path,index_path)
+    blocks = read_diagram_blocks(file_path,expand_diagram_ids(ids),index)
+    if mode == 'MMAP':
+        return [Diagram(block,model,mode) for block in blocks]
+    return [Diagram(XML(block),model,mode) for block in blocks]
@@ -4,6 +4,7 @@ The main feature is the implementation of the ImporterCmd class
 """
 from cmd import Cmd
 import qgraf_parser.generator.qgraf_setup as qgraf_setup
+from .diagram_cache import DiagramCache,default_cache_path,default_max_size
 import subprocess
 import os
 
@@ -36,12 +37,15 @@ class ImporterCmd(Cmd):
 
         self.config = config
         try:
-            assert self.valid_config()
+            assert self.valid_config(config)
         except AssertionError as e:
             logger.error("Incorrect configuration when instantiating a GeneratorCmd")
             logger.error(e)
             raise
 
+        self.diagram_cache = DiagramCache(self.config.get('cache_path',default_cache_path),
+                                          self.config.get('cache_max_size',default_max_size))
+
 
     def do_load_model(self,model_name):
         """
@@ -81,4 +85,20 @@ class ImporterCmd(Cmd):
         -------
 
         """
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    def do_cache_list(self,arg):
+        """List the entries of the diagram cache, most recently used first"""
+        entries = self.diagram_cache.entries()
+        for entry in entries:
+            print(entry)
+        print("{} entries, {} B in {}".format(len(entries),sum(entry.size for entry in entries),self.diagram_cache.path))
+
+    def do_cache_purge(self,arg):
+        """Remove entries from the diagram cache: all of them, or those whose keys are given as arguments"""
+        keys = arg.split()
+        if keys:
+            n_removed = sum(self.diagram_cache.remove(key) for key in keys)
+        else:
+            n_removed = self.diagram_cache.purge()
+        logger.info("Removed {} entries from the diagram cache".format(n_removed))
@@ -0,0 +1,200 @@
+"""Serialization of diagrams that refer to the objects of a model
+
+Diagram objects hold references to the Particle, Interaction, Propagator and Parameter objects of the model they were
+created with. When diagrams are sent between processes or stored on disk, these objects should not be copied: they
+are written as references by kind and name and resolved against the model of the process that loads the diagrams. As
+a result, the loaded diagrams share the model objects of the loading process, and changes to the Feynman rules of the
+model since the diagrams were serialized are taken into account.
+"""
+import io
+import gc
+import pickle
+from contextlib import contextmanager
+import logging
+logger=logging.getLogger(__name__)
+
+model_object_kinds = ("particles","interactions","propagators","parameters")
+
+
+def model_objects(model):
+    """Map the references of the objects of a model to the objects
+
+    Parameters
+    ----------
+    model : module
+        the module defining the model properties
+
+    Returns
+    -------
+    dict of {tuple of str: object}
+        maps (kind,name) to the model object
+    """
+    return {(kind,name): obj for kind in model_object_kinds for name,obj in getattr(model,kind).internal_dict.items()}
+
+
+def model_references(model):
+    """Map the objects of a model to their references
+
+    Parameters
+    ----------
+    model : module
+        the module defining the model properties
+
+    Returns
+    -------
+    dict of {int: tuple of str}
+        maps id(object) to (kind,name)
+    """
+    return {id(obj): reference for reference,obj in model_objects(model).items()}
+
+
+def model_signature(model):
+    """Describe the structure of a model: its name and the names of its objects
+
+    Two models with the same signature can resolve the references written by ModelPickler for each other.
+
+    Parameters
+    ----------
+    model : module
+
+    Returns
+    -------
+    tuple
+    """
+    return (model.__name__,)+tuple(tuple(sorted(getattr(model,kind).keys())) for kind in model_object_kinds)
+
+
+class ModelPickler(pickle.Pickler):
+    """Pickler that writes the objects of a model as references"""
+    def __init__(self,file,model,protocol=pickle.HIGHEST_PROTOCOL):
+        pickle.Pickler.__init__(self,file,protocol)
+        self.references = model_references(model)
+
+    def persistent_id(self,obj):
+        return self.references.get(id(obj))
+
+
+class ModelUnpickler(pickle.Unpickler):
+    """Unpickler that resolves the model references written by ModelPickler"""
+    def __init__(self,file,model):
+        pickle.Unpickler.__init__(self,file)
+        self.model = model
+        self.objects = model_objects(model)
+
+    def persistent_load(self,pid):
+        try:
+            return self.objects[pid]
+        except KeyError:
+            error = pickle.UnpicklingError("The model {} has no {} named {}".format(self.model.__name__,*pid))
+            logger.error(error)
+            raise error
+
+
+@contextmanager
+def paused_gc():
+    """Pause the cyclic garbage collector
+
+    Loading diagrams creates many small objects at once, which makes the cyclic garbage collector run over and over
+    on objects that cannot be garbage.
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def dumps_diagrams(diagrams,model):
+    """Serialize a list of diagrams to bytes, writing model objects as references
+
+    Parameters
+    ----------
+    diagrams : list of qgraf_parser.diagram_elements.Diagram
+    model : module
+        the model the diagrams were created with
+
+    Returns
+    -------
+    bytes
+    """
+    buffer = io.BytesIO()
+    ModelPickler(buffer,model).dump(diagrams)
+    return buffer.getvalue()
+
+
+def loads_diagrams(data,model):
+    """Load a list of diagrams serialized with dumps_diagrams
+
+    Parameters
+    ----------
+    data : bytes-like
+        any object supporting the buffer protocol
+    model : module
+        the model whose objects the diagrams will refer to
+
+    Returns
+    -------
+    list of qgraf_parser.diagram_elements.Diagram
+    """
+    with paused_gc():
+        return ModelUnpickler(io.BytesIO(data),model).load()
+
+
+def dump_diagram_stream(diagrams,model,file,chunk_size=1024):
+    """Write diagrams to a binary file as a sequence of pickled chunks
+
+    Only one chunk is held in memory at a time, such that diagrams can be written from a generator.
+
+    Parameters
+    ----------
+    diagrams : iterable of qgraf_parser.diagram_elements.Diagram
+    model : module
+        the model the diagrams were created with
+    file : binary file object
+    chunk_size : int, optional
+        number of diagrams per chunk
+
+    Returns
+    -------
+    int
+        number of written diagrams
+    """
+    # Each chunk is an independent pickle, written by a new pickler such that the memo does not keep all the
+    # diagrams alive
+    n_diagrams = 0
+    chunk = []
+    for diagram in diagrams:
+        chunk.append(diagram)
+        if len(chunk) == chunk_size:
+            ModelPickler(file,model).dump(chunk)
+            n_diagrams += len(chunk)
+            chunk = []
+    if chunk:
+        ModelPickler(file,model).dump(chunk)
+        n_diagrams += len(chunk)
+    return n_diagrams
+
+
+def iter_diagram_stream(file,model):
+    """Generate the diagrams written with dump_diagram_stream
+
+    Parameters
+    ----------
+    file : binary file object
+        any object with read and readline methods, e.g. an open file or a mmap.mmap object
+    model : module
+        the model whose objects the diagrams will refer to
+
+    Yields
+    ------
+    qgraf_parser.diagram_elements.Diagram
+    """
+    while True:
+        with paused_gc():
+            try:
+                chunk = ModelUnpickler(file,model).load()
+            except EOFError:
+                return
+        yield from chunk
@@ -0,0 +1,348 @@
+"""Construction of Diagram objects on several processes
+
+The diagram blocks (or lines) of a QGRAF output are read by the main process and sent in chunks to a pool of worker
+processes, which parse them. Whatever is sent back has to be unpickled by the main process alone, which bounds the
+speedup of the pool, so that the workers can return three kinds of payloads, from the heaviest to the lightest:
+
+- full Diagram objects, sent with qgraf_parser.importer.model_pickle such that the diagrams returned to the main
+  process refer to its own model objects. Unpickling them costs a sizeable fraction of their construction.
+- parsed records of the diagram elements (lazy=True), which are plain tuples of strings wrapped into LazyDiagram
+  objects by the main process: the elements are only created when they are accessed.
+- the flat arrays of a qgraf_parser.parser.diagram_set.DiagramSet of each chunk, which the main process concatenates
+  (create_diagram_set_parallel). The chunks are then byte ranges of the file, which the workers read themselves, such
+  that the main process does not even read the diagrams.
+
+Models are python modules: the worker processes import the model by its module name, which must therefore be
+importable (e.g. qgraf_parser.models.GHT). Models created dynamically in the main process are not supported.
+"""
+import os
+import mmap
+import pickle
+import importlib
+from itertools import repeat
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree.ElementTree import XML
+from qgraf_parser.parser.diagram_elements import Diagram,LazyDiagram,DiagramField,DiagramVertex,DiagramPropagator
+from qgraf_parser.parser.diagram_set import DiagramSet
+from .diagram_index import iter_diagram_blocks
+from .model_pickle import dumps_diagrams,loads_diagrams
+import logging
+logger=logging.getLogger(__name__)
+
+# Model of a worker process, set by init_worker
+worker_model = None
+
+
+def init_worker(model_name):
+    """Import the model in a worker process
+
+    Parameters
+    ----------
+    model_name : str
+        importable name of the model module
+    """
+    global worker_model
+    worker_model = importlib.import_module(model_name)
+
+
+def create_worker_diagrams(nodes,mode):
+    """Create the Diagram objects of a chunk of raw nodes in a worker process
+
+    Parameters
+    ----------
+    nodes : list of bytes or str
+        <diagram> blocks for the 'XML' and 'MMAP' modes, diagram lines for the 'LINE' mode
+    mode : str
+
+    Returns
+    -------
+    list of qgraf_parser.diagram_elements.Diagram
+    """
+    if mode == 'XML':
+        return [Diagram(XML(node),worker_model,mode) for node in nodes]
+    return [Diagram(node,worker_model,mode) for node in nodes]
+
+
+def build_diagram_chunk(nodes,mode):
+    """Create the Diagram objects of a chunk of raw nodes in a worker process and serialize them
+
+    Parameters
+    ----------
+    Same as create_worker_diagrams
+
+    Returns
+    -------
+    bytes
+        the diagrams serialized with qgraf_parser.importer.model_pickle.dumps_diagrams
+    """
+    return dumps_diagrams(create_worker_diagrams(nodes,mode),worker_model)
+
+
+def generate_raw_diagram_nodes(file_path,mode):
+    """Read the raw nodes of a QGRAF output that are sent to the worker processes
+
+    Parameters
+    ----------
+    file_path : str
+    mode : str
+        'XML', 'MMAP' or 'LINE'
+
+    Yields
+    ------
+    bytes or str
+    """
+    if mode == 'LINE':
+        with open(file_path) as diagram_file:
+            yield from (line for line in diagram_file if line.strip())
+    else:
+        yield from (block for offset,length,block in iter_diagram_blocks(file_path))
+
+
+def parse_diagram_record(node,mode):
+    """Parse a raw node into the record of a diagram, as read by LazyDiagram in the 'RECORD' mode
+
+    Parameters
+    ----------
+    node : bytes or str
+        <diagram> block for the 'XML' and 'MMAP' modes, diagram line for the 'LINE' mode
+    mode : str
+
+    Returns
+    -------
+    tuple:
+        (id,signsym,legs,vertices,propagators) where the elements are the records of their parsers
+    """
+    if mode == 'XML':
+        node = XML(node)
+    id,signsym,legs,vertices,propagators = Diagram.parse(node,mode)
+    return (id,
+            signsym,
+            [DiagramField.parse(leg,mode) for leg in legs],
+            [list(DiagramVertex.parse(vertex,mode)) for vertex in vertices],
+            [DiagramPropagator.parse(propagator,mode) for propagator in propagators])
+
+
+def build_record_chunk(nodes,mode):
+    """Parse a chunk of raw nodes into diagram records in a worker process and serialize them
+
+    Returns
+    -------
+    bytes
+        the pickled list of records, see parse_diagram_record
+    """
+    return pickle.dumps([parse_diagram_record(node,mode) for node in nodes],pickle.HIGHEST_PROTOCOL)
+
+
+def load_record_chunk(payload,model):
+    """Wrap the records of a chunk into LazyDiagram objects"""
+    return [LazyDiagram(record,model,'RECORD') for record in pickle.loads(payload)]
+
+
+def generate_range_diagram_nodes(file_path,mode,start,end):
+    """Read the raw nodes of a QGRAF output that start in a byte range
+
+    Parameters
+    ----------
+    file_path : str
+    mode : str
+        'XML', 'MMAP' or 'LINE'
+    start, end : int
+        the byte range. Consecutive ranges split the nodes of a file without overlap.
+
+    Yields
+    ------
+    bytes or str
+    """
+    if mode == 'LINE':
+        with open(file_path,"rb") as diagram_file:
+            if start > 0:
+                # Skip the end of the line that starts before the range
+                diagram_file.seek(start-1)
+                diagram_file.readline()
+            while diagram_file.tell() < end:
+                line = diagram_file.readline()
+                if not line:
+                    break
+                if line.strip():
+                    yield line.decode()
+        return
+    with open(file_path,"rb") as file, mmap.mmap(file.fileno(),0,access=mmap.ACCESS_READ) as diagrams_map:
+        position = diagrams_map.find(b"<diagram>",start)
+        while 0 <= position < end:
+            block_end = diagrams_map.find(b"</diagram>",position)
+            if block_end < 0:
+                error = IOError("Unterminated <diagram> block at byte {} of {}".format(position,file_path))
+                logger.error(error)
+                raise error
+            block_end += len(b"</diagram>")
+            yield diagrams_map[position:block_end]
+            position = diagrams_map.find(b"<diagram>",block_end)
+
+
+def byte_ranges(file_path,n_ranges):
+    """Split a file into at most n_ranges consecutive byte ranges of similar sizes
+
+    Returns
+    -------
+    list of tuple of int
+        (start,end) of each range
+    """
+    size = os.path.getsize(file_path)
+    n_ranges = max(1,min(n_ranges,size))
+    bounds = [size*index//n_ranges for index in range(n_ranges+1)]
+    return [(start,end) for start,end in zip(bounds[:-1],bounds[1:]) if end > start]
+
+
+def build_range_set(file_path,mode,start,end):
+    """Create the DiagramSet of the diagrams of a byte range of a QGRAF output in a worker process
+
+    Returns
+    -------
+    qgraf_parser.parser.diagram_set.DiagramSet
+        without model, which cannot be sent between processes
+    """
+    nodes = generate_range_diagram_nodes(file_path,mode,start,end)
+    diagram_set = DiagramSet(create_worker_diagrams(nodes,mode),worker_model,keep_diagrams=False)
+    diagram_set.model = None
+    return diagram_set
+
+
+def model_module_name(model):
+    """Check that a model can be imported by name in a worker process and return its name"""
+    try:
+        assert importlib.import_module(model.__name__) is model
+    except (AttributeError,ImportError,AssertionError):
+        error = ValueError("The model {} must be an importable module to be sent to worker processes".format(model))
+        logger.error(error)
+        raise error
+    return model.__name__
+
+
+def iter_chunk_payloads(file_path,model,mode,workers,chunk_size,build_chunk):
+    """Send the raw nodes of a QGRAF output in chunks to a pool of processes and collect the results in order
+
+    At most 2*workers chunks are in flight at any time, such that the memory usage does not grow with the size of the
+    file.
+
+    Parameters
+    ----------
+    file_path : str
+    model : module
+        the module defining the model properties. It must be importable by name.
+    mode : str
+        'XML', 'MMAP' or 'LINE'
+    workers : int or None
+        number of worker processes. Defaults to the number of CPUs.
+    chunk_size : int
+        number of diagrams sent to a worker at once
+    build_chunk : callable
+        module-level function called in the workers on (nodes,mode)
+
+    Yields
+    ------
+    the results of build_chunk, in the order of the chunks in the file
+    """
+    model_name = model_module_name(model)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    max_pending = 2*workers
+    with ProcessPoolExecutor(max_workers=workers,initializer=init_worker,initargs=(model_name,)) as executor:
+        pending = deque()
+        chunk = []
+        for node in generate_raw_diagram_nodes(file_path,mode):
+            chunk.append(node)
+            if len(chunk) == chunk_size:
+                pending.append(executor.submit(build_chunk,chunk,mode))
+                chunk = []
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+        if chunk:
+            pending.append(executor.submit(build_chunk,chunk,mode))
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_diagrams_parallel(file_path,model,mode='XML',workers=None,chunk_size=256,lazy=False):
+    """Generate the Diagram objects of a QGRAF output using a pool of processes
+
+    The diagrams are yielded in the order in which they appear in the file.
+
+    Parameters
+    ----------
+    file_path : str
+        string path to the QGRAF output
+    model : module
+        the module defining the model properties. It must be importable by name.
+    mode : str
+        'XML', 'MMAP' or 'LINE'
+    workers : int, optional
+        number of worker processes. Defaults to the number of CPUs.
+    chunk_size : int, optional
+        number of diagrams sent to a worker at once
+    lazy : bool, optional
+        the workers only parse the diagrams, which are returned as LazyDiagram objects whose elements are created on
+        first access. This keeps the work of the main process, which bounds the speedup, to a minimum.
+
+    Yields
+    ------
+    qgraf_parser.diagram_elements.Diagram
+    """
+    if lazy:
+        for payload in iter_chunk_payloads(file_path,model,mode,workers,chunk_size,build_record_chunk):
+            yield from load_record_chunk(payload,model)
+    else:
+        for payload in iter_chunk_payloads(file_path,model,mode,workers,chunk_size,build_diagram_chunk):
+            yield from loads_diagrams(payload,model)
+
+
+def create_diagrams_parallel(file_path,model,mode='XML',workers=None,chunk_size=256,lazy=False):
+    """Generate the list of Diagram objects of a QGRAF output using a pool of processes
+
+    Parameters
+    ----------
+    Same as iter_diagrams_parallel
+
+    Returns
+    -------
+    list of qgraf_parser.diagram_elements.Diagram:
+        the diagrams sorted by diagram id
+    """
+    diagrams = list(iter_diagrams_parallel(file_path,model,mode,workers,chunk_size,lazy))
+    diagrams.sort(key=lambda diagram: int(diagram.id))
+    return diagrams
+
+
+def create_diagram_set_parallel(file_path,model,mode='XML',workers=None,chunk_bytes=1<<22):
+    """Build the DiagramSet of a QGRAF output using a pool of processes
+
+    The file is split into byte ranges, whose diagrams are read by the workers to build the arrays of their
+    DiagramSet. The main process only concatenates the arrays.
+
+    Parameters
+    ----------
+    file_path : str
+        string path to the QGRAF output
+    model : module
+        the module defining the model properties. It must be importable by name.
+    mode : str
+        'XML', 'MMAP' or 'LINE'
+    workers : int, optional
+        number of worker processes. Defaults to the number of CPUs.
+    chunk_bytes : int, optional
+        approximate size of the byte ranges. The file is split into at least one range per worker.
+
+    Returns
+    -------
+    qgraf_parser.parser.diagram_set.DiagramSet
+        without the Diagram objects, in the order of the file
+    """
+    model_name = model_module_name(model)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    n_ranges = max(workers,-(-os.path.getsize(file_path)//chunk_bytes))
+    ranges = byte_ranges(file_path,n_ranges)
+    with ProcessPoolExecutor(max_workers=workers,initializer=init_worker,initargs=(model_name,)) as executor:
+        chunk_sets = executor.map(build_range_set,repeat(file_path),repeat(mode),[start for start,end in ranges],
+                                  [end for start,end in ranges])
+        return DiagramSet.concatenate(chunk_sets,model)
@@ -4,4 +4,8 @@ from .particles import particles
 from .interactions import interactions
 from .propagators import propagators
 import logging
-logger = logging.getLogger(__name__)
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+# FORM declarations, see qgraf_parser.exporter.declarations
+form_functions = ("Den","g")
+form_index_families = {"col":"NC","i":"NC","s":"4","x":"4"}
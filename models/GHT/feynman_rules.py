@@ -32,7 +32,7 @@ def txtH(field_index_mapper):
 
     Returns
     -------
-    str
+    qgraf_parser.models.common_tools.algebra_tools.Product
         The FORM expression for the Feynman rule
     """
     tx =field_index_mapper['tbar'][0]
@@ -40,7 +40,7 @@ def txtH(field_index_mapper):
     prefactor = '(-i_)*Y'
     delta_i1_i2 = "d_(col{},col{})".format(t.id,tx.id) # color delta
     delta_s1_s2 = "d_(s{},s{})".format(t.id,tx.id)# Dirac algebra delta
-    return times(prefactor,delta_i1_i2,delta_s1_s2)
+    return Product(prefactor,delta_i1_i2,delta_s1_s2)
 
 # def ggg(field_index_mapper,line=None):#TODO Refactor for no lines and fields
 #     gluons = field_index_mapper['g']
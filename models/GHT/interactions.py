@@ -1,5 +1,6 @@
 from ..GHT import feynman_rules as FR
 from .particles import particles
+from .parameters import parameters as p
 from ..common_tools.abstract_objects import Interaction, InteractionDict
 import logging
 logger = logging.getLogger(__name__)
@@ -11,7 +12,7 @@ topx = particles['tbar']
 Higgs = particles['H']
 
 # Interactions
-txtH =Interaction([topx,top,Higgs],FR.txtH)
+txtH =Interaction([topx,top,Higgs],FR.txtH,coupling=p['Y'])
 # ggg = Interaction([gluon,gluon,gluon],FR.ggg)
 # txtg = Interaction([topx,top,gluon],FR.txtg)
 
@@ -7,6 +7,7 @@ g = Parameter('g', name='gs', info='strong coupling constant')
 I = Parameter('i_', name='I', info='unit imaginary number')
 mh = Parameter('mh', info='Higgs mass')
 mt = Parameter('mt', info='Top mass')
+Y = Parameter('Y', info='top Yukawa coupling')
 
 #Bundle it all up
-parameters = ParameterDict([I, g, mh, mt, zero])
\ No newline at end of file
+parameters = ParameterDict([I, g, mh, mt, Y, zero])
\ No newline at end of file
@@ -1,4 +1,3 @@
-from itertools import permutations
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,6 +12,10 @@ class AbstractObjectDict(object):
 
     One can relabel added items using self.relabel(old_key,new_key)
 
+    Daughter classes can also maintain a secondary index, built at insertion time, by overriding index_key. The index
+    maps the key returned by index_key(obj) to the key of obj in the internal dictionary and is kept up to date by
+    append and relabel.
+
     Methods
     -------
     append(obj)
@@ -23,6 +26,8 @@ class AbstractObjectDict(object):
     ----------
     internal_dict: dict
         the dictionary in which data is stored
+    index: dict
+        the secondary index, see index_key
     _type: type
         the type of the objects contained here
     """
@@ -39,6 +44,22 @@ class AbstractObjectDict(object):
             logger.error(message)
             raise KeyError(message)
         self.internal_dict[obj.name]=obj
+        index_key = self.index_key(obj)
+        if index_key is None:
+            return
+        if index_key in self.index:
+            logger.warning("{} and {} have the same index key in {}: the first one is kept".format(
+                self.internal_dict[self.index[index_key][0]],obj,type(self).__name__))
+            return
+        self.index[index_key] = (obj.name,)+self.index_data(obj)
+
+    def index_key(self,obj):
+        """Key of an object in the secondary index, or None to leave it out of the index"""
+        return None
+
+    def index_data(self,obj):
+        """Tuple of extra data stored in the index along with the key of the object in the internal dictionary"""
+        return ()
 
     def __init__(self,list_of_objects):
         if self._type is None:
@@ -46,6 +67,7 @@ class AbstractObjectDict(object):
             logger.error(message)
             raise NotImplementedError(message)
         self.internal_dict={}
+        self.index={}
         for obj in list_of_objects:
             self.append(obj)
 
@@ -53,6 +75,9 @@ class AbstractObjectDict(object):
         """Relabel a key of the dictionary"""
         self.internal_dict[new_key] = self.internal_dict[old_key]
         del self.internal_dict[old_key]
+        for index_key,entry in self.index.items():
+            if entry[0] == old_key:
+                self.index[index_key] = (new_key,)+entry[1:]
 
     def keys(self):
         """Access the keys of the internal dictionary"""
@@ -196,16 +221,19 @@ class Interaction(object):
     """Abstract representation of an interaction vertex
     TODO add more structure based on the new qgraf vertex object
     """
-    def __init__(self,particles,feynman_rule):
+    def __init__(self,particles,feynman_rule,coupling=None):
         """Creator for the Interaction class
 
         Parameters
         ----------
         particles : list of Particle
         feynman_rule : function
+        coupling : Parameter, optional
+            the coupling constant of the interaction, used for numerical evaluations
         """
         self.particles = particles
         self.feynman_rule = feynman_rule
+        self.coupling = coupling
         self.name = ",".join([particle.name for particle in particles])
     def generate_feynman_rule(self, fields, *args):
         """Create a string corresponding to the Feynman rule for the qgraf_parser Vertex
@@ -218,7 +246,7 @@ class Interaction(object):
 
         Returns
         -------
-        str
+        str or qgraf_parser.models.common_tools.algebra_tools.Expression
             the expression of the feynman rule for this interaction with a specific choice of fields.
         """
         # Generate a dictionary field_name : [list of matching ids]
@@ -252,10 +280,50 @@ class Interaction(object):
 
 class InteractionDict(AbstractObjectDict):
     """Container for Interactions. Inherits from AbstractObjectDict
+
+    Interactions are indexed by the sorted tuple of the names of their particles, such that they can be found from the
+    particles of a vertex in any order. The index also stores the ordering of the particles of each interaction, from
+    which lookup_with_permutation obtains the correspondence between the particles of the vertex and of the interaction.
     """
     _type = Interaction
+
+    @staticmethod
+    def sorted_positions(particle_names):
+        """Positions of the particle names in sorted order"""
+        return sorted(range(len(particle_names)),key=particle_names.__getitem__)
+
+    def index_key(self,obj):
+        return tuple(sorted(particle.name for particle in obj.particles))
+
+    def index_data(self,obj):
+        return (tuple(self.sorted_positions([particle.name for particle in obj.particles])),)
+
+    def lookup_with_permutation(self,particle_names):
+        """Find the interaction of a list of particles, with the permutation that maps it to the interaction ordering
+
+        Parameters
+        ----------
+        particle_names : list of str
+
+        Returns
+        -------
+        tuple:
+            (interaction,permutation) where particle_names[permutation[i]] is the name of interaction.particles[i]
+        """
+        positions = self.sorted_positions(particle_names)
+        try:
+            key,stored_positions = self.index[tuple(particle_names[position] for position in positions)]
+        except KeyError:
+            error = KeyError("No interaction between the particles {} in {}".format(particle_names,type(self).__name__))
+            logger.error(error)
+            raise error
+        permutation = [0]*len(positions)
+        for stored_position,position in zip(stored_positions,positions):
+            permutation[stored_position] = position
+        return self.internal_dict[key],tuple(permutation)
+
     def __getitem__(self, item):
-        """Get the content of the dictionary. Two ways of doing so: either with the name of the interaction or with a list of particle names. Due to how interaction names are generated, in this second case, all possible names can be obtained by looping over orderings of the particle names and joining them with commas.
+        """Get the content of the dictionary. Two ways of doing so: either with the name of the interaction or with a list of particle names in any order, which is looked up in the index.
 
         Parameters
         ----------
@@ -268,17 +336,16 @@ class InteractionDict(AbstractObjectDict):
         """
         if isinstance(item,str):
             return self.internal_dict[item]
-        else:
-            try:
-                assert isinstance(item,list)
-            except TypeError as t:
-                message = "{} elements can be accessed using strings or lists as keys. Here a {} was used".format(type(self).__name__,type(item))
-                logger.error("")
-            orderings = list(permutations(item))
-            for ordering in orderings:
-                if ",".join(ordering) in self.internal_dict:
-                    break
-            return self.internal_dict[",".join(ordering)]
+        if not isinstance(item,list):
+            error = TypeError("{} elements can be accessed using strings or lists as keys. Here a {} was used".format(type(self).__name__,type(item)))
+            logger.error(error)
+            raise error
+        try:
+            return self.internal_dict[self.index[tuple(sorted(item))][0]]
+        except KeyError:
+            error = KeyError("No interaction between the particles {} in {}".format(item,type(self).__name__))
+            logger.error(error)
+            raise error
 
 class Propagator(Interaction):
     """Abstract representation of a propagator"""
@@ -296,7 +363,7 @@ class Propagator(Interaction):
 
         Returns
         -------
-        str
+        str or qgraf_parser.models.common_tools.algebra_tools.Expression
             the expression of the feynman rule for this interaction with a specific choice of fields and momentum.
         """
         # Sanity checks
@@ -316,8 +383,14 @@ class Propagator(Interaction):
 
 class PropagatorDict(AbstractObjectDict):
     """Container for Propagator objects. Inherits from AbstractObjectDict
+
+    Propagators are indexed by the tuple of the names of their particles, in order.
     """
     _type = Propagator
+
+    def index_key(self,obj):
+        return tuple(particle.name for particle in obj.particles)
+
     def __getitem__(self, item):
         """Get the content of the dictionary. Two ways of doing so: either with the name of the interaction or with a
          list of particle names. Contrary to InteractionDict objects, the ordering of the particles is meaningful
@@ -334,13 +407,16 @@ class PropagatorDict(AbstractObjectDict):
         """
         if isinstance(item,str):
             return self.internal_dict[item]
-        else:
-            try:
-                assert isinstance(item,list)
-            except TypeError as t:
-                message = "{} elements can be accessed using strings or lists as keys. Here a {} was used".format(type(self).__name__,type(item))
-                logger.error("")
-            return self.internal_dict[",".join(item)]
+        if not isinstance(item,list):
+            error = TypeError("{} elements can be accessed using strings or lists as keys. Here a {} was used".format(type(self).__name__,type(item)))
+            logger.error(error)
+            raise error
+        try:
+            return self.internal_dict[self.index[tuple(item)][0]]
+        except KeyError:
+            error = KeyError("No propagator between the particles {} in {}".format(item,type(self).__name__))
+            logger.error(error)
+            raise error
 
 
 #####################################################################
@@ -349,5 +425,5 @@ class PropagatorDict(AbstractObjectDict):
 #####################################################################
 #####################################################################
 
-zero = Parameter("zero")
+zero = Parameter("zero",value=0)
 I = Parameter("i_")
\ No newline at end of file
@@ -1,13 +1,230 @@
 #TODO change docstrings to numpy style
-"""Basic tools for manipulating algebraic expressions in strings"""
+"""Basic tools for manipulating algebraic expressions in strings
+
+Expressions can be built either as strings, with times, plus and minus, or as trees of immutable Expression nodes
+(Atom, Product, Sum and Neg). Nested string operations copy the same substrings over and over, while nodes only
+refer to their operands: the FORM text of a tree is written once, in a single pass, when it is rendered or written to a
+stream. Both forms can be mixed: the operands of nodes and of times, plus and minus can be strings or nodes, and a tree
+renders to the same text as the equivalent nested string operations.
+
+Nodes are hash-consed, such that the same subexpression built in many diagrams is a single object. The
+subexpressions module builds on this to write repeated subexpressions once.
+"""
 import re
+import io
+import weakref
+
+
+class Expression(object):
+    """Base class of the immutable nodes of an expression tree
+
+    Nodes are hash-consed: creating a node with the same type and operands as a live node returns the existing node,
+    such that identical subexpressions share one object, across diagrams as well. Equal nodes are therefore identical
+    and their hash, computed once at creation, is cheap to use as a dictionary key.
+    """
+    __slots__ = ("__weakref__","hash_value")
+    interned_nodes = weakref.WeakValueDictionary()
+
+    @classmethod
+    def interned(cls,operands,**attributes):
+        """Find or create the node of a given type with given operands
+
+        Parameters
+        ----------
+        operands : tuple
+            the operands of the node, see Expression#operands
+        attributes : dict
+            values of the slots of a new node
+
+        Returns
+        -------
+        Expression
+        """
+        key = (cls,operands)
+        node = Expression.interned_nodes.get(key)
+        if node is None:
+            node = object.__new__(cls)
+            for name,value in attributes.items():
+                object.__setattr__(node,name,value)
+            object.__setattr__(node,"hash_value",hash(key))
+            Expression.interned_nodes[key] = node
+        return node
+
+    def write(self,write,names=None):
+        """Write the FORM text of the expression
+
+        Parameters
+        ----------
+        write : callable
+            called with successive pieces of the text, e.g. the write method of a text file
+        names : dict of {Expression: str}, optional
+            subexpressions of this expression that are written as the given name instead of their text
+        """
+        raise NotImplementedError
+
+    def operands(self):
+        """tuple: the operands of the node, which identify it along with its type"""
+        raise NotImplementedError
+
+    def children(self):
+        """tuple of Expression: the operands that are nodes themselves"""
+        return ()
+
+    def render(self,names=None):
+        """Render the FORM text of the expression as a string, see Expression#write"""
+        buffer = io.StringIO()
+        self.write(buffer.write,names)
+        return buffer.getvalue()
+
+    def __setattr__(self,key,value):
+        error = AttributeError("{} objects are immutable".format(type(self).__name__))
+        raise error
+
+    def __reduce__(self):
+        # Unpickled nodes go through the constructor and are interned in the loading process
+        return type(self),self.operands()
+
+    def __eq__(self,other):
+        return self is other or (type(self) is type(other) and self.operands() == other.operands())
+
+    def __ne__(self,other):
+        return not self == other
+
+    def __hash__(self):
+        return self.hash_value
+
+    def __str__(self):
+        return self.render()
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__,", ".join(repr(operand) for operand in self.operands()))
+
+
+def as_expression(x):
+    """Convert a string or an Expression to an Expression"""
+    if isinstance(x,Expression):
+        return x
+    return Atom(x)
+
+
+def write_operand(expression,write,names):
+    """Write an operand of a node, or its name if it has one"""
+    if names and expression in names:
+        write(names[expression])
+    else:
+        expression.write(write,names)
+
+
+class Atom(Expression):
+    """Leaf of an expression tree: a piece of FORM text that is written as is"""
+    __slots__ = ("text",)
+
+    def __new__(cls,text):
+        text = str(text)
+        return cls.interned((text,),text=text)
+
+    def operands(self):
+        return (self.text,)
+
+    def write(self,write,names=None):
+        write(self.text)
+
+
+class Product(Expression):
+    """Product of expressions, written (f1)*(f2)*... like times"""
+    __slots__ = ("factors",)
+
+    def __new__(cls,*factors):
+        factors = tuple(as_expression(factor) for factor in factors)
+        return cls.interned(factors,factors=factors)
+
+    def operands(self):
+        return self.factors
+
+    def children(self):
+        return self.factors
+
+    def write(self,write,names=None):
+        write_joined(self.factors,"*",write,names)
+
+
+class Sum(Expression):
+    """Sum of expressions, written (t1)+(t2)+... like plus"""
+    __slots__ = ("terms",)
+
+    def __new__(cls,*terms):
+        terms = tuple(as_expression(term) for term in terms)
+        return cls.interned(terms,terms=terms)
+
+    def operands(self):
+        return self.terms
+
+    def children(self):
+        return self.terms
+
+    def write(self,write,names=None):
+        write_joined(self.terms,"+",write,names)
+
+
+class Neg(Expression):
+    """Opposite of an expression, written -(x) like minus"""
+    __slots__ = ("term",)
+
+    def __new__(cls,term):
+        term = as_expression(term)
+        return cls.interned((term,),term=term)
+
+    def operands(self):
+        return (self.term,)
+
+    def children(self):
+        return (self.term,)
+
+    def write(self,write,names=None):
+        write("-(")
+        write_operand(self.term,write,names)
+        write(")")
+
+
+def write_joined(expressions,separator,write,names=None):
+    """Write a sequence of expressions wrapped in parentheses and joined by a separator"""
+    for position,expression in enumerate(expressions):
+        write("(" if position == 0 else ")"+separator+"(")
+        write_operand(expression,write,names)
+    if expressions:
+        write(")")
+
+
+def render(expression):
+    """FORM text of a string or an Expression"""
+    if isinstance(expression,Expression):
+        return expression.render()
+    return str(expression)
+
+
+def write_expression(expression,write,names=None):
+    """Write the FORM text of a string or an Expression
+
+    Parameters
+    ----------
+    expression : str or Expression
+    write : callable
+        called with successive pieces of the text, e.g. the write method of a text file
+    names : dict of {Expression: str}, optional
+        see Expression#write
+    """
+    if isinstance(expression,Expression):
+        expression.write(write,names)
+    else:
+        write(str(expression))
+
 
 def parwrap(*args):
     """Wrap each term in a sequence of strings between parentheses
-    :param *args: sequence of strings
+    :param *args: sequence of strings or Expression
     :returns: a list of wrapped strings
     """
-    return ["("+arg+")" for arg in args]
+    return ["("+render(arg)+")" for arg in args]
 
 def times(*args):
     """
@@ -31,35 +248,31 @@ def minus(x):
     :param x: a string
     :return: -(x)
     """
-    return "-".join(parwrap(x))
+    return "-"+parwrap(x)[0]
 
 def pparse(p):
     """Parse a momenta expressed as a sum of +/- individual momenta into each component, keeping the sign.
     Example: -p1+p2-p3 -> [-p1,+p2,-p3]
 
     :param p: a combination of momenta
-    :type p: str
+    :type p: str or qgraf_parser.models.common_tools.momenta.Momentum
     :return: list of individual strings for each momentum
     """
-    lp=re.split("[+-]",p)
-    for mom in [x for x in lp if x!='']:
-        p=p.replace(mom,mom+",")
-    lp=p.split(",")
-    return [x for x in lp if x!='']
+    if not isinstance(p,str):
+        return p.components()
+    return [x.strip() for x in re.findall("[+-]?[^+-]+",p) if x.strip()!='']
 
 def attach_indices(tensors,*indices):
     """
     Take a tensor T written as a linear combination (T = T1 - T2 + T3 ...) and attach an set of indices to each of them: T(mu1,b2,x3) = T1(mu1,b2,x3) - T2(mu1,b2,x3) + T3(mu1,b2,x3) ...
     TODO: This should work for LCs of the form Sum n_i*Tensor_i. However if the tensor is *not* the last object of each monomial, there will be trouble
     TODO: Find a way to perform checks
-    :param tensors: string representing a linear combination of tensors
+    :param tensors: string or qgraf_parser.models.common_tools.momenta.Momentum representing a linear combination of tensors
     :param indices: list of strings representing a set of indices to attach
     :return: A string representing the linear combination with the open indices specified
     """
-    if tensors!="0":
-        tensor_list = pparse(tensors)
+    if str(tensors)!="0":
         indices_between_parentheses = "({})".format(",".join(indices))
-        for t in tensor_list:
-            return tensors.replace(t, t + indices_between_parentheses)
+        return "".join(t + indices_between_parentheses for t in pparse(tensors))
     else:
-        return tensors
+        return str(tensors)
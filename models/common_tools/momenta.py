@@ -0,0 +1,253 @@
+"""Momenta as integer coefficient vectors over a basis of external and loop momenta
+
+QGRAF writes momenta as signed sums of momentum labels, e.g. `k1-p1`. A Momentum stores such a sum as a vector of
+integer coefficients over a MomentumBasis, which is the ordered list of the labels that can appear. Momenta are parsed
+in a single pass over their text and are only rendered back to text when needed, e.g. when they are formatted into a
+Feynman rule. The momenta of a whole diagram set can be parsed at once into a NumPy matrix with parse_momenta.
+"""
+import re
+import numpy as np
+import logging
+logger=logging.getLogger(__name__)
+
+# One signed term of a momentum: optional sign, optional integer coefficient, label
+momentum_term_pattern = re.compile(r"\s*([+-]?)\s*(?:(\d+)\s*\*\s*)?([A-Za-z_]\w*)\s*")
+default_loop_prefixes = ("k","l")
+
+
+def parse_momentum_terms(text):
+    """Parse the text of a momentum into its terms
+
+    Parameters
+    ----------
+    text : str
+        e.g. `k1-p1` or `-p1+p2-p3`. `0` and the empty string are the zero momentum.
+
+    Returns
+    -------
+    list of tuple:
+        (coefficient,label) for each term, in order of appearance
+    """
+    terms = []
+    position = 0
+    stripped = text.strip()
+    if stripped in ("","0"):
+        return terms
+    while position < len(text):
+        match = momentum_term_pattern.match(text,position)
+        if match is None or (terms and not match.group(1)):
+            error = ValueError("Invalid momentum: {}".format(text))
+            logger.error(error)
+            raise error
+        sign,coefficient,label = match.groups()
+        coefficient = int(coefficient) if coefficient else 1
+        terms.append((-coefficient if sign == "-" else coefficient,label))
+        position = match.end()
+    return terms
+
+
+def label_sort_key(label,loop_prefixes=default_loop_prefixes):
+    """Sort loop momenta first, then by name with numeric suffixes in numeric order (p2 before p10)"""
+    name,number = re.match(r"(.*?)(\d*)$",label).groups()
+    return (not label.startswith(loop_prefixes),name,int(number) if number else -1)
+
+
+class MomentumBasis(object):
+    """Ordered set of momentum labels
+
+    Attributes
+    ----------
+    labels : tuple of str
+    positions : dict of {str: int}
+        position of each label
+    """
+    __slots__ = ("labels","positions")
+
+    def __init__(self,labels):
+        self.labels = tuple(labels)
+        self.positions = {label: position for position,label in enumerate(self.labels)}
+        if len(self.positions) != len(self.labels):
+            error = ValueError("Repeated labels in the momentum basis {}".format(self.labels))
+            logger.error(error)
+            raise error
+
+    @classmethod
+    def from_labels(cls,labels,loop_prefixes=default_loop_prefixes):
+        """Create a basis from a collection of labels in the conventional order: loop momenta first, as QGRAF does
+
+        Parameters
+        ----------
+        labels : iterable of str
+        loop_prefixes : tuple of str, optional
+            prefixes of the labels of the loop momenta
+
+        Returns
+        -------
+        MomentumBasis
+        """
+        return cls(sorted(set(labels),key=lambda label: label_sort_key(label,loop_prefixes)))
+
+    @classmethod
+    def from_momenta(cls,texts,loop_prefixes=default_loop_prefixes):
+        """Create the basis of the labels used by a collection of momentum texts"""
+        return cls.from_labels((label for text in texts for coefficient,label in parse_momentum_terms(text)),
+                               loop_prefixes)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __eq__(self,other):
+        return isinstance(other,MomentumBasis) and self.labels == other.labels
+
+    def __hash__(self):
+        return hash(self.labels)
+
+    def __repr__(self):
+        return "MomentumBasis({})".format(", ".join(self.labels))
+
+
+class Momentum(object):
+    """Momentum stored as integer coefficients over a MomentumBasis
+
+    Momenta are immutable. They can be added, subtracted, negated and compared, and render to the text of a signed
+    sum of labels in the order of the basis, e.g. `k1-p1`.
+
+    Attributes
+    ----------
+    basis : MomentumBasis
+    coefficients : tuple of int
+    """
+    __slots__ = ("basis","coefficients")
+
+    def __init__(self,basis,coefficients):
+        self.basis = basis
+        self.coefficients = tuple(int(coefficient) for coefficient in coefficients)
+        if len(self.coefficients) != len(basis):
+            error = ValueError("{} coefficients given for a momentum basis of size {}".format(
+                len(self.coefficients),len(basis)))
+            logger.error(error)
+            raise error
+
+    @classmethod
+    def parse(cls,text,basis=None):
+        """Parse the text of a momentum
+
+        Parameters
+        ----------
+        text : str
+        basis : MomentumBasis, optional
+            Defaults to the basis of the labels of text
+
+        Returns
+        -------
+        Momentum
+        """
+        terms = parse_momentum_terms(text)
+        if basis is None:
+            basis = MomentumBasis.from_labels(label for coefficient,label in terms)
+        coefficients = [0]*len(basis)
+        for coefficient,label in terms:
+            try:
+                coefficients[basis.positions[label]] += coefficient
+            except KeyError:
+                error = ValueError("The momentum label {} of {} is not in {}".format(label,text,basis))
+                logger.error(error)
+                raise error
+        return cls(basis,coefficients)
+
+    def components(self):
+        """Signed terms of the momentum, e.g. ['k1','-p1'] for k1-p1, like algebra_tools.pparse"""
+        components = []
+        for label,coefficient in zip(self.basis.labels,self.coefficients):
+            if coefficient == 0:
+                continue
+            sign = "-" if coefficient < 0 else ("+" if components else "")
+            factor = "" if abs(coefficient) == 1 else "{}*".format(abs(coefficient))
+            components.append(sign+factor+label)
+        return components
+
+    def is_zero(self):
+        return not any(self.coefficients)
+
+    def check_basis(self,other):
+        if not isinstance(other,Momentum) or other.basis != self.basis:
+            error = ValueError("Momenta over different bases cannot be combined: {} and {}".format(self,other))
+            logger.error(error)
+            raise error
+
+    def __add__(self,other):
+        self.check_basis(other)
+        return Momentum(self.basis,(a+b for a,b in zip(self.coefficients,other.coefficients)))
+
+    def __sub__(self,other):
+        self.check_basis(other)
+        return Momentum(self.basis,(a-b for a,b in zip(self.coefficients,other.coefficients)))
+
+    def __neg__(self):
+        return Momentum(self.basis,(-a for a in self.coefficients))
+
+    def __eq__(self,other):
+        return isinstance(other,Momentum) and self.basis == other.basis and self.coefficients == other.coefficients
+
+    def __hash__(self):
+        return hash((self.basis,self.coefficients))
+
+    def __str__(self):
+        return "".join(self.components()) or "0"
+
+    def __repr__(self):
+        return "Momentum({})".format(self)
+
+
+def parse_momenta(texts,basis=None):
+    """Parse a collection of momentum texts into a coefficient matrix
+
+    Each distinct text is parsed once.
+
+    Parameters
+    ----------
+    texts : iterable of str
+    basis : MomentumBasis, optional
+        Defaults to the basis of all the labels of texts
+
+    Returns
+    -------
+    tuple:
+        (basis,matrix) where matrix is a numpy.ndarray of int of shape (len(texts),len(basis)) whose rows are the
+        coefficients of the momenta
+    """
+    texts = list(texts)
+    parsed = {text: parse_momentum_terms(text) for text in set(texts)}
+    if basis is None:
+        basis = MomentumBasis.from_labels(label for terms in parsed.values() for coefficient,label in terms)
+    rows = {}
+    for text,terms in parsed.items():
+        row = np.zeros(len(basis),dtype=np.int64)
+        for coefficient,label in terms:
+            try:
+                row[basis.positions[label]] += coefficient
+            except KeyError:
+                error = ValueError("The momentum label {} of {} is not in {}".format(label,text,basis))
+                logger.error(error)
+                raise error
+        rows[text] = row
+    matrix = np.array([rows[text] for text in texts],dtype=np.int64).reshape(len(texts),len(basis))
+    return basis,matrix
+
+
+def diagram_momenta(diagram,loop_prefixes=default_loop_prefixes):
+    """Parse the momenta of the fields of a diagram over the basis of the diagram
+
+    Parameters
+    ----------
+    diagram : qgraf_parser.diagram_elements.Diagram
+    loop_prefixes : tuple of str, optional
+
+    Returns
+    -------
+    dict of {str: Momentum}
+        the momentum of each field, keyed by field id
+    """
+    texts = {field_id: field.momentum for field_id,field in diagram.fields.items()}
+    basis = MomentumBasis.from_momenta(texts.values(),loop_prefixes)
+    return {field_id: Momentum.parse(text,basis) for field_id,text in texts.items()}
@@ -7,7 +7,7 @@ def standard_denominator(momentum,mass):
 
     Parameters
     ----------
-    momentum : str
+    momentum : str or .momenta.Momentum
     mass : .abstract_objects.Parameters
 
     Returns
@@ -21,14 +21,14 @@ def scalar_propagator(momentum,mass):
 
     Parameters
     ----------
-    momentum : str
+    momentum : str or .momenta.Momentum
     mass : .abstract_objects.Parameters
 
     Returns
     -------
-    str
+    .algebra_tools.Product
     """
-    return times(I,standard_denominator(momentum,mass))
+    return Product(I,standard_denominator(momentum,mass))
 
 def fermionic_propagator(from_field,to_field,momentum,mass):
     """Kinematic part of a standard fermionic propagator
@@ -37,15 +37,15 @@ def fermionic_propagator(from_field,to_field,momentum,mass):
     ----------
     from_field : str
     to_field : str
-    momentum : str
+    momentum : str or .momenta.Momentum
     mass : .abstract_objects.Parameters
 
     Returns
     -------
-    str
+    .algebra_tools.Product
     """
     spinhalf_numerator = "g({p},x{psi},x{psibar}) + {m}*g(x{psi},x{psibar})".format(p=momentum,psi=from_field,psibar=to_field,m=mass)
-    propagator = times(I,spinhalf_numerator,standard_denominator(momentum,mass))
+    propagator = Product(I,spinhalf_numerator,standard_denominator(momentum,mass))
     return propagator
 
 def quark_propagator(from_field,to_field,momentum,mass):
@@ -55,11 +55,11 @@ def quark_propagator(from_field,to_field,momentum,mass):
     ----------
     from_field : str
     to_field : str
-    momentum : str
+    momentum : str or .momenta.Momentum
     mass : .abstract_objects.Parameters
 
     Returns
     -------
-    str
+    .algebra_tools.Product
     """
-    return times(fermionic_propagator(from_field,to_field,momentum,mass),"d_(i{psi},i{psibar})".format(psi=from_field,psibar=to_field))
+    return Product(fermionic_propagator(from_field,to_field,momentum,mass),"d_(i{psi},i{psibar})".format(psi=from_field,psibar=to_field))
@@ -0,0 +1,137 @@
+"""Extraction of the subexpressions shared by the expressions of a diagram set
+
+The same Feynman rule factors, e.g. a propagator with a given momentum and mass, appear in many diagrams. Since
+expression nodes are hash-consed (see algebra_tools), each of them is one object, which is counted here over a whole
+set of expressions. The subexpressions that occur often enough are given names: the expressions are then written
+with these names, and the FORM code that defines the names is written once:
+
+    Symbols cse1,cse2;
+    ...
+    #procedure subexpressions
+    id cse1 = (i_)*(Den(k1,mt));
+    id cse2 = ...;
+    #endprocedure
+
+Calling the procedure after the expressions are defined substitutes the subexpressions back. Definitions are written
+before the subexpressions they contain, such that nested names are substituted by the following id statements.
+Top-level expressions, typically one per diagram, are always written in full.
+"""
+from .algebra_tools import Expression,as_expression,write_expression
+import logging
+logger=logging.getLogger(__name__)
+
+
+def count_subexpressions(expressions):
+    """Count the occurrences of the nodes of a set of expressions
+
+    A node is only explored the first time it is met: its later occurrences are counted, but not those of its
+    operands, since they would be replaced along with it.
+
+    Parameters
+    ----------
+    expressions : iterable of Expression or str
+
+    Returns
+    -------
+    dict of {Expression: int}
+        the occurrence count of each node, in order of first occurrence in a pre-order traversal
+    """
+    counts = {}
+    for expression in expressions:
+        if not isinstance(expression,Expression):
+            continue
+        stack = [expression]
+        while stack:
+            node = stack.pop()
+            if node in counts:
+                counts[node] += 1
+                continue
+            counts[node] = 1
+            stack.extend(reversed(node.children()))
+    return counts
+
+
+def node_height(node,heights):
+    """Height of a node in its expression tree, memoized in heights"""
+    if node not in heights:
+        heights[node] = 1+max((node_height(child,heights) for child in node.children()),default=0)
+    return heights[node]
+
+
+class SubexpressionTable(object):
+    """Names of the subexpressions repeated over a set of expressions
+
+    Attributes
+    ----------
+    names : dict of {Expression: str}
+        the name of each extracted subexpression, in order of first occurrence
+    prefix : str
+        prefix of the names
+    """
+    def __init__(self,expressions,min_count=2,min_length=16,prefix="cse"):
+        """Constructor for a SubexpressionTable
+
+        Parameters
+        ----------
+        expressions : iterable of Expression or str
+            the expressions of the diagram set. Only their operands and the nodes below are candidates.
+        min_count : int, optional
+            minimal number of occurrences of an extracted subexpression
+        min_length : int, optional
+            minimal length of the FORM text of an extracted subexpression, below which a name would not be shorter
+        prefix : str, optional
+        """
+        self.prefix = prefix
+        counts = count_subexpressions(operand for expression in expressions
+                                      for operand in as_expression(expression).children())
+        self.names = {}
+        for node,count in counts.items():
+            if count >= min_count and len(node.render()) >= min_length:
+                self.names[node] = "{}{}".format(prefix,len(self.names)+1)
+        logger.info("Extracted {} subexpressions from {} nodes".format(len(self.names),len(counts)))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self,expression):
+        return expression in self.names
+
+    def write(self,expression,write):
+        """Write an expression with the extracted subexpressions replaced by their names
+
+        Parameters
+        ----------
+        expression : Expression or str
+        write : callable
+        """
+        if isinstance(expression,Expression) and expression in self.names:
+            write(self.names[expression])
+        else:
+            write_expression(expression,write,self.names)
+
+    def render(self,expression):
+        """Render an expression with the extracted subexpressions replaced by their names"""
+        pieces = []
+        self.write(expression,pieces.append)
+        return "".join(pieces)
+
+    def write_declarations(self,write):
+        """Write the FORM declaration of the names"""
+        if self.names:
+            write("Symbols {};\n".format(",".join(self.names.values())))
+
+    def write_procedure(self,write,procedure_name="subexpressions"):
+        """Write the FORM procedure that substitutes the names by their definitions
+
+        Parameters
+        ----------
+        write : callable
+        procedure_name : str, optional
+        """
+        write("#procedure {}\n".format(procedure_name))
+        heights = {}
+        for node in sorted(self.names,key=lambda node: -node_height(node,heights)):
+            write("id {} = ".format(self.names[node]))
+            node.write(write,self.names)
+            write(";\n")
+        write("#endprocedure\n")
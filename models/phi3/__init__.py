@@ -4,4 +4,7 @@ from .particles import particles
 from .interactions import interactions
 from .propagators import propagators
 import logging
-logger = logging.getLogger(__name__)
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+# FORM declarations, see qgraf_parser.exporter.declarations
+form_functions = ("Den",)
@@ -14,13 +14,58 @@ At the moment there is however no actual protections or checks to ensure that th
 Vertex and Propagators are the elements that have a feynman rule attached to them, they are therefore generated with a
 model, which is then searched to attach the corresponding Interaction/Propagator object
 (qgraf_parser.models.common_tools.abstract_objects.Interaction or [...].Propagator)
+
+Diagram sets can contain millions of fields, so all these classes use __slots__ instead of an instance __dict__, and
+the strings that repeat across diagrams (particle names, field ids, momenta) are interned such that each distinct
+string is stored once.
+
+Each element can be read from different input formats through the `mode` option of their `parse` dispatcher:
+- 'XML': xml.etree.ElementTree.Element nodes of a QGRAF output written with any XML style
+- 'MMAP': raw bytes of the blocks of a QGRAF output written with the shipped generator/xml.sty style, typically sliced
+  from a memory-mapped file. They are read with precompiled byte patterns that rely on the fixed layout of xml.sty.
+  Any block that does not follow this layout is handed over to the XML parsers.
+- 'LINE': lines of a QGRAF output written with the shipped generator/line.sty style, which writes one diagram per line
+  as `id;signsym;legs;propagators;vertices`. Each element of the last three fields is terminated by '|' and its
+  components are separated by ':'
+    - leg: `field:field_id:momentum:status`
+    - propagator: `dual_field:dual_field_id:field:field_id:momentum`
+    - vertex: `types:field_ids:momenta` where each component is a comma-separated list
+- 'RECORD': the records returned by the parsers of the other modes, which are used as is. This is how LazyDiagram
+  objects create their elements after having parsed their input.
 """
-from qgraf_parser.models.common_tools.algebra_tools import times
+import re
+import importlib
+from sys import intern
+from xml.etree.ElementTree import XML
+from qgraf_parser.models.common_tools.algebra_tools import Product
+from qgraf_parser.parser.topology import canonical_form
 import logging
 logger=logging.getLogger(__name__)
 
+# Byte patterns for the 'MMAP' mode. They follow the order in which generator/xml.sty writes the tags.
+mmap_leg_pattern = re.compile(rb"<leg>\s*<field>([^<]*)</field>\s*<momentum>([^<]*)</momentum>\s*"
+                              rb"<status>[^<]*</status>\s*<id>([^<]*)</id>\s*</leg>")
+mmap_vertex_pattern = re.compile(rb"<vertex>\s*<type>([^<]*)</type>\s*<fields>([^<]*)</fields>\s*"
+                                 rb"<id>[^<]*</id>\s*<momenta>([^<]*)</momenta>\s*</vertex>")
+mmap_propagator_pattern = re.compile(rb"<propagator>\s*<mass>[^<]*</mass>\s*<momentum>([^<]*)</momentum>\s*"
+                                     rb"<field>([^<]*)</field>\s*<dual-field>([^<]*)</dual-field>\s*"
+                                     rb"<id>[^<]*</id>\s*<from>([^<]*)</from>\s*<to>([^<]*)</to>\s*</propagator>")
+mmap_diagram_pattern = re.compile(rb"<diagram>\s*<id>\s*([0-9]+)\s*</id>.*?<signsym>([^<]*)</signsym>\s*"
+                                  rb"<legs>(.*?)</legs>\s*<propagators>(.*?)</propagators>\s*"
+                                  rb"<vertices>(.*?)</vertices>\s*</diagram>",re.DOTALL)
+mmap_leg_block_pattern = re.compile(rb"<leg>.*?</leg>",re.DOTALL)
+mmap_vertex_block_pattern = re.compile(rb"<vertex>.*?</vertex>",re.DOTALL)
+mmap_propagator_block_pattern = re.compile(rb"<propagator>.*?</propagator>",re.DOTALL)
+
+
+def is_mmap_block(node):
+    """Check whether an object can be read by the byte patterns of the 'MMAP' mode"""
+    return isinstance(node,(bytes,bytearray))
+
 class DiagramField(object):
     """Specific field insertion in a Feynman diagram"""
+    __slots__ = ("name","id","momentum","particle")
+
     def __init__(self, name, field_id, momentum, model):
         """Constructor for a DiagramField object.
 
@@ -30,11 +75,12 @@ class DiagramField(object):
         field_id : int
         model : module
         """
-        self.name = name
-        self.id = str(abs(int(field_id)))
-        self.momentum = momentum
+        self.name = intern(name)
+        id = str(abs(int(field_id)))
         if int(field_id)<0:
-            self.id = "ext"+self.id
+            id = "ext"+id
+        self.id = intern(id)
+        self.momentum = intern(momentum)
         self.particle = model.particles[name]
 
     @staticmethod
@@ -57,6 +103,54 @@ class DiagramField(object):
         momentum=external_leg_node.find("momentum").text
         return (name, field_id, momentum)
 
+    @staticmethod
+    def parse_mmap_external_leg(external_leg_node):
+        """Low level parser to read the bytes of a <leg> block written with generator/xml.sty
+
+        This method is accessible through the class method `parse` through the option mode='MMAP'.
+        Anything else than a <leg> block with the xml.sty layout is handed over to the XML parser.
+
+        Parameters
+        ----------
+        external_leg_node :  bytes or xml.etree.ElementTree.Element
+
+        Returns
+        -------
+        tuple of str
+            A triplet of str: particle name, field id, momentum
+        """
+        if is_mmap_block(external_leg_node):
+            match = mmap_leg_pattern.fullmatch(external_leg_node)
+            if match is not None:
+                name, momentum, field_id = match.group(1,2,3)
+                return (name.decode(), field_id.decode(), momentum.decode())
+            external_leg_node = XML(external_leg_node)
+        return DiagramField.parse_xml_external_leg(external_leg_node)
+
+    @staticmethod
+    def parse_line_external_leg(external_leg_node):
+        """Low level parser to read a leg entry of a diagram line written with generator/line.sty
+
+        This method is accessible through the class method `parse` through the option mode='LINE'
+
+        Parameters
+        ----------
+        external_leg_node :  str
+            `field:field_id:momentum:status`
+
+        Returns
+        -------
+        tuple of str
+            A triplet of str: particle name, field id, momentum
+        """
+        try:
+            name, field_id, momentum, status = external_leg_node.split(":")
+        except ValueError:
+            logger.error("While using the LINE leg parser:")
+            logger.error("could not read the leg entry {}".format(external_leg_node))
+            raise
+        return (name, field_id, momentum)
+
     @classmethod
     def parse(cls,external_leg_node,mode='XML'):
         """Dispatcher function that sends a leg Node object to the approriate parser
@@ -66,7 +160,7 @@ class DiagramField(object):
         external_leg_node :
             Some object representing an external leg.
         mode : str
-            For now only XML supported
+            'XML', 'MMAP', 'LINE' or 'RECORD'
 
         Returns
         -------
@@ -75,6 +169,12 @@ class DiagramField(object):
         """
         if mode=='XML':
             return cls.parse_xml_external_leg(external_leg_node)
+        elif mode=='MMAP':
+            return cls.parse_mmap_external_leg(external_leg_node)
+        elif mode=='LINE':
+            return cls.parse_line_external_leg(external_leg_node)
+        elif mode=='RECORD':
+            return external_leg_node
         else:
             error = IOError("{} is not a valid input mode for DiagramField".format(mode))
             logger.error(error)
@@ -90,9 +190,9 @@ class DiagramField(object):
 
         Returns
         -------
-        None
+        DiagramField
         """
-        cls(*cls.parse(external_leg_node,mode),model)
+        return cls(*cls.parse(external_leg_node,mode),model)
 
 
     def matches_id(self,field_id):
@@ -132,6 +232,7 @@ class DiagramField(object):
 class DiagramVertex(object):
     """Specific vertex in a Feynman diagram
     """
+    __slots__ = ("fields","interaction")
 
     @staticmethod
     def parse_xml_vertex_node(vertex_node):
@@ -168,6 +269,56 @@ class DiagramVertex(object):
             raise
         return zip(types,fields,momenta)
 
+    @staticmethod
+    def parse_mmap_vertex_node(vertex_node):
+        """Load the relevant data of the bytes of a <vertex> block written with generator/xml.sty
+
+        This method is accessible through the class method `parse` through the option mode='MMAP'.
+        Anything else than a <vertex> block with the xml.sty layout is handed over to the XML parser.
+
+        Parameters
+        ----------
+        vertex_node : bytes or xml.etree.ElementTree.Element
+
+        Returns
+        -------
+        list of tuple of str:
+            triplets of (particle_type,field_id,momentum)
+        """
+        if is_mmap_block(vertex_node):
+            match = mmap_vertex_pattern.fullmatch(vertex_node)
+            if match is not None:
+                types,fields,momenta = (group.decode().split(",") for group in match.group(1,2,3))
+                if len(momenta) == len(fields) and len(momenta) == len(types):
+                    return zip(types,fields,momenta)
+            vertex_node = XML(vertex_node)
+        return DiagramVertex.parse_xml_vertex_node(vertex_node)
+
+    @staticmethod
+    def parse_line_vertex_node(vertex_node):
+        """Load the relevant data of a vertex entry of a diagram line written with generator/line.sty
+
+        This method is accessible through the class method `parse` through the option mode='LINE'
+
+        Parameters
+        ----------
+        vertex_node : str
+            `types:field_ids:momenta`
+
+        Returns
+        -------
+        list of tuple of str:
+            triplets of (particle_type,field_id,momentum)
+        """
+        try:
+            types,fields,momenta = (component.split(",") for component in vertex_node.split(":"))
+            assert len(momenta) == len(fields) and len(momenta) == len(types)
+        except (ValueError,AssertionError):
+            logger.error("While using the LINE vertex parser:")
+            logger.error("could not read the vertex entry {}".format(vertex_node))
+            raise
+        return zip(types,fields,momenta)
+
     # The class attribute `parsers` is a dictionnary of methods that can cast an object created by reading a file input
     # describing a vertex and outputs a list of triplets [type,field_id,momentum]
 
@@ -180,7 +331,7 @@ class DiagramVertex(object):
         vertex_node :
             Some object representing an vertex
         mode : str
-            For now only XML supported
+            'XML', 'MMAP', 'LINE' or 'RECORD'
 
         Returns
         -------
@@ -189,6 +340,12 @@ class DiagramVertex(object):
         """
         if mode=='XML':
             return cls.parse_xml_vertex_node(vertex_node)
+        elif mode=='MMAP':
+            return cls.parse_mmap_vertex_node(vertex_node)
+        elif mode=='LINE':
+            return cls.parse_line_vertex_node(vertex_node)
+        elif mode=='RECORD':
+            return vertex_node
         else:
             error = IOError("{} is not a valid input mode for DiagramVertex".format(mode))
             logger.error(error)
@@ -209,12 +366,13 @@ class DiagramVertex(object):
         TODO HANDLE EXCEPTIONS
         """
 
-        vertex_fields = self.parse(vertex_node,mode)
+        vertex_fields = [DiagramField(*field,model) for field in self.parse(vertex_node,mode)]
+        self.interaction,permutation = model.interactions.lookup_with_permutation(
+            [field.name for field in vertex_fields])
+        # The fields are stored in the order of the particles of the interaction, in which the feynman rule reads them
         self.fields = {}
-        for field in vertex_fields:
-            diagfield = DiagramField(*field,model)
-            self.fields.update({diagfield.id:diagfield})
-        self.interaction = model.interactions[[field.name for field in self.fields.values()]]
+        for position in permutation:
+            self.fields[vertex_fields[position].id] = vertex_fields[position]
 
     def generate_expression(self):
         """ Call the interaction feynman rule generation routines with
@@ -296,6 +454,8 @@ class DiagramVertex(object):
 class DiagramPropagator(object):
     """Specific propagator in a Feynman diagram
     """
+    __slots__ = ("from_field","to_field","momentum","propagator")
+
     @staticmethod
     def parse_xml_propagator_node(propagator_node):
         """Load the relevant data of a XML propagator Node.
@@ -321,6 +481,56 @@ class DiagramPropagator(object):
         momentum = propagator_node.find("momentum").text
         return (from_field,from_index,to_field,to_index,momentum)
 
+    @staticmethod
+    def parse_mmap_propagator_node(propagator_node):
+        """Load the relevant data of the bytes of a <propagator> block written with generator/xml.sty
+
+        This method is accessible through the class method `parse` through the option mode='MMAP'.
+        Anything else than a <propagator> block with the xml.sty layout is handed over to the XML parser.
+
+        Parameters
+        ----------
+        propagator_node : bytes or xml.etree.ElementTree.Element
+
+        Returns
+        -------
+        list of tuple of str:
+            (from_field,from_index,to_field,to_index,momentum)
+            where field refers to the field name and index refers to the field index in the diagram.
+        """
+        if is_mmap_block(propagator_node):
+            match = mmap_propagator_pattern.fullmatch(propagator_node)
+            if match is not None:
+                momentum,to_field,from_field,from_index,to_index = (group.decode() for group in match.group(1,2,3,4,5))
+                return (from_field,from_index,to_field,to_index,momentum)
+            propagator_node = XML(propagator_node)
+        return DiagramPropagator.parse_xml_propagator_node(propagator_node)
+
+    @staticmethod
+    def parse_line_propagator_node(propagator_node):
+        """Load the relevant data of a propagator entry of a diagram line written with generator/line.sty
+
+        This method is accessible through the class method `parse` through the option mode='LINE'
+
+        Parameters
+        ----------
+        propagator_node : str
+            `dual_field:dual_field_id:field:field_id:momentum`
+
+        Returns
+        -------
+        list of tuple of str:
+            (from_field,from_index,to_field,to_index,momentum)
+            where field refers to the field name and index refers to the field index in the diagram.
+        """
+        try:
+            from_field,from_index,to_field,to_index,momentum = propagator_node.split(":")
+        except ValueError:
+            logger.error("While using the LINE propagator parser:")
+            logger.error("could not read the propagator entry {}".format(propagator_node))
+            raise
+        return (from_field,from_index,to_field,to_index,momentum)
+
     @classmethod
     def parse(cls,propagator_node,mode):
         """Dispatcher function that sends a vertex Node object to the approriate parser
@@ -330,7 +540,7 @@ class DiagramPropagator(object):
         propagator_node :
             Some object representing an propagator
         mode : str
-            For now only XML supported
+            'XML', 'MMAP', 'LINE' or 'RECORD'
 
         Returns
         -------
@@ -340,6 +550,12 @@ class DiagramPropagator(object):
         """
         if mode=='XML':
             return cls.parse_xml_propagator_node(propagator_node)
+        elif mode=='MMAP':
+            return cls.parse_mmap_propagator_node(propagator_node)
+        elif mode=='LINE':
+            return cls.parse_line_propagator_node(propagator_node)
+        elif mode=='RECORD':
+            return propagator_node
         else:
             error = IOError("{} is not a valid input mode for DiagramPropagator".format(mode))
             logger.error(error)
@@ -363,7 +579,7 @@ class DiagramPropagator(object):
         (from_field, from_index, to_field, to_index,momentum) = self.parse(propagator_node,mode)
         self.from_field = fields[from_index]
         self.to_field = fields[to_index]
-        self.momentum = momentum
+        self.momentum = intern(momentum)
         self.propagator = model.propagators[[from_field,to_field]]
 
         ### SANITY CHECKS
@@ -400,11 +616,13 @@ class DiagramPropagator(object):
             logger.error(error)
             raise
 
-class Diagram(object):
-    """Specific diagram in a QGRAF output
+class AbstractDiagram(object):
+    """Behaviour shared by Diagram and LazyDiagram: parsing of the diagram nodes and operations on the elements
 
-    TODO DOC
+    The class has no slots of its own, such that each subclass only allocates the slots it uses. The subclasses provide
+    the attributes id, signsym, external_fields, vertices, fields, propagators and expression.
     """
+    __slots__ = ()
 
     @staticmethod
     def parse_xml_diagram_node(diagram_node):
@@ -418,16 +636,79 @@ class Diagram(object):
 
         Returns
         -------
-        list of tuple of str:
-            (from_field,from_index,to_field,to_index,momentum)
-            where field refers to the field name and index refers to the field index in the diagram.
+        tuple:
+            (id,signsym,legs,vertices,propagators)
+            where id and signsym are str and the others are lists of nodes for the diagram elements
         """
         #TODO Handle exceptions
         id = diagram_node.find("id").text
+        signsym_node = diagram_node.find("signsym")
+        signsym = None if signsym_node is None else signsym_node.text
         vertices = diagram_node.find("vertices").findall("vertex")
         propagators = diagram_node.find("propagators").findall("propagator")
         legs = diagram_node.find("legs").findall("leg")
-        return (id,legs,vertices,propagators)
+        return (id,signsym,legs,vertices,propagators)
+
+    @staticmethod
+    def parse_mmap_diagram_node(diagram_node):
+        """Load the relevant data of the bytes of a <diagram> block written with generator/xml.sty
+
+        This method is accessible through the class method `parse` through the option mode='MMAP'.
+        The diagram elements are returned as raw bytes blocks that are read with the 'MMAP' parsers of each element.
+        Anything else than a <diagram> block with the xml.sty layout is handed over to the XML parser, in which case
+        the elements are returned as xml.etree.ElementTree.Element, which the 'MMAP' parsers also accept.
+
+        Parameters
+        ----------
+        diagram_node : bytes or xml.etree.ElementTree.Element
+
+        Returns
+        -------
+        tuple:
+            (id,signsym,legs,vertices,propagators)
+            where id and signsym are str and the others are lists of nodes for the diagram elements
+        """
+        if is_mmap_block(diagram_node):
+            match = mmap_diagram_pattern.fullmatch(diagram_node.strip())
+            if match is not None:
+                id,signsym,legs,propagators,vertices = match.group(1,2,3,4,5)
+                return (id.decode(),
+                        signsym.decode(),
+                        mmap_leg_block_pattern.findall(legs),
+                        mmap_vertex_block_pattern.findall(vertices),
+                        mmap_propagator_block_pattern.findall(propagators))
+            logger.debug("Diagram block does not follow the xml.sty layout, using the XML parser")
+            diagram_node = XML(diagram_node)
+        return AbstractDiagram.parse_xml_diagram_node(diagram_node)
+
+    @staticmethod
+    def parse_line_diagram_node(diagram_node):
+        """Load the relevant data of a diagram line written with generator/line.sty
+
+        This method is accessible through the class method `parse` through the option mode='LINE'
+
+        Parameters
+        ----------
+        diagram_node : str
+            `id;signsym;legs;propagators;vertices`
+
+        Returns
+        -------
+        tuple:
+            (id,signsym,legs,vertices,propagators)
+            where id and signsym are str and the others are lists of str entries for the diagram elements
+        """
+        try:
+            id,signsym,legs,propagators,vertices = diagram_node.strip().split(";")
+        except ValueError:
+            logger.error("While using the LINE diagram parser:")
+            logger.error("could not read the diagram line {}".format(diagram_node))
+            raise
+        return (id,
+                signsym,
+                [leg for leg in legs.split("|") if leg],
+                [vertex for vertex in vertices.split("|") if vertex],
+                [propagator for propagator in propagators.split("|") if propagator])
 
     @classmethod
     def parse(cls,diagram_node,mode):
@@ -438,21 +719,55 @@ class Diagram(object):
         diagram_node :
             Some object representing a diagram
         mode : str
-            For now only XML supported
+            'XML', 'MMAP', 'LINE' or 'RECORD'
 
         Returns
         -------
-        list of tuple of str:
-            (from_field,from_index,to_field,to_index,momentum)
-            where field refers to the field name and index refers to the field index in the diagram.
+        tuple:
+            (id,signsym,legs,vertices,propagators)
+            where id and signsym are str and the others are lists of nodes for the diagram elements
         """
         if mode=='XML':
             return cls.parse_xml_diagram_node(diagram_node)
+        elif mode=='MMAP':
+            return cls.parse_mmap_diagram_node(diagram_node)
+        elif mode=='LINE':
+            return cls.parse_line_diagram_node(diagram_node)
+        elif mode=='RECORD':
+            return diagram_node
         else:
             error = IOError("{} is not a valid input mode for Diagram".format(mode))
             logger.error(error)
             raise error
 
+    def generate_expression(self):
+        """Gather all the Feynman rules for the diagram elements and multiply them together
+
+        Returns
+        -------
+        qgraf_parser.models.common_tools.algebra_tools.Product
+            the product of the Feynman rules, which are strings or Expression nodes. str() renders it to FORM text.
+        """
+        vertices = [v.generate_expression() for v in self.vertices]
+        propagators = [p.generate_expression() for p in self.propagators]
+        return Product(*(vertices+propagators))
+
+    def canonical_form(self):
+        """Canonical form of the graph of the diagram, see qgraf_parser.parser.topology"""
+        return canonical_form(self)
+
+    def topology_hash(self):
+        """Hash of the canonical form of the graph of the diagram, equal for isomorphic diagrams"""
+        return canonical_form(self).hash
+
+
+class Diagram(AbstractDiagram):
+    """Specific diagram in a QGRAF output
+
+    TODO DOC
+    """
+    __slots__ = ("id","signsym","external_fields","vertices","fields","propagators","expression")
+
     def __init__(self,diagram_node,model,mode="XML"):
         """Constructor for a Diagram object.
 
@@ -467,8 +782,9 @@ class Diagram(object):
             xml.etree.[].XML
         TODO HANDLE EXCEPTIONS
         """
-        id,legs,vertices,propagators = self.parse(diagram_node,mode)
+        id,signsym,legs,vertices,propagators = self.parse(diagram_node,mode)
         self.id=id
+        self.signsym=signsym
         self.external_fields = [DiagramField.create_leg_from_node(leg,model,mode) for leg in legs]
         self.vertices = [DiagramVertex(vertex,model,mode) for vertex in vertices]
         self.fields = {}
@@ -477,8 +793,94 @@ class Diagram(object):
         self.propagators = [DiagramPropagator(propagator, self.fields, model, mode) for propagator in propagators]
         self.expression = NotImplemented
 
-    def generate_expression(self):
-        """Gather all the Feynman rules for the diagram elements and multiply them together"""
-        vertices = [v.generate_expression() for v in self.vertices]
-        propagators = [p.generate_expression() for p in self.propagators]
-        return times(*(vertices+propagators))
\ No newline at end of file
+
+class LazyDiagram(AbstractDiagram):
+    """Diagram whose elements are only created when they are first accessed
+
+    The id, the signsym and the external legs are available right away, while the DiagramField, DiagramVertex and
+    DiagramPropagator objects are created the first time that `external_fields`, `vertices`, `fields` or `propagators`
+    is accessed, and then kept. This makes passes that only filter diagrams on their id, signsym or external legs
+    much cheaper.
+
+    Input nodes that are immutable (bytes or str, i.e. for the 'MMAP' and 'LINE' modes) are kept as is and only parsed
+    on demand. XML nodes can be discarded by the importer after the diagram is created, so their elements are parsed
+    right away into records and later created with the 'RECORD' mode.
+
+    The model is pickled by name, such that lazy diagrams can be sent to worker processes or stored in a DiagramCache
+    as long as their model is importable.
+    """
+    # The attributes created on demand are stored in underscored slots behind the properties below
+    __slots__ = ("id","signsym","expression","model","mode","leg_nodes","vertex_nodes","propagator_nodes",
+                 "_external_legs","_external_fields","_vertices","_fields","_propagators")
+    def __init__(self,diagram_node,model,mode="XML"):
+        """Constructor for a LazyDiagram object.
+
+        Parameters
+        ----------
+        Same as Diagram
+        """
+        id,signsym,legs,vertices,propagators = self.parse(diagram_node,mode)
+        self.id=id
+        self.signsym=signsym
+        if mode == 'XML':
+            legs = [DiagramField.parse(leg,mode) for leg in legs]
+            vertices = [list(DiagramVertex.parse(vertex,mode)) for vertex in vertices]
+            propagators = [DiagramPropagator.parse(propagator,mode) for propagator in propagators]
+            mode = 'RECORD'
+        self.model = model
+        self.mode = mode
+        self.leg_nodes = legs
+        self.vertex_nodes = vertices
+        self.propagator_nodes = propagators
+        self.expression = NotImplemented
+        self._external_legs = None
+        self._external_fields = None
+        self._vertices = None
+        self._fields = None
+        self._propagators = None
+
+    def __getstate__(self):
+        # Models are modules, which are sent to worker processes by name
+        state = {name: getattr(self,name) for name in self.__slots__}
+        state["model"] = self.model.__name__
+        return state
+
+    def __setstate__(self,state):
+        for name,value in state.items():
+            setattr(self,name,value)
+        self.model = importlib.import_module(self.model)
+
+    @property
+    def external_legs(self):
+        """list of tuple of str: (particle name, field id, momentum) for each external leg"""
+        if self._external_legs is None:
+            self._external_legs = [DiagramField.parse(leg,self.mode) for leg in self.leg_nodes]
+        return self._external_legs
+
+    @property
+    def external_fields(self):
+        if self._external_fields is None:
+            self._external_fields = [DiagramField(*leg,self.model) for leg in self.external_legs]
+        return self._external_fields
+
+    @property
+    def vertices(self):
+        if self._vertices is None:
+            self._vertices = [DiagramVertex(vertex,self.model,self.mode) for vertex in self.vertex_nodes]
+        return self._vertices
+
+    @property
+    def fields(self):
+        if self._fields is None:
+            fields = {}
+            for vertex in self.vertices:
+                fields.update(vertex.fields)
+            self._fields = fields
+        return self._fields
+
+    @property
+    def propagators(self):
+        if self._propagators is None:
+            self._propagators = [DiagramPropagator(propagator,self.fields,self.model,self.mode)
+                                 for propagator in self.propagator_nodes]
+        return self._propagators
@@ -0,0 +1,393 @@
+"""Array-backed representation of the topology of a whole set of diagrams
+
+Diagram objects are nested python objects, such that any question about the topology of a large diagram set (loop
+counts, vertex valences, particle content...) requires a python loop over all of them. A DiagramSet stores the
+connectivity of all its diagrams in flat NumPy arrays, in compressed sparse row (CSR) form:
+
+- the vertices of diagram d are vertex_offsets[d]:vertex_offsets[d+1]
+- the fields attached to vertex v are field_offsets[v]:field_offsets[v+1]
+- the propagators of diagram d are propagator_offsets[d]:propagator_offsets[d+1]
+- propagator p goes from vertex propagator_endpoints[p,0] to vertex propagator_endpoints[p,1] (global vertex indices)
+
+Particles, interactions, propagator types and momenta are stored as integer codes, whose meaning is given by the lists
+`particle_names`, `interaction_names`, `propagator_names` and `momenta`. Queries over the whole set are then
+vectorized array operations.
+"""
+import numpy as np
+from qgraf_parser.models.common_tools.momenta import parse_momenta
+import logging
+logger=logging.getLogger(__name__)
+
+
+class DiagramView(object):
+    """Thin view of one diagram of a DiagramSet
+
+    The view holds no data of its own: its attributes are slices of the arrays of the DiagramSet.
+    """
+    __slots__ = ("diagram_set","index")
+
+    def __init__(self,diagram_set,index):
+        self.diagram_set = diagram_set
+        self.index = index
+
+    @property
+    def id(self):
+        return int(self.diagram_set.ids[self.index])
+
+    @property
+    def vertex_slice(self):
+        offsets = self.diagram_set.vertex_offsets
+        return slice(offsets[self.index],offsets[self.index+1])
+
+    @property
+    def propagator_slice(self):
+        offsets = self.diagram_set.propagator_offsets
+        return slice(offsets[self.index],offsets[self.index+1])
+
+    @property
+    def n_vertices(self):
+        return self.vertex_slice.stop-self.vertex_slice.start
+
+    @property
+    def n_propagators(self):
+        return self.propagator_slice.stop-self.propagator_slice.start
+
+    @property
+    def n_loops(self):
+        return self.n_propagators-self.n_vertices+1
+
+    @property
+    def vertex_valences(self):
+        """array of int: number of fields attached to each vertex"""
+        return self.diagram_set.vertex_valences()[self.vertex_slice]
+
+    @property
+    def propagator_endpoints(self):
+        """array of int of shape (n_propagators,2): (from,to) vertex indices, local to the diagram"""
+        return self.diagram_set.propagator_endpoints[self.propagator_slice]-self.vertex_slice.start
+
+    @property
+    def propagator_particles(self):
+        """list of str: particle names of the propagators (field end)"""
+        names = self.diagram_set.particle_names
+        return [names[code] for code in self.diagram_set.propagator_particle[self.propagator_slice]]
+
+    @property
+    def diagram(self):
+        """The full qgraf_parser.diagram_elements.Diagram object, if the DiagramSet keeps them"""
+        if self.diagram_set.diagrams is None:
+            error = AttributeError("This DiagramSet was built without keeping the Diagram objects")
+            logger.error(error)
+            raise error
+        return self.diagram_set.diagrams[self.index]
+
+    def __repr__(self):
+        return "DiagramView({})".format(self.id)
+
+
+class DiagramSet(object):
+    """Set of diagrams whose topology is stored in flat arrays
+
+    Attributes
+    ----------
+    model : module
+    diagrams : list of qgraf_parser.diagram_elements.Diagram or None
+        the diagram objects, if kept
+    particle_names, interaction_names, propagator_names, momenta : list of str
+        meaning of the integer codes of the arrays
+    ids : numpy.ndarray
+        diagram ids
+    vertex_offsets, field_offsets, propagator_offsets : numpy.ndarray
+        CSR offsets, see the module documentation
+    vertex_interaction : numpy.ndarray
+        interaction code of each vertex
+    field_particle, field_momentum : numpy.ndarray
+        particle and momentum codes of each field, in vertex order
+    field_external : numpy.ndarray
+        whether each field is an external leg
+    propagator_endpoints : numpy.ndarray
+        (from,to) global vertex indices of each propagator
+    propagator_type, propagator_particle, propagator_momentum : numpy.ndarray
+        propagator type, particle (field end) and momentum codes of each propagator
+    """
+    def __init__(self,diagrams,model,keep_diagrams=True):
+        """Constructor for a DiagramSet
+
+        Parameters
+        ----------
+        diagrams : iterable of qgraf_parser.diagram_elements.Diagram
+        model : module
+            the module defining the model properties
+        keep_diagrams : bool, optional
+            keep the Diagram objects, accessible from the views. Defaults to True.
+        """
+        self.model = model
+        self.particle_names = list(model.particles.keys())
+        self.interaction_names = list(model.interactions.keys())
+        self.propagator_names = list(model.propagators.keys())
+        self.momenta = []
+        particle_codes = {name: code for code,name in enumerate(self.particle_names)}
+        interaction_codes = {name: code for code,name in enumerate(self.interaction_names)}
+        propagator_codes = {name: code for code,name in enumerate(self.propagator_names)}
+        momentum_codes = {}
+
+        def momentum_code(momentum):
+            if momentum not in momentum_codes:
+                momentum_codes[momentum] = len(self.momenta)
+                self.momenta.append(momentum)
+            return momentum_codes[momentum]
+
+        kept = [] if keep_diagrams else None
+        ids = []
+        vertex_offsets = [0]
+        field_offsets = [0]
+        propagator_offsets = [0]
+        vertex_interaction = []
+        field_particle = []
+        field_momentum = []
+        field_external = []
+        propagator_endpoints = []
+        propagator_type = []
+        propagator_particle = []
+        propagator_momentum = []
+        for diagram in diagrams:
+            if kept is not None:
+                kept.append(diagram)
+            ids.append(int(diagram.id))
+            vertex_of_field = {}
+            first_vertex = len(vertex_interaction)
+            for vertex_index,vertex in enumerate(diagram.vertices,first_vertex):
+                vertex_interaction.append(interaction_codes[vertex.interaction.name])
+                for field in vertex.fields.values():
+                    vertex_of_field[field.id] = vertex_index
+                    field_particle.append(particle_codes[field.name])
+                    field_momentum.append(momentum_code(field.momentum))
+                    field_external.append(field.id.startswith("ext"))
+                field_offsets.append(len(field_particle))
+            vertex_offsets.append(len(vertex_interaction))
+            for propagator in diagram.propagators:
+                propagator_endpoints.append((vertex_of_field[propagator.from_field.id],
+                                             vertex_of_field[propagator.to_field.id]))
+                propagator_type.append(propagator_codes[propagator.propagator.name])
+                propagator_particle.append(particle_codes[propagator.to_field.name])
+                propagator_momentum.append(momentum_code(propagator.momentum))
+            propagator_offsets.append(len(propagator_type))
+
+        self.diagrams = kept
+        self.ids = np.array(ids,dtype=np.int64)
+        self.vertex_offsets = np.array(vertex_offsets,dtype=np.int64)
+        self.field_offsets = np.array(field_offsets,dtype=np.int64)
+        self.propagator_offsets = np.array(propagator_offsets,dtype=np.int64)
+        self.vertex_interaction = np.array(vertex_interaction,dtype=np.int32)
+        self.field_particle = np.array(field_particle,dtype=np.int32)
+        self.field_momentum = np.array(field_momentum,dtype=np.int32)
+        self.field_external = np.array(field_external,dtype=bool)
+        self.propagator_endpoints = np.array(propagator_endpoints,dtype=np.int64).reshape(-1,2)
+        self.propagator_type = np.array(propagator_type,dtype=np.int32)
+        self.propagator_particle = np.array(propagator_particle,dtype=np.int32)
+        self.propagator_momentum = np.array(propagator_momentum,dtype=np.int32)
+        self._vertex_valences = None
+
+    @classmethod
+    def from_file(cls,file_path,model,mode='XML',keep_diagrams=False):
+        """Build a DiagramSet by streaming the diagrams of a QGRAF output
+
+        Parameters
+        ----------
+        file_path : str
+            string path to the QGRAF output
+        model : module
+            the module defining the model properties
+        mode : str
+            'XML', 'MMAP' or 'LINE'
+        keep_diagrams : bool, optional
+            keep the Diagram objects. Defaults to False, such that only the arrays are held in memory.
+
+        Returns
+        -------
+        DiagramSet
+        """
+        from qgraf_parser.importer import iter_diagrams
+        return cls(iter_diagrams(file_path,model,mode),model,keep_diagrams)
+
+    @classmethod
+    def concatenate(cls,diagram_sets,model):
+        """Build the DiagramSet of the diagrams of several DiagramSets, in order
+
+        The sets must have been built with the same model, such that their particle, interaction and propagator codes
+        agree. Their momentum codes are mapped to those of the concatenated set. The Diagram objects are not kept.
+
+        Parameters
+        ----------
+        diagram_sets : iterable of DiagramSet
+        model : module
+            the module defining the model properties
+
+        Returns
+        -------
+        DiagramSet
+        """
+        diagram_set = cls([],model,keep_diagrams=False)
+        momentum_codes = {}
+        arrays = {name: [getattr(diagram_set,name)] for name in ('ids','vertex_interaction','field_particle',
+                                                                'field_momentum','field_external','propagator_endpoints',
+                                                                'propagator_type','propagator_particle',
+                                                                'propagator_momentum')}
+        offsets = {name: [getattr(diagram_set,name)] for name in ('vertex_offsets','field_offsets','propagator_offsets')}
+        n_vertices = n_fields = n_propagators = 0
+        for other in diagram_sets:
+            if (other.particle_names,other.interaction_names,other.propagator_names) != \
+                    (diagram_set.particle_names,diagram_set.interaction_names,diagram_set.propagator_names):
+                error = ValueError("Only DiagramSets of the same model can be concatenated")
+                logger.error(error)
+                raise error
+            for momentum in other.momenta:
+                momentum_codes.setdefault(momentum,len(momentum_codes))
+            momentum_map = np.array([momentum_codes[momentum] for momentum in other.momenta],dtype=np.int32)
+            for name in arrays:
+                arrays[name].append(getattr(other,name))
+            arrays['field_momentum'][-1] = momentum_map[other.field_momentum]
+            arrays['propagator_momentum'][-1] = momentum_map[other.propagator_momentum]
+            arrays['propagator_endpoints'][-1] = other.propagator_endpoints+n_vertices
+            offsets['vertex_offsets'].append(other.vertex_offsets[1:]+n_vertices)
+            offsets['field_offsets'].append(other.field_offsets[1:]+n_fields)
+            offsets['propagator_offsets'].append(other.propagator_offsets[1:]+n_propagators)
+            n_vertices += int(other.vertex_offsets[-1])
+            n_fields += int(other.field_offsets[-1])
+            n_propagators += int(other.propagator_offsets[-1])
+        for name,parts in {**arrays,**offsets}.items():
+            setattr(diagram_set,name,np.concatenate(parts))
+        diagram_set.momenta = list(momentum_codes)
+        diagram_set._vertex_valences = None
+        return diagram_set
+
+    ##########################
+    # Container interface
+    ##########################
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self,index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            error = IndexError("DiagramSet index out of range: {}".format(index))
+            logger.error(error)
+            raise error
+        return DiagramView(self,index)
+
+    def __iter__(self):
+        return (DiagramView(self,index) for index in range(len(self)))
+
+    ##########################
+    # Vectorized queries
+    ##########################
+
+    def n_vertices(self):
+        """array of int: number of vertices of each diagram"""
+        return np.diff(self.vertex_offsets)
+
+    def n_propagators(self):
+        """array of int: number of internal propagators of each diagram"""
+        return np.diff(self.propagator_offsets)
+
+    def loop_counts(self):
+        """array of int: number of loops of each diagram, assuming connected diagrams"""
+        return self.n_propagators()-self.n_vertices()+1
+
+    def vertex_valences(self):
+        """array of int: number of fields attached to each vertex of the set, computed once and then kept"""
+        if self._vertex_valences is None:
+            self._vertex_valences = np.diff(self.field_offsets)
+        return self._vertex_valences
+
+    def diagram_of_vertex(self):
+        """array of int: index of the diagram of each vertex of the set"""
+        return np.repeat(np.arange(len(self)),self.n_vertices())
+
+    def diagram_of_propagator(self):
+        """array of int: index of the diagram of each propagator of the set"""
+        return np.repeat(np.arange(len(self)),self.n_propagators())
+
+    def per_diagram_counts(self,diagram_index,codes,n_codes):
+        """Count the occurrences of each code in each diagram
+
+        Parameters
+        ----------
+        diagram_index : numpy.ndarray
+            diagram index of each element
+        codes : numpy.ndarray
+            code of each element
+        n_codes : int
+
+        Returns
+        -------
+        numpy.ndarray
+            array of shape (number of diagrams, n_codes)
+        """
+        counts = np.bincount(diagram_index*n_codes+codes,minlength=len(self)*n_codes)
+        return counts.reshape(len(self),n_codes)
+
+    def valence_histograms(self):
+        """Number of vertices of each valence in each diagram
+
+        Returns
+        -------
+        numpy.ndarray
+            array of shape (number of diagrams, maximal valence+1)
+        """
+        valences = self.vertex_valences()
+        n_valences = int(valences.max())+1 if len(valences) else 1
+        return self.per_diagram_counts(self.diagram_of_vertex(),valences,n_valences)
+
+    def particle_content(self):
+        """Number of internal propagators of each particle type in each diagram
+
+        Returns
+        -------
+        numpy.ndarray
+            array of shape (number of diagrams, number of particles), columns ordered as particle_names
+        """
+        return self.per_diagram_counts(self.diagram_of_propagator(),self.propagator_particle,len(self.particle_names))
+
+    def interaction_content(self):
+        """Number of vertices of each interaction type in each diagram
+
+        Returns
+        -------
+        numpy.ndarray
+            array of shape (number of diagrams, number of interactions), columns ordered as interaction_names
+        """
+        return self.per_diagram_counts(self.diagram_of_vertex(),self.vertex_interaction,len(self.interaction_names))
+
+    def momentum_matrix(self,basis=None):
+        """Coefficients of the momenta over a basis of external and loop momenta
+
+        Parameters
+        ----------
+        basis : qgraf_parser.models.common_tools.momenta.MomentumBasis, optional
+            Defaults to the basis of all the momentum labels of the set
+
+        Returns
+        -------
+        tuple:
+            (basis,matrix) where the row matrix[code] holds the coefficients of momenta[code], such that
+            matrix[self.field_momentum] and matrix[self.propagator_momentum] are the momenta of the fields and
+            propagators
+        """
+        return parse_momenta(self.momenta,basis)
+
+    def select(self,mask):
+        """Views of the diagrams selected by a boolean mask or an array of indices
+
+        Parameters
+        ----------
+        mask : numpy.ndarray
+
+        Returns
+        -------
+        list of DiagramView
+        """
+        indices = np.flatnonzero(mask) if np.asarray(mask).dtype == bool else np.asarray(mask)
+        return [DiagramView(self,int(index)) for index in indices]
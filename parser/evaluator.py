@@ -0,0 +1,201 @@
+"""Vectorized numerical evaluation of the scalar part of diagrams
+
+A DiagramEvaluator is compiled once from a DiagramSet: the momenta of all the propagators of the set are stored as a
+coefficient matrix over the momentum basis of the set, along with their squared masses and the product of the vertex
+couplings of each diagram. Propagators with the same momentum and mass, which are frequent over a diagram set, are
+only evaluated once, and so are the products of diagrams with the same propagators. Diagrams are grouped by number of
+propagators, such that the products are taken over a fixed-size axis.
+
+For a batch of N phase-space points, the evaluator returns for each point and each diagram
+
+    prod_vertices(coupling) * prod_propagators(Den(p,m)),   Den(p,m) = 1/(p.p - m^2)
+
+with the Minkowski metric (+,-,-,-), in a few array operations. Numerical values of masses and couplings are taken from
+the `value` of the corresponding Parameter objects of the model, and can be overridden by name. Couplings of
+interactions without a coupling Parameter are set to 1, and complex prefactors of the Feynman rules are not included.
+"""
+import numpy as np
+from qgraf_parser.models.common_tools.momenta import default_loop_prefixes
+import logging
+logger=logging.getLogger(__name__)
+
+
+def segment_products(values,offsets):
+    """Product of the consecutive segments of the last axis of an array
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        array of shape (..., n)
+    offsets : numpy.ndarray
+        CSR offsets of the segments, of length n_segments+1 with offsets[-1] == n
+
+    Returns
+    -------
+    numpy.ndarray
+        array of shape (..., n_segments). Empty segments have product 1.
+    """
+    # A trailing 1 makes the start of empty segments at the end valid indices for reduceat
+    padded = np.concatenate([values,np.ones(values.shape[:-1]+(1,),dtype=values.dtype)],axis=-1)
+    products = np.multiply.reduceat(padded,offsets[:-1],axis=-1)
+    products[...,offsets[:-1] == offsets[1:]] = 1
+    return products
+
+
+class DiagramEvaluator(object):
+    """Evaluator of the couplings and scalar denominators of the diagrams of a DiagramSet
+
+    Attributes
+    ----------
+    diagram_set : qgraf_parser.parser.diagram_set.DiagramSet
+    basis : qgraf_parser.models.common_tools.momenta.MomentumBasis
+        momentum basis of the set
+    loop_labels, external_labels : list of str
+        the loop and external momentum labels, in the order expected by DiagramEvaluator#evaluate
+    momentum_coefficients : numpy.ndarray
+        coefficients of the distinct propagator momenta over the basis, of shape (n_distinct,len(basis))
+    mass_squares : numpy.ndarray
+        squared mass of the distinct propagators
+    propagator_index : numpy.ndarray
+        index of the distinct propagator of each propagator of the set
+    couplings : numpy.ndarray
+        product of the vertex couplings of each diagram
+    diagram_groups : list of tuple
+        (diagrams,products,inverse) for each number of propagators, where diagrams holds the indices of the diagrams
+        with this number of propagators, products the distinct sorted rows of their propagator indices and inverse the
+        row of each diagram
+    """
+    def __init__(self,diagram_set,values=None,loop_prefixes=default_loop_prefixes):
+        """Constructor for a DiagramEvaluator
+
+        Parameters
+        ----------
+        diagram_set : qgraf_parser.parser.diagram_set.DiagramSet
+        values : dict of {str: number}, optional
+            numerical values of parameters, by name, which take precedence over the values of the model
+        loop_prefixes : tuple of str, optional
+            prefixes of the labels of the loop momenta
+        """
+        self.diagram_set = diagram_set
+        self.values = dict(values or {})
+        model = diagram_set.model
+        self.basis,matrix = diagram_set.momentum_matrix()
+        self.loop_labels = [label for label in self.basis.labels if label.startswith(loop_prefixes)]
+        self.external_labels = [label for label in self.basis.labels if not label.startswith(loop_prefixes)]
+        self.loop_columns = np.array([self.basis.positions[label] for label in self.loop_labels],dtype=np.int64)
+        self.external_columns = np.array([self.basis.positions[label] for label in self.external_labels],
+                                         dtype=np.int64)
+
+        particle_masses = np.array([self.parameter_value(model.particles[name].mass)
+                                    for name in diagram_set.particle_names])
+        propagators = np.column_stack([matrix[diagram_set.propagator_momentum],
+                                       particle_masses[diagram_set.propagator_particle]**2]).reshape(-1,len(self.basis)+1)
+        distinct,self.propagator_index = np.unique(propagators,axis=0,return_inverse=True)
+        self.propagator_index = self.propagator_index.reshape(-1)
+        self.momentum_coefficients = distinct[:,:-1]
+        self.mass_squares = distinct[:,-1]
+
+        self.diagram_groups = []
+        n_propagators = diagram_set.n_propagators()
+        for size in np.unique(n_propagators):
+            diagrams = np.flatnonzero(n_propagators == size)
+            starts = diagram_set.propagator_offsets[diagrams]
+            rows = np.sort(self.propagator_index[starts[:,None]+np.arange(size)],axis=1)
+            products,inverse = np.unique(rows,axis=0,return_inverse=True)
+            self.diagram_groups.append((diagrams,products,inverse.reshape(-1)))
+
+        interaction_couplings = np.array([self.parameter_value(model.interactions[name].coupling,default=1)
+                                          for name in diagram_set.interaction_names])
+        self.couplings = segment_products(interaction_couplings[diagram_set.vertex_interaction],
+                                          diagram_set.vertex_offsets)
+        logger.info("Compiled an evaluator for {} diagrams with {} distinct propagators out of {}".format(
+            len(diagram_set),len(distinct),len(diagram_set.propagator_type)))
+
+    def parameter_value(self,parameter,default=None):
+        """Numerical value of a Parameter, from the overriding values or from the model"""
+        if parameter is None:
+            return default
+        if parameter.name in self.values:
+            return self.values[parameter.name]
+        if parameter.value is None:
+            error = ValueError("The parameter {} has no numerical value".format(parameter.name))
+            logger.error(error)
+            raise error
+        return parameter.value
+
+    def propagator_momenta(self,external_momenta,loop_momenta):
+        """Numerical momenta of the distinct propagators
+
+        Parameters
+        ----------
+        external_momenta : numpy.ndarray
+            array of shape (N,len(external_labels),4)
+        loop_momenta : numpy.ndarray
+            array of shape (len(loop_labels),4), common to all the points, or (N,len(loop_labels),4)
+
+        Returns
+        -------
+        numpy.ndarray
+            array of shape (N,n_distinct,4)
+        """
+        external_momenta = np.asarray(external_momenta)
+        loop_momenta = np.asarray(loop_momenta)
+        if external_momenta.shape[1:] != (len(self.external_labels),4):
+            error = ValueError("External momenta of shape (N,{},4) are expected for the labels {}, got {}".format(
+                len(self.external_labels),self.external_labels,external_momenta.shape))
+            logger.error(error)
+            raise error
+        if loop_momenta.shape[-2:] != (len(self.loop_labels),4):
+            error = ValueError("Loop momenta of shape ({},4) or (N,{},4) are expected for the labels {}, got {}".format(
+                len(self.loop_labels),len(self.loop_labels),self.loop_labels,loop_momenta.shape))
+            logger.error(error)
+            raise error
+        momenta = np.einsum("pb,nbm->npm",self.momentum_coefficients[:,self.external_columns],external_momenta)
+        loop_coefficients = self.momentum_coefficients[:,self.loop_columns]
+        if loop_momenta.ndim == 2:
+            momenta += np.einsum("pb,bm->pm",loop_coefficients,loop_momenta)
+        else:
+            momenta += np.einsum("pb,nbm->npm",loop_coefficients,loop_momenta)
+        return momenta
+
+    def denominators(self,external_momenta,loop_momenta):
+        """Den(p,m) of the distinct propagators, see DiagramEvaluator#propagator_momenta
+
+        Returns
+        -------
+        numpy.ndarray
+            array of shape (N,n_distinct)
+        """
+        momenta = self.propagator_momenta(external_momenta,loop_momenta)
+        squares = momenta[...,0]**2-np.sum(momenta[...,1:]**2,axis=-1)
+        return 1/(squares-self.mass_squares)
+
+    def evaluate(self,external_momenta,loop_momenta,chunk_size=65536):
+        """Evaluate the couplings and denominators of all the diagrams at a batch of points
+
+        Parameters
+        ----------
+        external_momenta : numpy.ndarray
+            array of shape (N,len(external_labels),4)
+        loop_momenta : numpy.ndarray
+            array of shape (len(loop_labels),4), common to all the points, or (N,len(loop_labels),4)
+        chunk_size : int, optional
+            number of points evaluated at once, which bounds the size of the intermediate arrays
+
+        Returns
+        -------
+        numpy.ndarray
+            array of shape (N,number of diagrams)
+        """
+        external_momenta = np.asarray(external_momenta)
+        loop_momenta = np.asarray(loop_momenta)
+        n_points = len(external_momenta)
+        results = np.empty((n_points,len(self.diagram_set)),dtype=np.result_type(self.couplings,float))
+        for start in range(0,n_points,chunk_size):
+            stop = min(start+chunk_size,n_points)
+            loops = loop_momenta if loop_momenta.ndim == 2 else loop_momenta[start:stop]
+            denominators = self.denominators(external_momenta[start:stop],loops)
+            for diagrams,products,inverse in self.diagram_groups:
+                values = np.prod(denominators[:,products],axis=-1)
+                results[start:stop,diagrams] = self.couplings[diagrams]*values[:,inverse]
+        return results
@@ -0,0 +1,278 @@
+"""Canonical labelling of diagram topologies
+
+Many diagrams of a QGRAF output share the same underlying graph and only differ by the labelling of their vertices,
+propagators and internal fields. This module computes a canonical form of the graph of a Diagram, in which:
+
+- vertices are colored by the particles of their internal fields and by the external legs attached to them. External
+  legs are physical and are therefore identified by their field id (ext1, ext2, ...).
+- propagators are colored by their particles. Propagators of self-conjugate particles are undirected while the others
+  keep the orientation given by QGRAF (from the dual field to the field).
+
+The canonical form is computed by color refinement, with individualization of the vertices of the first ambiguous
+color class when refinement alone does not distinguish all vertices. The lexicographically smallest encoding of the
+graph over all these orderings is kept. Diagrams have few vertices, such that this search is cheap.
+
+Diagrams with the same canonical form are isomorphic. group_by_topology buckets a diagram set by canonical form and
+records, for each diagram, how its vertices, propagators and fields map to those of the representative of its class.
+Expressions generated for the representative can then be relabelled for every other member of the class.
+"""
+from hashlib import sha1
+import logging
+logger=logging.getLogger(__name__)
+
+
+def diagram_graph(diagram):
+    """Extract the colored graph of a diagram
+
+    Parameters
+    ----------
+    diagram : qgraf_parser.diagram_elements.Diagram
+
+    Returns
+    -------
+    tuple:
+        (vertex_colors,edges) where vertex_colors is a list with one hashable color per vertex and edges is a list of
+        (from_vertex,to_vertex,label,directed) with one entry per propagator
+    """
+    vertex_of_field = {}
+    vertex_colors = []
+    for index,vertex in enumerate(diagram.vertices):
+        internal = []
+        external = []
+        for field in vertex.fields.values():
+            vertex_of_field[field.id] = index
+            if field.id.startswith("ext"):
+                external.append((field.id,field.name))
+            else:
+                internal.append(field.name)
+        vertex_colors.append((tuple(sorted(internal)),tuple(sorted(external))))
+    edges = []
+    for propagator in diagram.propagators:
+        from_name = propagator.from_field.name
+        to_name = propagator.to_field.name
+        edges.append((vertex_of_field[propagator.from_field.id],
+                      vertex_of_field[propagator.to_field.id],
+                      (from_name,to_name),
+                      from_name != to_name))
+    return vertex_colors,edges
+
+
+def relabel_colors(signatures):
+    """Replace hashable signatures by their rank among the distinct signatures"""
+    ranks = {signature: rank for rank,signature in enumerate(sorted(set(signatures)))}
+    return [ranks[signature] for signature in signatures]
+
+
+def refine_colors(colors,neighbourhoods):
+    """Refine a vertex coloring until vertices with the same color have the same multiset of colored neighbours
+
+    Parameters
+    ----------
+    colors : list of int
+    neighbourhoods : list of list of tuple
+        for each vertex, (edge_signature,neighbour) for each incident edge
+
+    Returns
+    -------
+    list of int
+    """
+    n_colors = len(set(colors))
+    while True:
+        signatures = [(colors[vertex],tuple(sorted((edge,colors[neighbour]) for edge,neighbour in neighbourhood)))
+                      for vertex,neighbourhood in enumerate(neighbourhoods)]
+        colors = relabel_colors(signatures)
+        if len(set(colors)) == n_colors:
+            return colors
+        n_colors = len(set(colors))
+
+
+def encode_graph(order,vertex_colors,edges):
+    """Encode a graph with the vertices relabelled by their position in an ordering
+
+    Parameters
+    ----------
+    order : list of int
+        order[canonical_index] = vertex
+    vertex_colors : list
+    edges : list of tuple
+        see diagram_graph
+
+    Returns
+    -------
+    tuple:
+        (encoding,edge_keys) where edge_keys holds the encoded key of each edge
+    """
+    position = {vertex: index for index,vertex in enumerate(order)}
+    edge_keys = []
+    for from_vertex,to_vertex,label,directed in edges:
+        start,end = position[from_vertex],position[to_vertex]
+        if not directed and end < start:
+            start,end = end,start
+        edge_keys.append((start,end,label))
+    encoding = (tuple(vertex_colors[vertex] for vertex in order),tuple(sorted(edge_keys)))
+    return encoding,edge_keys
+
+
+class CanonicalForm(object):
+    """Canonical form of the graph of a diagram
+
+    Attributes
+    ----------
+    key : tuple
+        hashable encoding of the canonical graph. Two diagrams are isomorphic if and only if their keys are equal.
+    vertex_order : list of int
+        vertex_order[canonical_index] = index of the vertex in diagram.vertices
+    propagator_order : list of int
+        propagator_order[canonical_index] = index of the propagator in diagram.propagators
+    field_keys : dict of {tuple: str}
+        maps a canonical label of each field to its field id in the diagram
+    """
+    __slots__ = ("key","vertex_order","propagator_order","field_keys")
+
+    def __init__(self,key,vertex_order,propagator_order,field_keys):
+        self.key = key
+        self.vertex_order = vertex_order
+        self.propagator_order = propagator_order
+        self.field_keys = field_keys
+
+    @property
+    def hash(self):
+        """str: hexadecimal digest of the key, stable across processes and sessions"""
+        return sha1(repr(self.key).encode()).hexdigest()
+
+
+def canonical_form(diagram):
+    """Compute the canonical form of the graph of a diagram
+
+    Parameters
+    ----------
+    diagram : qgraf_parser.diagram_elements.Diagram
+
+    Returns
+    -------
+    CanonicalForm
+    """
+    vertex_colors,edges = diagram_graph(diagram)
+    neighbourhoods = [[] for _ in vertex_colors]
+    for from_vertex,to_vertex,label,directed in edges:
+        if directed:
+            neighbourhoods[from_vertex].append((("out",)+label,to_vertex))
+            neighbourhoods[to_vertex].append((("in",)+label,from_vertex))
+        else:
+            neighbourhoods[from_vertex].append((("-",)+label,to_vertex))
+            neighbourhoods[to_vertex].append((("-",)+label,from_vertex))
+
+    best = None
+    # Depth-first search over the individualizations of ambiguous vertices
+    stack = [relabel_colors(vertex_colors)]
+    while stack:
+        colors = refine_colors(stack.pop(),neighbourhoods)
+        if len(set(colors)) == len(colors):
+            order = sorted(range(len(colors)),key=colors.__getitem__)
+            encoding,edge_keys = encode_graph(order,vertex_colors,edges)
+            if best is None or encoding < best[0]:
+                best = (encoding,order,edge_keys)
+            continue
+        # Individualize each vertex of the smallest ambiguous color class in turn
+        cell_color = min(color for color in set(colors) if colors.count(color) > 1)
+        for vertex in reversed([vertex for vertex,color in enumerate(colors) if color == cell_color]):
+            individualized = [2*color+(color > cell_color or (color == cell_color and other != vertex))
+                              for other,color in enumerate(colors)]
+            stack.append(individualized)
+
+    if best is None:
+        # Diagram without vertices
+        return CanonicalForm(((),()),[],[],{})
+    encoding,order,edge_keys = best
+    position = {vertex: index for index,vertex in enumerate(order)}
+    propagator_order = sorted(range(len(edges)),key=edge_keys.__getitem__)
+    field_keys = {}
+    for canonical_index,propagator_index in enumerate(propagator_order):
+        propagator = diagram.propagators[propagator_index]
+        from_field,to_field = propagator.from_field,propagator.to_field
+        # Undirected propagators are oriented from their first vertex in the canonical order
+        if position[edges[propagator_index][0]] != edge_keys[propagator_index][0]:
+            from_field,to_field = to_field,from_field
+        field_keys[("propagator",canonical_index,0)] = from_field.id
+        field_keys[("propagator",canonical_index,1)] = to_field.id
+    for vertex in diagram.vertices:
+        for field in vertex.fields.values():
+            if field.id.startswith("ext"):
+                field_keys[("external",field.id)] = field.id
+    return CanonicalForm(encoding,order,propagator_order,field_keys)
+
+
+class Relabelling(object):
+    """Maps from the elements of the representative of a topology class to those of one of its members
+
+    Attributes
+    ----------
+    vertex_map : dict of {int: int}
+        index of a vertex of the representative -> index of the corresponding vertex of the member
+    propagator_map : dict of {int: int}
+        same for propagators
+    field_map : dict of {str: str}
+        field id in the representative -> field id in the member
+    """
+    __slots__ = ("vertex_map","propagator_map","field_map")
+
+    def __init__(self,representative_form,member_form):
+        self.vertex_map = dict(zip(representative_form.vertex_order,member_form.vertex_order))
+        self.propagator_map = dict(zip(representative_form.propagator_order,member_form.propagator_order))
+        self.field_map = {field_id: member_form.field_keys[key]
+                          for key,field_id in representative_form.field_keys.items()}
+
+
+class TopologyClass(object):
+    """Diagrams that share the same canonical graph
+
+    Attributes
+    ----------
+    form : CanonicalForm
+        canonical form of the representative
+    representative : qgraf_parser.diagram_elements.Diagram
+        the first diagram of the class
+    members : list of tuple
+        (diagram,Relabelling) for each diagram of the class, representative included
+    """
+    def __init__(self,representative,form):
+        self.form = form
+        self.representative = representative
+        self.members = [(representative,Relabelling(form,form))]
+
+    @property
+    def hash(self):
+        return self.form.hash
+
+    def add(self,diagram,form):
+        """Add a diagram with the same canonical key to the class"""
+        self.members.append((diagram,Relabelling(self.form,form)))
+
+    def __len__(self):
+        return len(self.members)
+
+    def __repr__(self):
+        return "TopologyClass({}, {} diagrams)".format(self.hash[:12],len(self))
+
+
+def group_by_topology(diagrams):
+    """Bucket diagrams by topology class
+
+    Parameters
+    ----------
+    diagrams : iterable of qgraf_parser.diagram_elements.Diagram
+
+    Returns
+    -------
+    dict of {str: TopologyClass}
+        topology classes keyed by the hash of their canonical form, in order of first appearance
+    """
+    classes = {}
+    for diagram in diagrams:
+        form = canonical_form(diagram)
+        topology_class = classes.get(form.hash)
+        if topology_class is None:
+            classes[form.hash] = TopologyClass(diagram,form)
+        else:
+            topology_class.add(diagram,form)
+    return classes
@@ -2,11 +2,7 @@ import re
 import sys
 
 def pparse(p):
-    lp=re.split("[+-]",p)
-    for mom in [x for x in lp if x!='']:
-        p=p.replace(mom,mom+",")
-    lp=p.split(",")
-    return [x for x in lp if x!='']
+    return [x.strip() for x in re.findall("[+-]?[^+-]+",p) if x.strip()!='']
 
 
 class Vertex: